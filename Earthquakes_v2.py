@@ -33,20 +33,48 @@ __status__ = "development"
 #
 # ----------------------------------------------------------------------------------------------------------
 
-from dash import Dash, html, dcc, Input, Output
+from dash import Dash, html, dcc, Input, Output, State, Patch, ctx
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
 from datetime import date
 from datetime import datetime as dt
 import plotly.express as px
-import plotly.graph_objects as go
 import pandas as pd
-import geopandas as gpd
+import os
 from pathlib import Path
-import json
 import numpy as np
+from background import make_background_manager
+from event_grid import grid_level_for_zoom, aggregate_events
+from event_table import column, custom_data, event_filter, find_epicenter
+from figure_factory import figure, register_layout
+from intensity_pyramid import lod_level
+from figures import (
+    PLOT_TYPES,
+    RESPONSE_GRID_ARTIFACT,
+    RESPONSE_GRID_SPACING,
+    RESPONSE_GRID_SPACINGS,
+    artifact_lock,
+    build_plot,
+    level_figure,
+    level_title,
+    load_artifact,
+    missing_sources,
+    save_artifact,
+    sources_changed,
+)
+from prefetch import PlotPrefetcher, neighbor_events
+from product_loader import ProductLoader
+from reloader import RELOAD_INTERVAL, RELOAD_INTERVAL_ENV, EventReloader
+from shared_table import SHARED_TABLE_ENV
+from singleflight import SingleFlight
+from viewport import CellIndexCache, cull_figure, viewport_bounds
+import metrics
+from metrics import instrumented, phase
 
 DATA_DIR = Path(r"./data")
-ZC_DATA_PATH = Path(r"zipcode_data")
+BACKGROUND_CACHE_DIR = Path(r"./cache/background")
+RENDER_TIMEOUT = 60  # seconds a request waits for another request's (or process's) build of the same plot
+PRODUCT_POLL_INTERVAL = 1000  # milliseconds between the checks for an event's DYFI files being downloaded
 
 mapbox_access_token = open(".mapbox_token").read()
 
@@ -54,70 +82,26 @@ mapbox_access_token = open(".mapbox_token").read()
 pd.set_option("display.max_columns", 32)
 
 event_file = DATA_DIR / "SC_Earthquake.geojson"
-geo_df = gpd.read_file(event_file)
-
-# TODO:  From here to app definition should be done prior to running the app; usgs_api.py (api module)
-
-geo_df["Event_Date"] = (
-    pd.to_datetime(geo_df.time, unit="ms")
-    .dt.tz_localize("UTC")
-    .dt.tz_convert("America/New_York")
-    .dt.date
-)
-
-geo_df["Event_Time"] = (
-    pd.to_datetime(geo_df.time, unit="ms")
-    .dt.tz_localize("UTC")
-    .dt.tz_convert("America/New_York")
-    .dt.time
-)
-
-# remove decimal portion of the seconds part of the time
-for x in range(len(geo_df["Event_Time"])):
-    geo_df.loc[x, "Event_Time"] = geo_df["Event_Time"][x].replace(microsecond=0)
-
-# Filter dataframe
-geo_df = geo_df[
-    [
-        "id",
-        "mag",
-        "place",
-        "detail",
-        "felt",
-        "cdi",
-        "title",
-        "geometry",
-        "Event_Date",
-        "Event_Time",
-    ]
-]
-geo_df = geo_df.rename(
-    columns={
-        "mag": "Mag",
-        "place": "Place",
-        "detail": "Url",
-        "felt": "Felt",
-        "cdi": "CDI",
-        "title": "Title",
-    }
-)  # , 'geometry': 'Geometry'})
-geo_df.Felt = geo_df.Felt.fillna(0).astype("int")
-geo_df.CDI = geo_df.CDI.fillna(0).astype("float")
-geo_df.Place = geo_df.Place.fillna("No Location")
-
-geo_df["Depth"] = geo_df.geometry.z
-geo_df["Mag"] = geo_df.Mag.round(1)
+# The events as a compact table (see event_table.py); Event_Date, Event_Time and Url are derived when displayed.
+# The grid index holds the grid cell keys of every event for each map aggregation level; aligned with the table rows.
+# With EQ_SHARED_TABLE_DIR set, both are built once and memory-mapped by every worker process (see shared_table.py).
+# event_reloader.data is replaced, never modified, when the events file changes; read it once per callback.
+event_reloader = EventReloader(event_file, os.environ.get(SHARED_TABLE_ENV) or None)
 
-# =======================================================================================================================
-
-geo_df = geo_df.copy()
-
-# print(geo_df.head())
+# print(event_reloader.data.events_df.head())
 
 blackbold = {"color": "black", "font-weight": "bold"}
 
+# Graph-plots are rendered by Dash background callbacks in worker processes when diskcache is installed, so a slow
+# render does not hold a Flask request thread (and the GIL) while the map callback waits.  Without diskcache the
+# graph-plots are rendered on the request thread, as before.
+background_callback_manager = make_background_manager(BACKGROUND_CACHE_DIR)
+
 app = Dash(
     __name__,
+    background_callback_manager=background_callback_manager,
+    # The intensity-map graph and its intensity-cells store are only in the layout while an intensity plot is shown.
+    suppress_callback_exceptions=True,
     external_stylesheets=[dbc.themes.BOOTSTRAP],
     meta_tags=[
         {
@@ -127,6 +111,7 @@ app = Dash(
     ],
 )
 server = app.server
+metrics.install(server)
 
 
 def determine_zoom_level(longitudes=None, latitudes=None):
@@ -175,124 +160,304 @@ def determine_zoom_level(longitudes=None, latitudes=None):
 
 
 # graph-plot functions
-def display_intensity_plot_1km(evnt_id, sdata):
-    """Display 1km spacing choropleth map of earthquake DYFI intensities
+def selected_epicenter(sdata):
+    """Return the epicenter dictionary (lat, lon, place) of the selected map point."""
+    return {
+        "lat": sdata["points"][0]["lat"],
+        "lon": sdata["points"][0]["lon"],
+        "place": sdata["points"][0]["customdata"][1],
+    }
 
-    Plots a 1km spacing choropleth map of the DYFI earthquake intensities for selected event.
+
+def load_or_build_plot(evnt_id, artifact, epicenter=None):
+    """Load the stored figure, or table data, of a graph-plot for an event.
+
+    The plot artifacts are built by usgs_api.py when an event is downloaded.  If the artifact is missing or out of
+    date it is built here instead and stored for the next request.  Concurrent calls for the same plot wait for the
+    first one's build rather than building it again, and share its result or its error.
 
     Parameters
     ----------
     evnt_id : String
-        The event id identifying the selected earthquake event.
+        The USGS.gov id string for the earthquake event.
+    artifact : String
+        The plot artifact name; one of the figures.PLOT_TYPES values.
+    epicenter : Python dictionary
+        The event's epicenter with the keys lat, lon and place; needed for the map plots.
+
+    Returns
+    -------
+    Python dictionary
+        The graph-plot figure dictionary, or the table data for the DYFI responses table.
+
+    """
+    plot = load_artifact(evnt_id, artifact)
+    if plot is None:
+        plot = render_flight.do(
+            (evnt_id, artifact),
+            build_and_save_plot,
+            evnt_id,
+            artifact,
+            epicenter,
+            timeout=RENDER_TIMEOUT,
+        )
+    return plot
+
+
+def build_and_save_plot(evnt_id, artifact, epicenter=None):
+    """Build and store the artifact of a graph-plot, unless another process stored it while this one waited.
+
+    Parameters
+    ----------
+    evnt_id : String
+        The USGS.gov id string for the earthquake event.
+    artifact : String
+        The plot artifact name; one of the figures.PLOT_TYPES values.
+    epicenter : Python dictionary
+        The event's epicenter with the keys lat, lon and place; needed for the map plots.
+
+    Returns
+    -------
+    Python dictionary
+        The graph-plot figure dictionary, or the table data for the DYFI responses table.
+
+    """
+    with artifact_lock(evnt_id, artifact, RENDER_TIMEOUT):
+        plot = load_artifact(evnt_id, artifact)
+        if plot is None:
+            plot = build_plot(artifact, evnt_id, epicenter)
+            try:
+                save_artifact(evnt_id, artifact, plot)
+            except OSError:
+                pass
+    return plot
+
+
+# Concurrent requests and prefetch jobs for the same event and plot type share one build.  Background callback jobs
+# each run in their own process; artifact_lock() makes them share one build instead.
+render_flight = SingleFlight(metrics.REGISTRY, "render")
+plot_prefetcher = PlotPrefetcher(load_or_build_plot)
+if background_callback_manager is not None:
+    # The metrics and the plots cached by a background callback job are added to the server's when it finishes.
+    background_callback_manager.share(metrics, plot_prefetcher)
+prefetched_event = {"id": None}
+# Downloads the DYFI files of a selected event that usgs_api.py has not downloaded (see product_loader.py).
+product_loader = ProductLoader(registry=metrics.REGISTRY)
+# The spatial index of the cells of each displayed intensity plot (see viewport.py).
+cell_indexes = CellIndexCache()
+
+
+def load_plot(evnt_id, artifact, sdata=None, epicenter=None):
+    """Return a graph-plot from the prefetch cache, loading or building it if it is not cached.
+
+    Parameters
+    ----------
+    evnt_id : String
+        The USGS.gov id string for the earthquake event.
+    artifact : String
+        The plot artifact name; one of the figures.PLOT_TYPES values.
+    sdata : Python dictionary
+        A dictionary containing the basic event data of the selected event; needed for the map plots' epicenter.
+    epicenter : Python dictionary
+        The event's epicenter, used in place of the one of sdata.
+
+    Returns
+    -------
+    Python dictionary
+        The graph-plot figure dictionary, or the table data for the DYFI responses table.
+
+    """
+    plot = plot_prefetcher.get(evnt_id, artifact)
+    if plot is None:
+        if epicenter is None and sdata is not None:
+            epicenter = selected_epicenter(sdata)
+        plot = load_or_build_plot(evnt_id, artifact, epicenter)
+        plot_prefetcher.put(evnt_id, artifact, plot)
+    return plot
+
+
+def prefetch_jobs(evnt_id, sdata):
+    """Return the (event id, artifact, epicenter) prefetch jobs of the selected event and of its neighbor events.
+
+    Parameters
+    ----------
+    evnt_id : String
+        The USGS.gov id string of the selected earthquake event.
     sdata : Python dictionary
         A dictionary containing the basic event data of the selected event.
 
     Returns
     -------
-    html.Div which contains a dcc.Graph which contains the figure
-        fig -- A figure containing a 1km spacing choropleth map.
+    list
+        jobs -- Every plot type of the selected event, then every plot type of each neighbor event.
 
     """
+    geo_df = event_reloader.data.events_df
+    jobs = [(evnt_id, a, selected_epicenter(sdata)) for a in PLOT_TYPES.values()]
+    for neighbor_id in neighbor_events(geo_df, evnt_id):
+        epicenter = find_epicenter(geo_df, neighbor_id)
+        jobs.extend((neighbor_id, a, epicenter) for a in PLOT_TYPES.values())
+    return jobs
 
-    # print(sdata['points'][0]['customdata'][1])
-
-    filename = DATA_DIR / evnt_id / "dyfi_geo_1km.geojson"
-    # print(filename)
-
-    with open(filename) as file1:
-        cdi_geo_1km_geojson = json.load(file1)
-    cdi_geo_1km_df = pd.json_normalize(cdi_geo_1km_geojson, ["features"])
-
-    ww = list(cdi_geo_1km_df["properties.nresp"])
-    xx = list(cdi_geo_1km_df["properties.name"])
-    yy = list(cdi_geo_1km_df["properties.cdi"])
-    zz = list(cdi_geo_1km_df["properties.dist"])
-
-    nh = np.empty(shape=(len(yy), 4, 1), dtype="object")
-    nh[:, 0] = np.array(xx).reshape(-1, 1)
-    nh[:, 1] = np.array(yy).reshape(-1, 1)
-    nh[:, 2] = np.array(zz).reshape(-1, 1)
-    nh[:, 3] = np.array(ww).reshape(-1, 1)
-
-    # print(cdi_geo_1km_df)
-
-    fig = go.Figure()
-    fig.add_trace(
-        go.Choroplethmapbox(
-            geojson=cdi_geo_1km_geojson,
-            locations=cdi_geo_1km_df["properties.name"],
-            z=cdi_geo_1km_df["properties.cdi"],
-            featureidkey="properties.name",
-            # subplot="mapbox",
-            coloraxis="coloraxis",
-            below="",
-            name="",
-            customdata=nh,
-            hoverlabel={"bgcolor": "#323232"},
-            hovertemplate="UTM Geocode/City: %{customdata[0]}<br>"
-            + "Response Count:  %{customdata[3]} -- "
-            + "CDI: %{customdata[1]} -"
-            + "- Distance %{customdata[2]} km",
-            marker=dict(opacity=0.30),
-        )
-    )
 
-    fig.add_trace(
-        go.Scattermapbox(
-            lon=[sdata["points"][0]["lon"]],
-            lat=[sdata["points"][0]["lat"]],
-            showlegend=False,
-            # subplot="mapbox",
-            mode="markers+lines",
-            marker={"size": 12, "opacity": 1, "symbol": ["star"]},
-            name="",
-            text=[sdata["points"][0]["customdata"][1]],
-            hoverlabel={"bgcolor": "#323232"},
-            hovertemplate="Epicenter -- Latitude:  %{lat},  Longitude:  %{lon}<br>"
-            + "Location -- %{text}",
-        )
-    )
+def prefetch_plots(evnt_id, sdata):
+    """Queue the other plot types of the selected event, then the plots of its neighbor events, for prefetching.
 
-    fig.update_layout(
-        mapbox=dict(
-            zoom=7.5,
-            style="streets",
-            center={"lat": sdata["points"][0]["lat"], "lon": sdata["points"][0]["lon"]},
-            accesstoken=mapbox_access_token,
-        ),
-        coloraxis=dict(colorscale="Portland"),
-        coloraxis_colorbar=dict(
-            orientation="v",
-            lenmode="pixels",
-            len=435,
-            thicknessmode="pixels",
-            thickness=10,
-            xanchor="left",
-            x=-0.025,
-            xpad=1,
-            ticks="inside",
-            tickcolor="white",
-            title=dict(text="CDI"),
-        ),
-        showlegend=False,
-        paper_bgcolor="#FFDEAD",
-        hovermode="closest",
-        hoverdistance=5,
-        title=dict(
-            font=dict(color="#2F4F4F", size=14),
-            text="CDI Choropleth Mapbox Plot - 1km Spacing",
-        ),
-        template="ggplot2",
-        margin={"r": 4, "t": 25, "l": 4, "b": 4},
-    )
+    Nothing is queued again while the same event stays selected; selecting another event cancels the queued jobs.
+
+    Parameters
+    ----------
+    evnt_id : String
+        The USGS.gov id string of the selected earthquake event.
+    sdata : Python dictionary
+        A dictionary containing the basic event data of the selected event.
 
+    """
+    if prefetched_event["id"] == evnt_id:
+        return
+    prefetched_event["id"] = evnt_id
+    plot_prefetcher.schedule(prefetch_jobs(evnt_id, sdata))
+
+
+def events_reloaded(old, new, since):
+    """Drop the cached graph-plots made stale by reloaded event data.
+
+    A cached plot is dropped if its event is no longer in the catalog, or if one of the DYFI files it was built from
+    changed since the previous reload; the other cached plots are kept.  Stored artifacts need no invalidation,
+    load_artifact() already ignores an artifact older than its DYFI files.
+
+    Parameters
+    ----------
+    old : reloader.EventData
+        The event data that was replaced.
+    new : reloader.EventData
+        The reloaded event data.
+    since : float
+        The time.time() the old event data was loaded.
+
+    """
+    event_ids = set(new.events_df["id"])
+    for evnt_id, artifact in plot_prefetcher.cached():
+        if evnt_id not in event_ids or sources_changed(evnt_id, artifact, since):
+            plot_prefetcher.invalidate(evnt_id, artifact)
+    # The selected event's neighbors may have changed.
+    prefetched_event["id"] = None
+
+
+event_reloader.on_reload = events_reloaded
+event_reloader.start(float(os.environ.get(RELOAD_INTERVAL_ENV, RELOAD_INTERVAL)))
+
+
+def prefetch_artifacts(evnt_id, sdata):
+    """Build and store the missing plot artifacts of the selected event and of its neighbor events, one by one.
+
+    Used in place of prefetch_plots() in a background callback worker process, which has no prefetch threads and
+    whose in-memory cache ends with the process; the stored artifacts are shared by every process.
+
+    Parameters
+    ----------
+    evnt_id : String
+        The USGS.gov id string of the selected earthquake event.
+    sdata : Python dictionary
+        A dictionary containing the basic event data of the selected event.
+
+    """
+    for job_evnt_id, artifact, epicenter in prefetch_jobs(evnt_id, sdata):
+        try:
+            load_or_build_plot(job_evnt_id, artifact, epicenter)
+        except Exception:  # pylint: disable='broad-exception-caught'
+            # A plot that cannot be prefetched is built (and its error shown) on request instead.
+            pass
+
+
+def intensity_level(plot, relayout_data, level):
+    """Return the level of a multi-resolution intensity map to show after a relayout.
+
+    Parameters
+    ----------
+    plot : Python dictionary
+        The intensity_pyramid plot artifact.
+    relayout_data : Python dictionary
+        The intensity-map relayout data.
+    level : int
+        The level shown; kept if the relayout data has no zoom level.
+
+    Returns
+    -------
+    int
+        The level spacing in km (see intensity_pyramid.lod_level()).
+
+    """
+    zoom = relayout_data.get("mapbox.zoom")
+    if zoom is None:
+        return level
+    center = relayout_data.get("mapbox.center", plot["layout"]["mapbox"]["center"])
+    return lod_level(zoom, center["lat"], plot["levels"])
+
+
+def load_intensity_plot(evnt_id, artifact, sdata):
+    """Return an intensity map with only the cells around its initial view, and the data of its intensity-cells store.
+
+    Parameters
+    ----------
+    evnt_id : String
+        The USGS.gov id string for the earthquake event.
+    artifact : String
+        The plot artifact name; intensity_pyramid, intensity_1km, intensity_10km or a response grid artifact name.
+    sdata : Python dictionary
+        A dictionary containing the basic event data of the selected event.
+
+    Returns
+    -------
+    Python dictionary
+        fig -- The culled figure; of the level of the initial zoom for the multi-resolution map.
+    Python dictionary
+        cells -- The event id, artifact, epicenter and level (None but for the multi-resolution map) of the plot and
+        the map areas whose cells have been sent.
+
+    """
+    fig = load_plot(evnt_id, artifact, sdata)
+    mapbox = fig["layout"]["mapbox"]
+    level = None
+    if "levels" in fig:
+        level = lod_level(mapbox["zoom"], mapbox["center"]["lat"], fig["levels"])
+        fig = level_figure(fig, level)
+    bounds = viewport_bounds(center=mapbox["center"], zoom=mapbox["zoom"])
+    index = cell_indexes.get((evnt_id, artifact, level), fig["data"][0])
+    return cull_figure(fig, index, index.query(bounds), uirevision=f"{evnt_id}-{artifact}"), {
+        "event_id": evnt_id,
+        "artifact": artifact,
+        "epicenter": selected_epicenter(sdata),
+        "level": level,
+        "sent": [bounds],
+    }
+
+
+def intensity_graph(fig, cells):
+    """Return the intensity-map graph of an intensity choropleth map, with its intensity-cells store.
+
+    Parameters
+    ----------
+    fig : Python dictionary
+        The culled figure returned by load_intensity_plot().
+    cells : Python dictionary
+        The data of the intensity-cells store returned by load_intensity_plot().
+
+    Returns
+    -------
+    html.Div which contains the intensity-cells dcc.Store and the intensity-map dcc.Graph
+
+    """
     return html.Div(
         [
+            dcc.Store(id="intensity-cells", data=cells),
             dcc.Graph(
+                id="intensity-map",
                 figure=fig,
                 config={
                     "scrollZoom": True,
                     "responsive": True,
+                    "mapboxAccessToken": mapbox_access_token,
                     "modeBarButtonsToRemove": [
                         "zoom",
                         "pan",
@@ -316,6 +481,56 @@ def display_intensity_plot_1km(evnt_id, sdata):
     )
 
 
+@instrumented("display_intensity_plot_auto")
+def display_intensity_plot_auto(evnt_id, sdata):
+    """Display the multi-resolution choropleth map of earthquake DYFI intensities
+
+    Plots a choropleth map of the DYFI earthquake intensities for selected event, whose cell spacing (1, 2, 5, 10 or
+    25 km) follows the map zoom.
+
+    Parameters
+    ----------
+    evnt_id : String
+        The event id identifying the selected earthquake event.
+    sdata : Python dictionary
+        A dictionary containing the basic event data of the selected event.
+
+    Returns
+    -------
+    html.Div which contains a dcc.Graph which contains the figure
+        fig -- A figure containing a choropleth map of the spacing of its zoom level.
+
+    """
+    fig, cells = load_intensity_plot(evnt_id, "intensity_pyramid", sdata)
+
+    return intensity_graph(fig, cells)
+
+
+@instrumented("display_intensity_plot_1km")
+def display_intensity_plot_1km(evnt_id, sdata):
+    """Display 1km spacing choropleth map of earthquake DYFI intensities
+
+    Plots a 1km spacing choropleth map of the DYFI earthquake intensities for selected event.
+
+    Parameters
+    ----------
+    evnt_id : String
+        The event id identifying the selected earthquake event.
+    sdata : Python dictionary
+        A dictionary containing the basic event data of the selected event.
+
+    Returns
+    -------
+    html.Div which contains a dcc.Graph which contains the figure
+        fig -- A figure containing a 1km spacing choropleth map.
+
+    """
+    fig, cells = load_intensity_plot(evnt_id, "intensity_1km", sdata)
+
+    return intensity_graph(fig, cells)
+
+
+@instrumented("display_intensity_plot_10km")
 def display_intensity_plot_10km(evnt_id, sdata):
     """Display 10km spacing choropleth map of earthquake DYFI intensities
 
@@ -331,99 +546,61 @@ def display_intensity_plot_10km(evnt_id, sdata):
     Returns
     -------
     html.Div which contains a dcc.Graph which contains the figure
-        fig -- A figure containing a 1km spacing and a 10 km spacing choropleth map.
+        fig -- A figure containing a 10 km spacing choropleth map.
 
     """
+    fig, cells = load_intensity_plot(evnt_id, "intensity_10km", sdata)
 
-    filename = DATA_DIR / evnt_id / "dyfi_geo_10km.geojson"
-    # print(filename)
-
-    with open(filename) as file2:
-        cdi_geo_10km_geojson = json.load(file2)
-    cdi_geo_10km_df = pd.json_normalize(cdi_geo_10km_geojson, ["features"])
-
-    # print(cdi_geo_10km_df)
-
-    ww = list(cdi_geo_10km_df["properties.nresp"])
-    xx = list(cdi_geo_10km_df["properties.name"])
-    yy = list(cdi_geo_10km_df["properties.cdi"])
-    zz = list(cdi_geo_10km_df["properties.dist"])
-
-    nh = np.empty(shape=(len(yy), 4, 1), dtype="object")
-    nh[:, 0] = np.array(xx).reshape(-1, 1)
-    nh[:, 1] = np.array(yy).reshape(-1, 1)
-    nh[:, 2] = np.array(zz).reshape(-1, 1)
-    nh[:, 3] = np.array(ww).reshape(-1, 1)
-
-    fig = go.Figure()
-    fig.add_trace(
-        go.Choroplethmapbox(
-            geojson=cdi_geo_10km_geojson,
-            locations=cdi_geo_10km_df["properties.name"],
-            z=cdi_geo_10km_df["properties.cdi"],
-            featureidkey="properties.name",
-            # subplot="mapbox2",
-            coloraxis="coloraxis",
-            name="",
-            customdata=nh,
-            hoverlabel={"bgcolor": "#323232"},
-            hovertemplate="UTM Geocode/City: %{customdata[0]}<br>"
-            + "Response Count:  %{customdata[3]} -- "
-            + "CDI: %{customdata[1]} -"
-            + "- Distance %{customdata[2]} km",
-            marker=dict(opacity=0.30),
-        )
-    )
+    return intensity_graph(fig, cells)
 
-    fig.add_trace(
-        go.Scattermapbox(
-            lon=[sdata["points"][0]["lon"]],
-            lat=[sdata["points"][0]["lat"]],
-            showlegend=False,
-            # subplot="mapbox2",
-            mode="markers+lines",
-            marker={"size": 12, "opacity": 1, "symbol": ["star"]},
-            name="",
-            text=[sdata["points"][0]["customdata"][1]],
-            hoverlabel={"bgcolor": "#323232"},
-            hovertemplate="Epicenter -- Latitude:  %{lat},  Longitude:  %{lon}<br>"
-            + "Location -- %{text}",
-        )
-    )
 
-    fig.update_layout(
-        mapbox=dict(
-            zoom=7.5,
-            style="streets",
-            center={"lat": sdata["points"][0]["lat"], "lon": sdata["points"][0]["lon"]},
-            accesstoken=mapbox_access_token,
-        ),
-        # coloraxis=dict(colorscale='Plotly3'),
-        coloraxis=dict(colorscale="Portland"),
-        coloraxis_colorbar=dict(
-            orientation="v",
-            lenmode="pixels",
-            len=435,
-            thicknessmode="pixels",
-            thickness=10,
-            xanchor="left",
-            x=-0.025,
-            xpad=1,
-            ticks="inside",
-            tickcolor="white",
-            title=dict(text="CDI"),
-        ),
-        showlegend=False,
-        paper_bgcolor="#FFDEAD",
-        hovermode="closest",
-        hoverdistance=5,
-        title=dict(
-            font=dict(color="#2F4F4F", size=14),
-            text="CDI Choropleth Mapbox Plot - 10km Spacing",
-        ),
-        template="ggplot2",
-        margin={"r": 4, "t": 25, "l": 4, "b": 4},
-    )
+@instrumented("display_response_grid_plot")
+def display_response_grid_plot(evnt_id, sdata, spacing=RESPONSE_GRID_SPACING):
+    """Display a choropleth map of the earthquake DYFI responses binned into squares of any spacing
+
+    Plots a choropleth map of the DYFI responses of the selected event, binned into UTM squares of the spacing
+    chosen in the grid-spacing-input.
+
+    Parameters
+    ----------
+    evnt_id : String
+        The event id identifying the selected earthquake event.
+    sdata : Python dictionary
+        A dictionary containing the basic event data of the selected event.
+    spacing : int
+        The cell spacing in km.
+
+    Returns
+    -------
+    html.Div which contains a dcc.Graph which contains the figure
+        fig -- A figure containing a choropleth map of the responses.
+
+    """
+    fig, cells = load_intensity_plot(evnt_id, RESPONSE_GRID_ARTIFACT.format(spacing), sdata)
+
+    return intensity_graph(fig, cells)
+
+
+@instrumented("display_zip_plot")
+def display_zip_plot(evnt_id, sdata):
+    """Display a zipcode choropleth map of the earthquake DYFI intensities.
+
+    Plot a zipcode choropleth map of the DYFI reported intensities of the earthquake event.
+
+    Parameters
+    ----------
+    evnt_id : String
+        The USGS.gov id string of the earthquake event.
+    sdata : Python dictionary
+        A dictionary containing the basic event data of the selected event.
+
+    Returns
+    -------
+    html.Div which contains a dcc.Graph which contains the figure
+        fig -- A figure containing a zipcode DYFI intensities choropleth map.
+
+    """
+    fig = load_plot(evnt_id, "zip_map", sdata)
 
     return html.Div(
         [
@@ -432,6 +609,7 @@ def display_intensity_plot_10km(evnt_id, sdata):
                 config={
                     "scrollZoom": True,
                     "responsive": True,
+                    "mapboxAccessToken": mapbox_access_token,
                     "modeBarButtonsToRemove": [
                         "zoom",
                         "pan",
@@ -451,14 +629,17 @@ def display_intensity_plot_10km(evnt_id, sdata):
                     "width": "100%",
                 },
             )
-        ]
+        ],
+        style={"width": "100%"},
     )
 
 
-def display_zip_plot(evnt_id, sdata):
-    """Display a zipcode choropleth map of the earthquake DYFI intensities.
+@instrumented("display_intensity_surface_plot")
+def display_intensity_surface_plot(evnt_id, sdata):
+    """Display a smoothed surface of the earthquake DYFI intensities.
 
-    Plot a zipcode choropleth map of the DYFI reported intensities of the earthquake event.
+    Plot the DYFI intensities of the earthquake event as a continuous surface interpolated from the 1km cells (see
+    intensity_surface.py), over a mapbox map.
 
     Parameters
     ----------
@@ -470,126 +651,11 @@ def display_zip_plot(evnt_id, sdata):
     Returns
     -------
     html.Div which contains a dcc.Graph which contains the figure
-        fig -- A figure containing a zipcode DYFI intensities choropleth map.
+        fig -- A figure containing a DYFI intensity surface map.
 
     """
-    filename = DATA_DIR / evnt_id / "cdi_zip.csv"
-    cdi_zip_df = pd.read_csv(filename)
-    cdi_zip_df.rename({"# Columns: ZIP/Location": "ZIP/Location"}, axis=1, inplace=True)
-
-    # Using NC, SC, & GA region zipcodes instead of just SC
-    # zc_filename = DATA_DIR / "NC_SC_GA_region_zipcodes.geojson"
-    # Used parquet file format for the zip code file because it is read in faster; geojson file read is way too slow
-
-    # zc_filename = DATA_DIR / "NC_SC_GA_region_zipcodes.parquet"
-    # sc_zip_df = gpd.read_parquet(zc_filename, columns=["geometry", "ZCTA5CE10"])
-
-    zc_filename = DATA_DIR / ZC_DATA_PATH / "cb_2010_45_zcta510.shp"
-    sc_zip_df = gpd.read_file(zc_filename)
-
-    # sc_zip_df = gpd.read_file(r"/home/mick/Work/data_science/SC_earthquake/data/zipcode_data/cb_2010_45_zcta510.shp")
-
-    cdi_zip_df["ZIP/Location"] = cdi_zip_df[["ZIP/Location"]].astype("str")
-
-    # sc_zip_df["ZCTA5CE10"] = sc_zip_df[["ZCTA5CE10"]].astype("str")
-    sc_zip_df["Zipcode"] = sc_zip_df[["Zipcode"]].astype("str")
-
-    df = cdi_zip_df.copy()
-    geo_dff = (
-        # gpd.GeoDataFrame(sc_zip_df).merge(df, left_on="ZCTA5CE10", right_on="ZIP/Location").set_index("ZIP/Location")
-        gpd.GeoDataFrame(sc_zip_df).merge(
-            df, left_on="Zipcode", right_on="ZIP/Location"
-        )
-        # .set_index("ZIP/Location")  # FIXME:  Remove this line
-    )
-
-    geo_dff = geo_dff[
-        ["Zipcode", "CDI", "Response_Count", "Hypocentral_Distance", "geometry"]
-    ]
-
-    print(geo_dff)  # FIXME:  Remove this line
-
-    state_zip_json = json.loads(geo_dff.to_json())
-
-    ww = list(df["CDI"])
-    xx = list(df["ZIP/Location"])
-    yy = list(df["Response_Count"])
-    zz = list(df["Hypocentral_Distance"])
-
-    nh = np.empty(shape=(len(yy), 4, 1), dtype="object")
-    nh[:, 0] = np.array(xx).reshape(-1, 1)
-    nh[:, 1] = np.array(yy).reshape(-1, 1)
-    nh[:, 2] = np.array(zz).reshape(-1, 1)
-    nh[:, 3] = np.array(ww).reshape(-1, 1)
-
-    fig = go.Figure()
-    fig.add_trace(
-        go.Choroplethmapbox(
-            geojson=state_zip_json,
-            locations=df["ZIP/Location"],
-            z=df["CDI"],
-            featureidkey="properties.Zipcode",
-            # featureidkey="properties.ZCTA5CE10",
-            marker={"opacity": 0.3, "line_width": 0.5},
-            showscale=True,
-            coloraxis="coloraxis",
-            name="",
-            customdata=nh,
-            hoverlabel={"bgcolor": "#323232"},
-            hovertemplate="ZIP/Postal Code:  %{customdata[0]}<br>"
-            + "Responses:  %{customdata[1]}<br>"
-            + "CDI:  %{customdata[3]}"
-            + " -- Distance:  %{customdata[2]} km",
-        )
-    )
+    fig = load_plot(evnt_id, PLOT_TYPES["Intensity Surface"], sdata)
 
-    fig.add_trace(
-        go.Scattermapbox(
-            lon=[sdata["points"][0]["lon"]],
-            lat=[sdata["points"][0]["lat"]],
-            mode="markers+lines",
-            marker={"size": 10, "symbol": ["star"]},
-            name="",
-            text=[sdata["points"][0]["customdata"][1]],
-            hoverlabel={"bgcolor": "#323232"},
-            hovertemplate="Epicenter -- Latitude:  %{lat},  Longitude:  %{lon}<br>"
-            + "Location -- %{text}",
-        )
-    )
-
-    fig.update_layout(
-        # mapbox_style="open-street-map",
-        mapbox_style="streets",
-        mapbox_zoom=7.5,
-        mapbox_center={
-            "lat": sdata["points"][0]["lat"],
-            "lon": sdata["points"][0]["lon"],
-        },
-        mapbox=dict(accesstoken=mapbox_access_token),
-        autosize=True,
-        margin={"r": 4, "t": 25, "l": 4, "b": 4},
-        template="ggplot2",
-        title=dict(font=dict(color="#2F4F4F"), text="Zipcode CDI Choropleth Map"),
-        paper_bgcolor="#FFDEAD",
-        hovermode="closest",
-        hoverdistance=3,
-        coloraxis=dict(colorscale="Portland"),
-        coloraxis_colorbar=dict(
-            orientation="v",
-            lenmode="pixels",
-            len=435,
-            thicknessmode="pixels",
-            thickness=10,
-            xanchor="left",
-            x=-0.025,
-            xpad=1,
-            ticks="inside",
-            tickcolor="white",
-            title=dict(text="CDI"),
-        ),
-        showlegend=False,
-    )
-    # return fig
     return html.Div(
         [
             dcc.Graph(
@@ -597,6 +663,7 @@ def display_zip_plot(evnt_id, sdata):
                 config={
                     "scrollZoom": True,
                     "responsive": True,
+                    "mapboxAccessToken": mapbox_access_token,
                     "modeBarButtonsToRemove": [
                         "zoom",
                         "pan",
@@ -621,6 +688,7 @@ def display_zip_plot(evnt_id, sdata):
     )
 
 
+@instrumented("display_intensity_dist_plot")
 def display_intensity_dist_plot(evnt_id):
     """Display a graph of the event's DYFI reported intensities vs. hypo-central distance from the event.
 
@@ -644,163 +712,8 @@ def display_intensity_dist_plot(evnt_id):
                                                   fourth -- Median Intensity for each distance bin
 
     """
+    fig = load_plot(evnt_id, "intensity_dist")
 
-    filename = DATA_DIR / evnt_id / "dyfi_plot_atten.json"
-    intensity_dist_df = pd.read_json(filename)
-
-    # print(len(intensity_dist_df), intensity_dist_df)
-
-    fig = go.Figure()
-    for dsi in range(len(intensity_dist_df)):
-        dataset_df = pd.DataFrame(intensity_dist_df.datasets[dsi])
-        # print(dataset_df)
-        if dataset_df["class"][0] == "scatterplot1":
-            sct_plt_df = dataset_df.from_records(data=dataset_df.data)
-            xi = list(sct_plt_df.x)
-            yi = list(sct_plt_df.y)
-            ylabel = intensity_dist_df.ylabel[0]
-
-            fig.add_trace(
-                go.Scatter(
-                    x=xi,
-                    y=yi,
-                    mode="markers",
-                    marker=dict(color="rgb(148, 223, 234)", size=6),
-                    name="All Reported Data",
-                    customdata=xi,
-                    text=yi,
-                    hovertemplate="Hypocentral Dist. (km):  %{customdata}<br>"
-                    + "CDI:  %{text}",
-                )
-            )
-            fig.update_yaxes(title_text=ylabel, range=[0, 10])
-            fig.update_layout(
-                yaxis=dict(
-                    tickvals=[0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10], fixedrange=True
-                ),
-                title_text="Intensity Vs. Distance",
-                plot_bgcolor="#FAEBD7",
-                paper_bgcolor="#FFDEAD",
-            )
-
-        elif dataset_df["class"][0] == "estimated1":
-            est_plt_df = dataset_df.from_records(data=dataset_df.data)
-            xi = list(est_plt_df.x)
-            yi = list(est_plt_df.y)
-            name = dataset_df["legend"][0]
-
-            fig.add_trace(
-                go.Scatter(
-                    x=xi,
-                    y=yi,
-                    name=name,
-                    mode="lines+markers",
-                    line=dict(color="rgb(214, 86, 23)", width=2),
-                    marker=dict(color="rgb(214, 86, 23)", size=6),
-                    customdata=xi,
-                    text=yi,
-                    hovertemplate="Hypocentral Dist. (km):  %{customdata}<br>"
-                    + "Estimated CDI:  %{text:.2f}",
-                )
-            )
-
-        elif dataset_df["class"][0] == "estimated2":
-            est_plt_df = dataset_df.from_records(data=dataset_df.data)
-            xi = list(est_plt_df.x)
-            yi = list(est_plt_df.y)
-            name = dataset_df["legend"][0]
-
-            fig.add_trace(
-                go.Scatter(
-                    x=xi,
-                    y=yi,
-                    name=name,
-                    mode="lines+markers",
-                    line=dict(color="orange", width=2),
-                    marker=dict(color="orange", size=6),
-                    customdata=xi,
-                    text=yi,
-                    hovertemplate="Hypocentral Dist. (km):  %{customdata}<br>"
-                    + "Estimated CDI:  %{text:.2f}",
-                )
-            )
-
-        elif dataset_df["class"][0] == "binned":
-            mean_plt_df = dataset_df.from_records(data=dataset_df.data)
-
-            # print(mean_plt_df)
-
-            xi = mean_plt_df.x
-            yi = mean_plt_df.y
-            yerr = mean_plt_df.stdev
-            xlabel = intensity_dist_df.xlabel[0]
-            ylabel = intensity_dist_df.ylabel[0]
-            name = dataset_df["legend"][0]
-
-            xx = list(mean_plt_df.x)
-            yy = list(mean_plt_df.y)
-            yyerr = list(mean_plt_df.stdev)
-            nk = np.empty(shape=(len(xx), 3, 1))
-            nk[:, 0] = np.array(xx).reshape(-1, 1)
-            nk[:, 1] = np.array(yy).reshape(-1, 1)
-            nk[:, 2] = np.array(yyerr).reshape(-1, 1)
-
-            fig.add_trace(
-                go.Scatter(
-                    x=xi,
-                    y=yi,
-                    name=name,
-                    error_y=dict(
-                        type="data",
-                        array=yerr,
-                        color="rgb(141, 145, 235)",
-                        visible=True,
-                    ),
-                    mode="markers",
-                    marker=dict(color="rgb(141, 145, 235)", size=6),
-                    customdata=nk,
-                    hovertemplate="Hypocentral Dist. (km):  %{customdata[0]}<br>"
-                    + "Mean CDI:  %{customdata[1]:.1f}<br>"
-                    + "Std. Dev. %{customdata[2]:.2f}",
-                )
-            )
-            fig.update_xaxes(title_text=xlabel)
-            fig.update_yaxes(title_text=ylabel)
-
-        elif dataset_df["class"][0] == "median":
-            median_plt_df = dataset_df.from_records(data=dataset_df.data)
-            xi = median_plt_df.x  # Distance
-            yi = median_plt_df.y  # CDI
-            xlabel = intensity_dist_df.xlabel[0]
-            name = dataset_df["legend"][0]
-
-            fig.add_trace(
-                go.Scatter(
-                    x=xi,
-                    y=yi,
-                    mode="markers",
-                    name=name,
-                    marker=dict(color="rgb(254, 77, 85)", size=6),
-                    customdata=xi,
-                    text=yi,
-                    hovertemplate="Hypocentral Dist. (km):  %{customdata}<br>"
-                    + "Median CDI:  %{text}",
-                )
-            )
-            fig.update_xaxes(title_text=xlabel, range=[0, max(xi)])
-
-    fig.update_layout(
-        margin={"r": 4, "t": 25, "l": 4, "b": 4},
-        legend=dict(
-            orientation="v",
-            x=1,
-            y=1.0,
-            xanchor="right",
-            bordercolor="Black",
-            borderwidth=1.0,
-        ),
-    )
-    # return fig
     return html.Div(
         [
             dcc.Graph(
@@ -824,6 +737,7 @@ def display_intensity_dist_plot(evnt_id):
     )
 
 
+@instrumented("display_response_time_plot")
 def display_response_time_plot(evnt_id):
     """Display a line graph of DYFI number of responses vs. time since earthquake event.
 
@@ -840,45 +754,7 @@ def display_response_time_plot(evnt_id):
         fig -- A figure containing a line graph of responses vs. time.
 
     """
-
-    filename = DATA_DIR / evnt_id / "dyfi_plot_numresp.json"
-    resp_time_df = pd.read_json(filename)
-
-    # print(len(resp_time_df), resp_time_df)
-
-    resp_time_ds_df = pd.DataFrame(resp_time_df.datasets[0])
-
-    # print(resp_time_ds_df)
-    resp_time_plot_df = resp_time_ds_df.from_records(data=resp_time_ds_df.data)
-
-    xi = list(resp_time_plot_df.x)
-    yi = list(resp_time_plot_df.y)
-    xlabel = resp_time_df.xlabel[0]
-    ylabel = resp_time_df.ylabel[0]
-    title = resp_time_df.title[0]
-
-    fig = go.Figure()
-    fig.add_trace(
-        go.Scatter(
-            x=xi,
-            y=yi,
-            mode="lines+markers",
-            line=dict(color="green", width=2),
-            marker=dict(color="green", size=6),
-            hovertemplate="Responses:  %{y}<br>"
-            + "Time Since Event:  %{x}<extra></extra>",
-        )
-    )
-    fig.update_xaxes(title_text=xlabel)
-    fig.update_yaxes(title_text=ylabel)
-
-    fig.update_layout(
-        title_text=title,
-        plot_bgcolor="#FAEBD7",
-        paper_bgcolor="#FFDEAD",
-        template="ggplot2",
-        margin={"r": 4, "t": 25, "l": 4, "b": 4},
-    )
+    fig = load_plot(evnt_id, "response_time")
 
     return html.Div(
         [
@@ -903,6 +779,7 @@ def display_response_time_plot(evnt_id):
     )
 
 
+@instrumented("display_dyfi_responses_tbl")
 def display_dyfi_responses_tbl(evnt_id):
     """Display a table of the DYFI responses information.
 
@@ -920,23 +797,15 @@ def display_dyfi_responses_tbl(evnt_id):
         table -- Object that contains the dbc.Table
 
     """
-    filename = DATA_DIR / evnt_id / "cdi_zip.csv"
-    dyfi_responses_df = pd.read_csv(filename, index_col=False)
-
-    # print(dyfi_responses_df, dyfi_responses_df.columns)
-
-    # table = dbc.Table.from_dataframe(dyfi_responses_df, striped=True, bordered=True, hover=True)  #, responsive=True)
+    dyfi_responses = load_plot(evnt_id, "dyfi_responses")
 
     table_header = [
-        html.Thead(html.Tr([html.Th(i) for i in dyfi_responses_df.columns]))
+        html.Thead(html.Tr([html.Th(i) for i in dyfi_responses["columns"]]))
     ]
 
     table_body = [
         html.Tbody(
-            [
-                html.Tr([html.Td(str(c)) for c in r])
-                for r in dyfi_responses_df.to_records(index=False)
-            ]
+            [html.Tr([html.Td(c) for c in r]) for r in dyfi_responses["rows"]]
         )
     ]
     # noinspection PyTypeChecker
@@ -1033,20 +902,35 @@ app.layout = dbc.Container(
                                         dcc.Dropdown(
                                             id="plot-type-dropdown",
                                             options=[
+                                                "Intensity Plot(Auto)",
                                                 "Intensity Plot(1km)",
                                                 "Intensity Plot(10km)",
                                                 "Zip Map",
                                                 "Intensity Vs. Distance",
                                                 "Response Vs. Time",
                                                 "DYFI Responses",
+                                                "Response Grid",
+                                                "Intensity Surface",
                                             ],
-                                            value="Intensity Plot(10km)",
+                                            value="Intensity Plot(Auto)",
                                             clearable=False,
                                             searchable=False,
                                             multi=False,
                                             disabled=False,
                                             style={"width": "77%"},
                                         ),  # 65%
+                                        html.Label("Response Grid Spacing (km)"),
+                                        dbc.Input(
+                                            id="grid-spacing-input",
+                                            type="number",
+                                            min=RESPONSE_GRID_SPACINGS.start,
+                                            max=RESPONSE_GRID_SPACINGS.stop - 1,
+                                            step=1,
+                                            size="md",
+                                            debounce=True,
+                                            value=RESPONSE_GRID_SPACING,
+                                            style={"width": "21.5%"},
+                                        ),
                                     ]
                                 ),
                             ],
@@ -1085,6 +969,13 @@ app.layout = dbc.Container(
                                         "width": "100%",
                                     },
                                 ),
+                                dcc.Store(id="map-grid-level"),
+                                dcc.Store(id="prefetch-event"),
+                                dcc.Interval(
+                                    id="product-poll",
+                                    interval=PRODUCT_POLL_INTERVAL,
+                                    disabled=True,
+                                ),
                             ],
                         )
                     ],
@@ -1103,11 +994,15 @@ app.layout = dbc.Container(
                     children=[
                         html.Div(
                             children=[
+                                html.Div(
+                                    id="plot-status",
+                                    style={"text-align": "center"},
+                                ),
                                 dcc.Loading(
                                     id="loading",
                                     children=[html.Div(id="graph-plot")],
                                     type="default",
-                                )
+                                ),
                             ],
                             style={"align-self": "center"},
                         ),
@@ -1190,17 +1085,169 @@ app.layout = dbc.Container(
 )
 
 
+register_layout(
+    "event_map",
+    mapbox=dict(domain=dict(x=[0.0, 1.0], y=[0.0, 1.0]), style="streets"),
+    coloraxis=dict(
+        colorscale=px.colors.sequential.Jet,
+        colorbar=dict(
+            orientation="h",
+            lenmode="pixels",
+            # len=435,
+            len=350,
+            thicknessmode="pixels",
+            thickness=4,
+            xanchor="left",
+            x=0,
+            xpad=3,
+            yanchor="top",
+        ),
+    ),
+    legend=dict(tracegroupgap=0),
+    title=dict(
+        text="South Carolina Earthquake Swarm Dec - 2021 to Present",
+        font=dict(color="#2F4F4F", size=14),
+    ),
+    template="ggplot2",
+    autosize=True,
+    margin=dict(t=30, b=0, l=0, r=0),
+    clickmode="event+select",
+    paper_bgcolor="#FAEBD7",
+    uirevision="foo",
+    hovermode="closest",
+    hoverdistance=2,
+)
+
+EVENT_CUSTOM_DATA = [
+    "Title",
+    "Place",
+    "Event_Date",
+    "Event_Time",
+    "Mag",
+    "Depth",
+    "Felt",
+    "CDI",
+    "id",
+]
+
+
+def event_map_figure(geo_dff, cells_df, zoom_level, map_ctr):
+    """Build the events map figure.
+
+    The figure is the same as the Plotly Express scatter_mapbox figure of the events (or of the grid cells), built
+    as a plain dictionary from the prevalidated "event_map" layout.
+
+    Parameters
+    ----------
+    geo_dff : pandas dataframe
+        The filtered rows of the event table.
+    cells_df : pandas dataframe
+        The filtered events aggregated into grid cells, or None to plot the individual events.
+    zoom_level : float
+        The initial map zoom level.
+    map_ctr : tuple
+        The initial map center (longitude, latitude).
+
+    Returns
+    -------
+    Python dictionary
+        fig -- The scatter mapbox map figure dictionary
+
+    """
+    trace = {
+        "type": "scattermapbox",
+        "subplot": "mapbox",
+        "legendgroup": "",
+        "name": "",
+        "showlegend": False,
+        "mode": "markers",
+    }
+    legend = {}
+    if cells_df is None:
+        color_title = "Mag"
+        trace.update(
+            lat=column(geo_dff, "Lat"),
+            lon=column(geo_dff, "Lon"),
+            customdata=custom_data(geo_dff, EVENT_CUSTOM_DATA),
+            hovertemplate="<br>".join(
+                [
+                    "Event Title: %{customdata[0]}",
+                    "Event Date: %{customdata[2]}",
+                    "Event Time: %{customdata[3]}",
+                    "Location: %{customdata[1]}",
+                    "Magnitude: %{customdata[4]}",
+                    "Lat:  %{lat},  "
+                    + "Lon:  %{lon}    "
+                    + "Depth(km):  %{customdata[5]}",
+                    "DYFI: %{customdata[6]}",
+                ]
+            ),
+            marker={
+                "color": column(geo_dff, "Mag"),
+                "coloraxis": "coloraxis",
+                "opacity": 0.75,
+                "size": 10,
+            },
+            unselected={"marker": {"opacity": 0.75, "size": 10}},
+            selected={"marker": {"opacity": 1, "size": 25}},
+        )
+    else:
+        color_title = "Max_Mag"
+        size_max = 30
+        trace.update(
+            lat=cells_df.Lat.to_numpy(),
+            lon=cells_df.Lon.to_numpy(),
+            customdata=cells_df[["Count", "Max_Mag", "Mean_Depth"]].to_numpy(),
+            hovertemplate="<br>".join(
+                [
+                    "Events: %{customdata[0]}",
+                    "Max. Magnitude: %{customdata[1]}",
+                    "Mean Depth(km):  %{customdata[2]}",
+                    "Zoom in to select individual events",
+                ]
+            ),
+            marker={
+                "color": cells_df.Max_Mag.to_numpy(),
+                "coloraxis": "coloraxis",
+                "opacity": 0.75,
+                "size": cells_df.Count.to_numpy(),
+                "sizemode": "area",
+                # Plotly's sizeref for sizemode "area", which draws the largest cell size_max pixels across.
+                "sizeref": 2 * cells_df.Count.max() / size_max**2,
+            },
+        )
+        legend["itemsizing"] = "constant"
+
+    return figure(
+        [trace],
+        "event_map",
+        mapbox={
+            "center": {"lat": map_ctr[1], "lon": map_ctr[0]},
+            "zoom": zoom_level,
+            "accesstoken": mapbox_access_token,
+        },
+        coloraxis={"colorbar": {"title": {"text": color_title}}},
+        legend=legend,
+    )
+
+
 @app.callback(
     Output("map-graph", "figure"),
+    Output("map-grid-level", "data"),
     Input("my-date-picker-range", "start_date"),
     Input("my-date-picker-range", "end_date"),
     Input("min-mag-input", "value"),
     Input("max-mag-input", "value"),
+    Input("map-graph", "relayoutData"),
+    State("map-grid-level", "data"),
 )
-def update_output(start_date, end_date, input1, input2):
+@instrumented("update_output")
+def update_output(start_date, end_date, input1, input2, relayout_data, grid_level):
     """Map callback function
 
-    Callback function that returns a map figure based on the date range and magnitude range inputs.
+    Callback function that returns a map figure based on the date range and magnitude range inputs.  When the map is
+    zoomed out over a large number of events, the events are aggregated into grid cells and one marker per cell is
+    plotted instead of one marker per event.
 
     Parameters
     ----------
@@ -1212,102 +1259,138 @@ def update_output(start_date, end_date, input1, input2):
         Minimum magnitude value for filter
     input2 : int
         Maximum magnitude value for filter
+    relayout_data : Python dictionary
+        The map-graph relayout data; used for the current map zoom level.
+    grid_level : float
+        The grid cell size of the currently displayed map, None if individual events are displayed.
 
     Returns
     -------
-    plotly.graph_objects.Figure
-        fig -- The Plotly Express scatter mapbox map figure object
+    Python dictionary
+        fig -- The scatter mapbox map figure dictionary
+    float
+        cell_size -- The grid cell size of the aggregated events, None if individual events are displayed.
 
     """
-    geo_dff = geo_df[
-        (geo_df["Event_Date"] >= date.fromisoformat(start_date))
-        & (geo_df["Event_Date"] <= date.fromisoformat(end_date))
-        & (geo_df["Mag"] >= input1)
-        & (geo_df["Mag"] <= input2)
-    ]
+    data = event_reloader.data
+    geo_df = data.events_df
+    with phase("filter"):
+        event_mask = event_filter(
+            geo_df,
+            date.fromisoformat(start_date),
+            date.fromisoformat(end_date),
+            input1,
+            input2,
+        )
+        geo_dff = geo_df[event_mask]
 
-    lats = geo_dff.geometry.y
-    lons = geo_dff.geometry.x
+    lats = pd.Series(column(geo_dff, "Lat"))
+    lons = pd.Series(column(geo_dff, "Lon"))
     zoom_level, map_ctr = determine_zoom_level(lons, lats)
 
-    fig = px.scatter_mapbox(
-        geo_dff,
-        lat=geo_dff.geometry.y,
-        lon=geo_dff.geometry.x,
-        color=geo_dff.Mag,
-        custom_data=[
-            "Title",
-            "Place",
-            "Event_Date",
-            "Event_Time",
-            "Mag",
-            "Depth",
-            "Felt",
-            "CDI",
-            "id",
+    map_zoom = zoom_level
+    if relayout_data and "mapbox.zoom" in relayout_data:
+        map_zoom = relayout_data["mapbox.zoom"]
+    cell_size = grid_level_for_zoom(map_zoom, len(geo_dff))
+
+    # Panning or zooming within the same aggregation level does not change the figure.
+    if ctx.triggered_id == "map-graph" and cell_size == grid_level:
+        raise PreventUpdate
+
+    cells_df = None
+    if cell_size is not None:
+        with phase("aggregate"):
+            cells_df = aggregate_events(
+                geo_dff, data.grid_index[cell_size][event_mask]
+            )
+    with phase("build"):
+        fig = event_map_figure(geo_dff, cells_df, zoom_level, map_ctr)
+    return fig, cell_size
+
+
+# A new selection or plot type supersedes the render in progress; Dash cancels its background job.  Changing the map
+# filters cancels it too, since the selected event may no longer be on the map.  A new selection likewise cancels the
+# background prefetch of the previous one.
+if background_callback_manager is not None:
+    PREFETCH_CALLBACK_OPTIONS = dict(background=True)
+    PLOT_CALLBACK_OPTIONS = dict(
+        background=True,
+        interval=250,
+        running=[(Output("plot-status", "children"), "Rendering plot ...", "")],
+        cancel=[
+            Input("my-date-picker-range", "start_date"),
+            Input("my-date-picker-range", "end_date"),
+            Input("min-mag-input", "value"),
+            Input("max-mag-input", "value"),
         ],
-        color_continuous_scale=px.colors.sequential.Jet,
-        # zoom=11.25,
-        zoom=zoom_level,
-        # center=dict(lat=34.170983, lon=-80.794252),
-        center=dict(lat=map_ctr[1], lon=map_ctr[0]),
-        title="South Carolina Earthquake Swarm Dec - 2021 to Present",
-        template="ggplot2",
     )
+else:
+    PREFETCH_CALLBACK_OPTIONS = {}
+    PLOT_CALLBACK_OPTIONS = {}
 
-    fig.update_layout(
-        mapbox_style="streets",
-        mapbox_accesstoken=mapbox_access_token,
-        coloraxis_colorbar=dict(
-            orientation="h",
-            lenmode="pixels",
-            # len=435,
-            len=350,
-            thicknessmode="pixels",
-            thickness=4,
-            xanchor="left",
-            x=0,
-            xpad=3,
-            yanchor="top",
-        ),
-        title=dict(font=dict(color="#2F4F4F", size=14)),
-        autosize=True,
-        margin=dict(t=30, b=0, l=0, r=0),
-        clickmode="event+select",
-        paper_bgcolor="#FAEBD7",
-        uirevision="foo",
-        hovermode="closest",
-        hoverdistance=2,
-    )
 
-    fig.update_traces(
-        hovertemplate="<br>".join(
-            [
-                "Event Title: %{customdata[0]}",
-                "Event Date: %{customdata[2]}",
-                "Event Time: %{customdata[3]}",
-                "Location: %{customdata[1]}",
-                "Magnitude: %{customdata[4]}",
-                "Lat:  %{lat},  " + "Lon:  %{lon}    " + "Depth(km):  %{customdata[5]}",
-                "DYFI: %{customdata[6]}",
-            ]
-        ),
-        mode="markers",
-        marker={"opacity": 0.75, "size": 10},
-        unselected={"marker": {"opacity": 0.75, "size": 10}},
-        selected={"marker": {"opacity": 1, "size": 25}},
-    )
-    return fig
+def grid_spacing_km(grid_spacing):
+    """Return the grid-spacing-input value as a Response Grid spacing in km; the default for an invalid value."""
+    if grid_spacing is None or grid_spacing != int(grid_spacing) or int(grid_spacing) not in RESPONSE_GRID_SPACINGS:
+        return RESPONSE_GRID_SPACING
+    return int(grid_spacing)
+
+
+def plot_artifact(plot_type, grid_spacing):
+    """Return the artifact name of a plot type; the Response Grid's is that of the grid-spacing-input value."""
+    if plot_type == "Response Grid":
+        return RESPONSE_GRID_ARTIFACT.format(grid_spacing_km(grid_spacing))
+    return PLOT_TYPES[plot_type]
+
+
+def products_message(event_id, artifact):
+    """Return the message shown in place of a graph-plot whose DYFI files have not been downloaded.
+
+    The files are downloaded by the product loader's threads while the message is shown, and the product-poll
+    interval calls plot_graphs() again until they are.  A background callback worker process has no threads that
+    outlive the callback, so it downloads them itself while the plot-status placeholder is shown.
+
+    Parameters
+    ----------
+    event_id : String
+        The USGS.gov id string of the selected earthquake event.
+    artifact : String
+        The plot artifact name; one of the figures.PLOT_TYPES values.
+
+    Returns
+    -------
+    String or None
+        message -- None if the plot can be built.
+    bool
+        downloading -- True while the files are being downloaded.
+
+    """
+    if not missing_sources(event_id, artifact, DATA_DIR):
+        return None, False
+    if background_callback_manager is None:
+        error = product_loader.request(event_id)
+        if error is None:
+            return "Downloading the DYFI data of this event from USGS.gov ...", True
+    else:
+        error = product_loader.load(event_id)
+        if error is None:
+            return None, False
+    return f"The DYFI data of this event could not be downloaded ({error}).", False
 
 
 @app.callback(
     Output("graph-plot", "children"),
     Output("plot-type-dropdown", "disabled"),
+    Output("product-poll", "disabled"),
     Input("map-graph", "selectedData"),
     Input("plot-type-dropdown", "value"),
+    Input("product-poll", "n_intervals"),
+    Input("grid-spacing-input", "value"),
     prevent_initial_call=False,
+    **PLOT_CALLBACK_OPTIONS,
 )
-def plot_graphs(selected_data, user_input):
+@instrumented("plot_graphs")
+def plot_graphs(selected_data, user_input, poll_intervals, grid_spacing):  # pylint: disable='unused-argument'
     """graph-plot callback function
 
     Callback function that returns and displays the graph plot that is selected.
@@ -1318,14 +1401,22 @@ def plot_graphs(selected_data, user_input):
         A Python dictionary containing the event data of the selected point on the map.
     user_input : string
         A string representing the graph plot type selected from the dropdown.
+    poll_intervals : int
+        The number of product-poll intervals; only used to call back while the event's DYFI files are downloaded.
+    grid_spacing : float
+        The Response Grid cell spacing in km.
 
     Returns
     -------
     html.Div which contains a html.P with a text message if the seledtedData is None or the felt responses is zero or
-    html.Div which was returned from one of the graph-plot functions
+    the event's DYFI data is being downloaded, or html.Div which was returned from one of the graph-plot functions
     A boolean -- Indicating whether the plot-type-dropdown is disabled or not
+    A boolean -- Indicating whether the product-poll interval is disabled or not
     """
 
+    if ctx.triggered_id == "grid-spacing-input" and user_input != "Response Grid":
+        raise PreventUpdate
+
     if selected_data is None:
         return (
             html.Div(
@@ -1350,6 +1441,25 @@ def plot_graphs(selected_data, user_input):
                 className="center",
             ),
             False,
+            True,
+        )
+    elif len(selected_data["points"][0]["customdata"]) < 9:
+        # An aggregated grid cell marker was selected instead of an event
+        return (
+            html.Div(
+                html.P("""Zoom in on the map to select an individual event."""),
+                style={
+                    "text-align": "center",
+                    "margin": "10px 0",
+                    "padding": "5px",
+                    "border": "1px solid #999",
+                    "display": "flex",
+                    "flex-direction": "column",
+                },
+                className="center",
+            ),
+            False,
+            True,
         )
     else:
         event_id = selected_data["points"][0]["customdata"][8]
@@ -1379,19 +1489,145 @@ def plot_graphs(selected_data, user_input):
                     className="center",
                 ),
                 True,
+                True,
+            )
+
+        message, downloading = (
+            products_message(event_id, plot_artifact(user_input, grid_spacing))
+            if event_id and user_input in PLOT_TYPES
+            else (None, False)
+        )
+        if message is not None:
+            return (
+                html.Div(
+                    html.P(message),
+                    style={
+                        "text-align": "center",
+                        "margin": "10px 0",
+                        "padding": "5px",
+                        "border": "1px solid #999",
+                        "display": "flex",
+                        "flex-direction": "column",
+                    },
+                    className="center",
+                ),
+                False,
+                not downloading,
             )
+
+        if event_id and user_input == "Intensity Plot(Auto)":
+            graph_plot = display_intensity_plot_auto(event_id, selected_data)
         elif event_id and user_input == "Intensity Plot(1km)":
-            return display_intensity_plot_1km(event_id, selected_data), False
+            graph_plot = display_intensity_plot_1km(event_id, selected_data)
         elif event_id and user_input == "Intensity Plot(10km)":
-            return display_intensity_plot_10km(event_id, selected_data), False
+            graph_plot = display_intensity_plot_10km(event_id, selected_data)
         elif event_id and user_input == "Zip Map":
-            return display_zip_plot(event_id, selected_data), False
+            graph_plot = display_zip_plot(event_id, selected_data)
         elif event_id and user_input == "Intensity Vs. Distance":
-            return display_intensity_dist_plot(event_id), False
+            graph_plot = display_intensity_dist_plot(event_id)
         elif event_id and user_input == "Response Vs. Time":
-            return display_response_time_plot(event_id), False
+            graph_plot = display_response_time_plot(event_id)
         elif event_id and user_input == "DYFI Responses":
-            return display_dyfi_responses_tbl(event_id), False
+            graph_plot = display_dyfi_responses_tbl(event_id)
+        elif event_id and user_input == "Response Grid":
+            graph_plot = display_response_grid_plot(event_id, selected_data, grid_spacing_km(grid_spacing))
+        elif event_id and user_input == "Intensity Surface":
+            graph_plot = display_intensity_surface_plot(event_id, selected_data)
+        else:
+            return None
+        return graph_plot, False, True
+
+
+@app.callback(
+    Output("intensity-map", "figure"),
+    Output("intensity-cells", "data"),
+    Input("intensity-map", "relayoutData"),
+    State("intensity-cells", "data"),
+    prevent_initial_call=True,
+)
+@instrumented("extend_intensity_map")
+def extend_intensity_map(relayout_data, cells):
+    """Intensity map relayout callback function
+
+    Adds the cells that the panned or zoomed intensity map shows, and that were not sent yet, to its figure.  When
+    the zoom of the multi-resolution map calls for another level, its cells in view replace the shown level's.
+
+    Parameters
+    ----------
+    relayout_data : Python dictionary
+        The intensity-map relayout data.
+    cells : Python dictionary
+        The intensity-cells store data; see load_intensity_plot().
+
+    Returns
+    -------
+    dash.Patch
+        The cells to add to the intensity map's choropleth trace, or its new level's trace and title.
+    Python dictionary
+        The intensity-cells data, with the new map area and level.
+
+    """
+    bounds = viewport_bounds(relayout_data)
+    if bounds is None or not cells:
+        raise PreventUpdate
+    fig = load_plot(cells["event_id"], cells["artifact"], epicenter=cells["epicenter"])
+    level = cells.get("level")
+    if level is not None:
+        level = intensity_level(fig, relayout_data, level)
+        fig = level_figure(fig, level)
+    index = cell_indexes.get((cells["event_id"], cells["artifact"], level), fig["data"][0])
+    patch = Patch()
+    if level != cells.get("level"):
+        # Another level of the multi-resolution map: replace its choropleth trace with the new level's cells in view.
+        patch["data"][0] = cull_figure(fig, index, index.query(bounds))["data"][0]
+        patch["layout"]["title"]["text"] = level_title(level)
+        return patch, dict(cells, level=level, sent=[bounds])
+    new_cells = index.query_new(bounds, cells["sent"])
+    if len(new_cells) == 0:
+        raise PreventUpdate
+    values = index.values(new_cells)
+    patch["data"][0]["geojson"]["features"].extend(values.pop("features"))
+    for key, cell_list in values.items():
+        patch["data"][0][key].extend(cell_list)
+    return patch, dict(cells, sent=cells["sent"] + [bounds])
+
+
+@app.callback(
+    Output("prefetch-event", "data"),
+    Input("map-graph", "selectedData"),
+    **PREFETCH_CALLBACK_OPTIONS,
+)
+def schedule_prefetch(selected_data):
+    """Prefetch callback function
+
+    Queues the graph-plots of the selected event and of its neighbor events for prefetching by the prefetch threads
+    or, when the graph-plots are rendered by background callbacks, builds their missing artifacts in a background
+    worker process.
+
+    Parameters
+    ----------
+    selected_data : Python dictionary
+        A dictionary containing the basic event data of the selected event
+
+    Returns
+    -------
+    String
+        event_id -- The id of the event whose plots were prefetched.
+
+    """
+    if (
+        not selected_data
+        or not selected_data["points"]
+        or len(selected_data["points"][0]["customdata"]) < 9
+        or selected_data["points"][0]["customdata"][6] == 0
+    ):
+        raise PreventUpdate
+    event_id = selected_data["points"][0]["customdata"][8]
+    if background_callback_manager is None:
+        prefetch_plots(event_id, selected_data)
+    else:
+        prefetch_artifacts(event_id, selected_data)
+    return event_id
 
 
 if __name__ == "__main__":
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+Dash background callback manager for the earthquake data app.
+
+Background callbacks run in a worker process that Dash's DiskcacheManager forks from the Flask request thread, one
+process per job, and their results are passed back through a diskcache cache on local disk.  A new request from the
+same callback, or a change of one of its cancel inputs, terminates the job in progress.
+
+A forked process only has the thread that forked it, but it inherits every lock that another thread of the server was
+holding at that moment.  If another request thread was inside SQLite (diskcache) at the time of the fork, the worker
+blocks forever on its first cache write and its request never finishes.  DiskcacheJobManager holds one lock around
+all of the server's cache access and around the forks, so a fork never happens inside SQLite.  It also treats a job
+process that exits while it is being checked as finished, instead of failing the poll request.
+
+A job process also ends with every change the callback made to the server's in-memory state, e.g. the metrics it
+recorded.  Objects registered with DiskcacheJobManager.share() carry that state back: begin_job() is called in the job
+process before the callback, and end_job() after it, whether it returns or raises; end_job()'s value is stored in the
+cache before the job's result, and passed to the object's merge_job() in the server process with the result.
+
+background.py module contains the following:
+
+    DiskcacheJobManager - a DiskcacheManager that is safe to fork from a threaded Flask server.
+    make_background_manager() - returns a DiskcacheJobManager, or None if its dependencies are not installed.
+"""
+
+import functools
+import threading
+
+from dash import DiskcacheManager
+
+try:
+    import diskcache
+    import psutil
+except ImportError:
+    diskcache = None
+
+_manager_lock = threading.RLock()
+# The result key of the job run by this process, when it is a job process.
+_job = {"key": None}
+
+
+def _state_key(key):
+    return f"{key}-state"
+
+
+def _locked(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with _manager_lock:
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+class DiskcacheJobManager(DiskcacheManager):
+    """A DiskcacheManager that never forks a job process while another server thread is using the cache, and that
+    carries the state of the shared objects back from the job processes."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._shared = []
+
+    def share(self, *objects):
+        """Carry the state of objects with begin_job(), end_job() and merge_job() methods back from every job."""
+        self._shared.extend(objects)
+
+    def make_job_fn(self, fn, progress, key=None):
+        @functools.wraps(fn)
+        def shared_fn(*args, **kwargs):
+            for obj in self._shared:
+                obj.begin_job()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                states = [obj.end_job() for obj in self._shared]
+                # The state of a cancelled job, whose result is never read, expires with it.
+                self.handle.set(_state_key(_job["key"]), states, expire=self.expire)
+
+        job_fn = super().make_job_fn(shared_fn, progress, key)
+
+        def state_job_fn(result_key, *args):
+            _job["key"] = result_key
+            return job_fn(result_key, *args)
+
+        return state_job_fn
+
+    @_locked
+    def get_result(self, key, job):
+        result = super().get_result(key, job)
+        if result is not self.UNDEFINED:
+            states = self.handle.pop(_state_key(key), None)
+            for obj, state in zip(self._shared, states or []):
+                obj.merge_job(state)
+        return result
+
+    call_job_fn = _locked(DiskcacheManager.call_job_fn)
+    get_progress = _locked(DiskcacheManager.get_progress)
+    result_ready = _locked(DiskcacheManager.result_ready)
+    terminate_job = _locked(DiskcacheManager.terminate_job)
+    clear_cache_entry = _locked(DiskcacheManager.clear_cache_entry)
+
+    @_locked
+    def job_running(self, job):
+        try:
+            return super().job_running(job)
+        except psutil.NoSuchProcess:
+            return False
+
+
+def make_background_manager(cache_dir, expire=600):
+    """Return a background callback manager with its cache in a directory.
+
+    Parameters
+    ----------
+    cache_dir : Path
+        The diskcache cache directory.
+    expire : int
+        Seconds after which an unread job result is removed from the cache.
+
+    Returns
+    -------
+    DiskcacheJobManager or None
+        The manager, or None if diskcache, multiprocess or psutil is not installed.
+
+    """
+    if diskcache is None:
+        return None
+    try:
+        return DiskcacheJobManager(diskcache.Cache(cache_dir), expire=expire)
+    except ImportError:
+        # DiskcacheManager also needs multiprocess.
+        return None
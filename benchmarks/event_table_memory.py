@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+Memory report of the compact event table against the events GeoDataFrame it replaced.
+
+A synthetic catalog (benchmarks/usgs_replay.py) of --events events is loaded both ways: as the event table of
+event_table.py, and as the GeoDataFrame of shapely Points and Python date, time and string objects that the app used to
+keep (event_table.to_geodataframe() builds the same columns).  For each, the bytes per event of every column are
+printed, as counted by pandas (memory_usage(deep=True)), along with the growth of the process's resident memory when
+the table is built, which also counts the GEOS geometries that pandas does not see.
+
+Run from the repository root:
+
+    python3 benchmarks/event_table_memory.py --events 100000
+"""
+
+import argparse
+import gc
+import os
+import sys
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+
+import event_table  # noqa: E402
+from usgs_replay import synthetic_catalog  # noqa: E402
+
+
+def _rss():
+    """Return the process's resident memory in bytes, or None where /proc is not available."""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as fin:
+            return int(fin.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def measure(build):
+    """Build a table; returns the table and the growth of resident memory while building it."""
+    gc.collect()
+    before = _rss()
+    table = build()
+    gc.collect()
+    after = _rss()
+    return table, (after - before if before is not None else None)
+
+
+def report(label, table, rss_growth):
+    n_events = len(table)
+    usage = table.memory_usage(deep=True, index=False)
+    print(f"{label}: {n_events} events")
+    for name, n_bytes in usage.items():
+        print(f"    {name:14} {str(table[name].dtype):10} {n_bytes / n_events:9.1f} bytes/event")
+    print(f"    {'total (pandas)':25} {usage.sum() / n_events:9.1f} bytes/event")
+    if rss_growth is not None:
+        print(f"    {'resident memory growth':25} {rss_growth / n_events:9.1f} bytes/event")
+    return {"pandas": usage.sum() / n_events, "rss": rss_growth / n_events if rss_growth is not None else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="event_table_memory", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=100_000, help="Number of synthetic catalog events")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the synthetic catalog")
+    args = parser.parse_args()
+
+    features, _ = synthetic_catalog(args.events, ["none"], args.seed)
+    for feature in features:
+        feature["properties"]["detail"] = event_table.event_url(feature["id"])
+
+    table, table_rss = measure(lambda: event_table.events_from_features(features))
+    geo_df, geo_rss = measure(lambda: event_table.to_geodataframe(table))
+    before = report("events GeoDataFrame (before)", geo_df, geo_rss)
+    after = report("event table (after)", table, table_rss)
+    print(f"pandas bytes/event: {before['pandas']:.1f} -> {after['pandas']:.1f} "
+          f"({before['pandas'] / after['pandas']:.1f}x smaller)")
+    if before["rss"] is not None:
+        print(f"resident bytes/event: {before['rss']:.1f} -> {after['rss']:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+Equivalence check of the plain dictionary figures against the plotly.graph_objects figures they replaced.
+
+The graph-plot figures of figures.py and the events map figure of Earthquakes_v2.py are built as plain dictionaries by
+figure_factory.py.  This script builds every figure both ways, the graph_objects way with the code of a reference git
+revision (by default the last revision that built the figures through plotly.graph_objects and Plotly Express), and
+compares their JSON.  Each dictionary figure is also run through figure_factory.validate_figure() to check that
+plotly.graph_objects accepts it unchanged.  The differences are printed, and the exit status is 1 if there are any.
+
+With --save the reference figures are written as normalized JSON instead, to the directory the tests compare against
+(tests/reference), so that the tests do not need the reference revision in the git history.
+
+Run from the repository root (a .mapbox_token file is required to import the app):
+
+    python3 benchmarks/figure_equivalence.py
+    python3 benchmarks/figure_equivalence.py -e se60401376 --rev <git revision>
+    python3 benchmarks/figure_equivalence.py -e se60164643 -e se60154248 -e se60401376 --save tests/reference
+"""
+
+import argparse
+import ast
+import gzip
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+os.chdir(REPO_DIR)
+sys.path.insert(0, str(REPO_DIR))
+
+import numpy as np  # noqa: E402
+from plotly.io.json import to_json_plotly  # noqa: E402
+
+import event_grid  # noqa: E402
+import event_table  # noqa: E402
+import figures  # noqa: E402
+from figure_factory import validate_figure  # noqa: E402
+from viewport import CellIndex, cull_figure  # noqa: E402
+
+REFERENCE_REV = "9fced5fc3861228ddf54c5ad35cf088060794a62"
+REFERENCE_DIR = REPO_DIR / "tests" / "reference"
+# The plot types that were built through plotly.graph_objects before; the others never had a reference figure.
+REFERENCE_ARTIFACTS = (
+    "intensity_1km", "intensity_10km", "zip_map", "intensity_dist", "response_time", "dyfi_responses"
+)
+MAPBOX_TOKEN = "<mapbox access token>"  # stands in for the token in the saved and compared figures
+CELL_TOLERANCE = 1.5e-5  # degrees; the regenerated cell corners may differ from the USGS ones in the last decimal
+
+
+def _app():
+    """Import the app only when the event map is checked; the graph-plot checks do not need a .mapbox_token file."""
+    import Earthquakes_v2  # pylint: disable='import-outside-toplevel'
+
+    return Earthquakes_v2
+
+
+def _git_show(rev, path):
+    return subprocess.run(
+        ["git", "show", f"{rev}:{path}"], capture_output=True, text=True, check=True
+    ).stdout
+
+
+def reference_figures(rev):
+    """Import figures.py of a git revision as a separate module."""
+    with tempfile.TemporaryDirectory(prefix="eq-ref-") as tmp:
+        filename = Path(tmp) / "reference_figures.py"
+        filename.write_text(_git_show(rev, "figures.py"), encoding="utf-8")
+        spec = importlib.util.spec_from_file_location("reference_figures", filename)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    module.DATA_DIR = figures.DATA_DIR
+    return module
+
+
+def reference_event_map_figure(rev):
+    """Return the event_map_figure() function of Earthquakes_v2.py of a git revision."""
+    app_module = _app()
+    tree = ast.parse(_git_show(rev, "Earthquakes_v2.py"))
+    func = next(
+        node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name == "event_map_figure"
+    )
+    namespace = {"px": app_module.px, "mapbox_access_token": app_module.mapbox_access_token}
+    exec(compile(ast.Module(body=[func], type_ignores=[]), "event_map_figure", "exec"), namespace)
+    return namespace["event_map_figure"]
+
+
+def _normalized(fig):
+    normalized = json.loads(to_json_plotly(fig))
+    mapbox = normalized.get("layout", {}).get("mapbox") if isinstance(normalized, dict) else None
+    if isinstance(mapbox, dict) and "accesstoken" in mapbox:
+        mapbox["accesstoken"] = MAPBOX_TOKEN
+    return normalized
+
+
+def reference_file(label, directory=REFERENCE_DIR):
+    return Path(directory) / f"{label}.json.gz"
+
+
+def save_reference(label, fig, directory=REFERENCE_DIR):
+    """Write the normalized JSON of a reference figure, gzipped without a time stamp so that it is reproducible."""
+    path = reference_file(label, directory)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = json.dumps(_normalized(fig), sort_keys=True, separators=(",", ":")).encode("utf-8")
+    with open(path, "wb") as fout, gzip.GzipFile(fileobj=fout, mode="wb", mtime=0) as gz:
+        gz.write(data)
+
+
+def load_reference(label, directory=REFERENCE_DIR):
+    """Read a reference figure written by save_reference(); FileNotFoundError if there is none."""
+    with gzip.open(reference_file(label, directory), "rt", encoding="utf-8") as fin:
+        return json.load(fin)
+
+
+def differences(expected, actual, path=""):
+    """Return the paths at which two JSON values differ."""
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        diffs = []
+        for key in sorted(set(expected) | set(actual)):
+            if key not in actual:
+                diffs.append(f"{path}/{key}: missing")
+            elif key not in expected:
+                diffs.append(f"{path}/{key}: unexpected")
+            else:
+                diffs.extend(differences(expected[key], actual[key], f"{path}/{key}"))
+        return diffs
+    if isinstance(expected, list) and isinstance(actual, list):
+        if len(expected) != len(actual):
+            return [f"{path}: length {len(actual)} != {len(expected)}"]
+        diffs = []
+        for i, (exp, act) in enumerate(zip(expected, actual)):
+            diffs.extend(differences(exp, act, f"{path}/{i}"))
+        return diffs
+    if expected != actual:
+        return [f"{path}: {str(actual)[:60]!r} != {str(expected)[:60]!r}"]
+    return []
+
+
+def expanded(fig):
+    """Return a figure whose intensity cells stored as a cell table (see utm_cells.py) are geojson features."""
+    if isinstance(fig, dict) and fig.get("data") and "utm_cells" in fig["data"][0]:
+        index = CellIndex(fig["data"][0])
+        return cull_figure(fig, index, np.arange(index.n_cells))
+    return fig
+
+
+def _pop_cells(fig):
+    """Remove the intensity cell features of a normalized figure; return their names and corner coordinates."""
+    cells = []
+    for trace in fig.get("data", []) if isinstance(fig, dict) else []:
+        geojson = trace.get("geojson")
+        if trace.get("featureidkey") == "properties.name" and isinstance(geojson, dict) and "features" in geojson:
+            features = geojson.pop("features")
+            cells.append([(f["properties"]["name"], f["geometry"]["coordinates"]) for f in features])
+    return cells
+
+
+def cell_differences(expected, actual):
+    """Return the cells whose names differ, or whose corners differ by more than CELL_TOLERANCE."""
+    if len(expected) != len(actual):
+        return [f"/geojson: {len(actual)} traces != {len(expected)}"]
+    diffs = []
+    for trace_cells, (expected_cells, actual_cells) in enumerate(zip(expected, actual)):
+        if len(expected_cells) != len(actual_cells):
+            diffs.append(f"/data/{trace_cells}/geojson: {len(actual_cells)} cells != {len(expected_cells)}")
+            continue
+        for i, ((exp_name, exp_coords), (act_name, act_coords)) in enumerate(zip(expected_cells, actual_cells)):
+            if exp_name != act_name:
+                diffs.append(f"/data/{trace_cells}/geojson/features/{i}: {act_name!r} != {exp_name!r}")
+            elif np.shape(exp_coords) != np.shape(act_coords) or not np.allclose(
+                exp_coords, act_coords, rtol=0, atol=CELL_TOLERANCE
+            ):
+                diffs.append(f"/data/{trace_cells}/geojson/features/{i}: corners differ")
+    return diffs
+
+
+def check(label, expected_fig, actual_fig):
+    """Compare a dictionary figure with its reference figure; returns the number of differences.
+
+    The geojson features of the intensity maps are compared by name and corners only, as the cells are regenerated
+    from cell tables.
+    """
+    actual_fig = expanded(actual_fig)
+    actual = _normalized(actual_fig)
+    expected = _normalized(expected_fig)
+    validated = None
+    if isinstance(actual_fig, dict) and "data" in actual_fig:
+        validated = _normalized(validate_figure(actual_fig))
+    actual_cells = _pop_cells(actual)
+    diffs = cell_differences(_pop_cells(expected), actual_cells)
+    diffs += differences(expected, actual)
+    if validated is not None:
+        validated_diffs = cell_differences(_pop_cells(validated), actual_cells) + differences(validated, actual)
+        diffs += [f"validated{d}" for d in validated_diffs]
+    for diff in diffs[:10]:
+        print(f"{label}: {diff}")
+    if len(diffs) > 10:
+        print(f"{label}: ... {len(diffs) - 10} more differences")
+    return len(diffs)
+
+
+def epicenter_of(evnt_id, events_df=None):
+    """Return the epicenter of a bundled event, from the app's event table or from the catalog file."""
+    if events_df is None:
+        events_df = event_table.read_events(figures.DATA_DIR / "SC_Earthquake.geojson")
+    epicenter = event_table.find_epicenter(events_df, evnt_id)
+    return epicenter or {"lat": 34.0, "lon": -81.0, "place": "No Location"}
+
+
+def reference_cases(rev, events):
+    """Yield the label, the reference figure and a function that builds the dictionary figure, of each check."""
+    app_module = _app()
+    reference = reference_figures(rev)
+    for evnt_id in events:
+        epicenter = epicenter_of(evnt_id, app_module.event_reloader.data.events_df)
+        for artifact in figures.PLOT_TYPES.values():
+            try:
+                expected = reference.build_plot(artifact, evnt_id, epicenter)
+            except Exception:  # pylint: disable='broad-exception-caught'
+                # The reference cannot build this plot either (e.g. an empty responses histogram).
+                continue
+            yield (
+                f"{evnt_id}/{artifact}",
+                expected,
+                lambda a=artifact, e=evnt_id, c=epicenter: figures.build_plot(a, e, c),
+            )
+
+    reference_map = reference_event_map_figure(rev)
+    geo_df, grid_index, _ = app_module.event_reloader.data
+    # The reference code plots a GeoDataFrame of the same events.
+    reference_geo_df = event_table.to_geodataframe(geo_df)
+    zoom_level, map_ctr = app_module.determine_zoom_level(
+        event_table.column(geo_df, "Lon"), event_table.column(geo_df, "Lat")
+    )
+    cases = {"event_map/events": None}
+    for cell_size in (0.05, 0.25):
+        cell_keys = grid_index[cell_size]
+        cases[f"event_map/cells-{cell_size}"] = event_grid.aggregate_events(geo_df, cell_keys)
+    for label, cells_df in cases.items():
+        expected = reference_map(reference_geo_df, cells_df, zoom_level, map_ctr)
+        if cells_df is not None:
+            # Plotly Express sizes the cell markers with max / size_max**2, which draws the largest one sqrt(2) times
+            # size_max across; the app uses Plotly's 2 * max / size_max**2 for sizemode "area" instead.
+            expected.update_traces(marker_sizeref=2 * expected.data[0].marker.sizeref)
+        yield label, expected, lambda c=cells_df: app_module.event_map_figure(geo_df, c, zoom_level, map_ctr)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="figure_equivalence", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-e", "--event", action="append", dest="events", help="Bundled event id (may be repeated)")
+    parser.add_argument("--rev", default=REFERENCE_REV, help="Git revision of the reference figure code")
+    parser.add_argument("--save", metavar="DIR", help="Write the reference figures to DIR instead of comparing them")
+    args = parser.parse_args()
+
+    events = args.events or sorted(d.name for d in figures.DATA_DIR.glob("se*") if d.is_dir())
+    n_checked = n_failed = 0
+    for label, expected, build in reference_cases(args.rev, events):
+        n_checked += 1
+        if args.save:
+            save_reference(label, expected, args.save)
+        else:
+            n_failed += bool(check(label, expected, build()))
+
+    if args.save:
+        print(f"{n_checked} reference figures saved to {args.save}")
+        return
+    print(f"{n_checked} figures checked, {n_failed} differ")
+    sys.exit(1 if n_failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+Multi-user load test of a running Earthquakes_v2 server.
+
+Simulated users post Dash callback requests to the server's /_dash-update-component endpoint, the same requests a
+browser sends:
+
+    filter  -- update_output with a new date range and magnitude range.
+    zoom    -- update_output with the map's relayoutData after a zoom or pan.
+    select  -- plot_graphs with a map selection (the event's customdata) and a plot type.
+
+Each user draws its actions, events and think times from its own random generator, seeded from --seed and the user's
+number, so a traffic mix is reproduced exactly by rerunning with the same arguments.  A callback that runs as a Dash
+background callback is polled for its result, like the browser does, and its latency includes the polling.  The
+throughput, the p50, p95 and p99 latency and the error rate of each callback are printed, and written as JSON with -o.
+
+Start the app, then run:
+
+    python3 benchmarks/load_test.py --users 20 --requests 50 --mix filter=1 zoom=2 select=6 -o load_results.json
+"""
+
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+import requests
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+LOCAL_TZ = "America/New_York"  # event_table.LOCAL_TZ
+CALLBACKS = {"filter": "update_output", "zoom": "update_output", "select": "plot_graphs"}
+PLOT_TYPES = (
+    "Intensity Plot(Auto)",
+    "Intensity Plot(1km)",
+    "Intensity Plot(10km)",
+    "Zip Map",
+    "Intensity Vs. Distance",
+    "Response Vs. Time",
+    "DYFI Responses",
+    "Response Grid",
+    "Intensity Surface",
+)
+FIRST_DATE = date(2021, 12, 1)
+MAP_CENTER = {"lat": 33.6, "lon": -81.0}
+
+
+def load_events(event_file):
+    """Return the catalog events as the customdata list the map figure gives each event point."""
+    with open(event_file, encoding="utf-8") as fin:
+        features = json.load(fin)["features"]
+    # The app shows the dates and times in its local time zone, as event_table.py converts them.
+    local_times = pd.to_datetime([f["properties"]["time"] for f in features], unit="ms", utc=True).tz_convert(LOCAL_TZ)
+    events = []
+    for feature, event_dt in zip(features, local_times):
+        props = feature["properties"]
+        lon, lat, depth = feature["geometry"]["coordinates"]
+        events.append(
+            {
+                "lat": lat,
+                "lon": lon,
+                "customdata": [
+                    props["title"],
+                    props["place"],
+                    event_dt.strftime("%Y-%m-%d"),
+                    event_dt.strftime("%H:%M:%S"),
+                    props["mag"],
+                    depth,
+                    props["felt"] or 0,
+                    props["cdi"],
+                    feature["id"],
+                ],
+            }
+        )
+    return events
+
+
+def _map_body(start_date, end_date, min_mag, max_mag, relayout_data, grid_level, changed):
+    return {
+        "output": "..map-graph.figure...map-grid-level.data..",
+        "outputs": [
+            {"id": "map-graph", "property": "figure"},
+            {"id": "map-grid-level", "property": "data"},
+        ],
+        "inputs": [
+            {"id": "my-date-picker-range", "property": "start_date", "value": start_date},
+            {"id": "my-date-picker-range", "property": "end_date", "value": end_date},
+            {"id": "min-mag-input", "property": "value", "value": min_mag},
+            {"id": "max-mag-input", "property": "value", "value": max_mag},
+            {"id": "map-graph", "property": "relayoutData", "value": relayout_data},
+        ],
+        "state": [{"id": "map-grid-level", "property": "data", "value": grid_level}],
+        "changedPropIds": [changed],
+    }
+
+
+def _select_body(event, plot_type):
+    selected_data = {"points": [{"curveNumber": 0, "pointIndex": 0, **event}]}
+    return {
+        "output": "..graph-plot.children...plot-type-dropdown.disabled...product-poll.disabled..",
+        "outputs": [
+            {"id": "graph-plot", "property": "children"},
+            {"id": "plot-type-dropdown", "property": "disabled"},
+            {"id": "product-poll", "property": "disabled"},
+        ],
+        "inputs": [
+            {"id": "map-graph", "property": "selectedData", "value": selected_data},
+            {"id": "plot-type-dropdown", "property": "value", "value": plot_type},
+            {"id": "product-poll", "property": "n_intervals", "value": None},
+            {"id": "grid-spacing-input", "property": "value", "value": 5},
+        ],
+        "changedPropIds": ["map-graph.selectedData"],
+    }
+
+
+class User:
+    """A simulated user: a random generator and the state of the user's map."""
+
+    def __init__(self, number, seed, events, mix):
+        self.rng = random.Random(f"{seed}-{number}")
+        self.events = events
+        self.felt_events = [e for e in events if e["customdata"][6]] or events
+        self.actions = list(mix)
+        self.weights = [mix[a] for a in self.actions]
+        self.filters = (FIRST_DATE.isoformat(), date.today().isoformat(), 1, 10)
+        self.grid_level = None
+
+    def next_request(self):
+        """Return the (action, request body) of the user's next request."""
+        action = self.rng.choices(self.actions, self.weights)[0]
+        if action == "filter":
+            span = (date.today() - FIRST_DATE).days
+            start = FIRST_DATE + timedelta(days=self.rng.randint(0, span // 2))
+            end = start + timedelta(days=self.rng.randint(30, span))
+            min_mag = self.rng.choice((1, 1, 1.5, 2, 2.5))
+            self.filters = (start.isoformat(), end.isoformat(), min_mag, self.rng.choice((10, 10, 5, 4)))
+            return action, _map_body(*self.filters, None, self.grid_level, "my-date-picker-range.start_date")
+        if action == "zoom":
+            relayout_data = {
+                "mapbox.center": {
+                    "lat": MAP_CENTER["lat"] + self.rng.uniform(-1.5, 1.5),
+                    "lon": MAP_CENTER["lon"] + self.rng.uniform(-2.5, 2.5),
+                },
+                "mapbox.zoom": round(self.rng.uniform(5.5, 11.0), 2),
+            }
+            return action, _map_body(*self.filters, relayout_data, self.grid_level, "map-graph.relayoutData")
+        # Most selections are of events with DYFI responses, the ones with plots to look at.
+        pool = self.felt_events if self.rng.random() < 0.9 else self.events
+        return action, _select_body(self.rng.choice(pool), self.rng.choice(PLOT_TYPES))
+
+    def think_time(self, mean):
+        return self.rng.expovariate(1 / mean) if mean > 0 else 0.0
+
+    def update(self, action, response):
+        """Keep the map's grid level store as the browser would."""
+        if action in ("filter", "zoom") and response.status_code == 200:
+            try:
+                self.grid_level = response.json()["response"]["map-grid-level"]["data"]
+            except (ValueError, KeyError):
+                pass
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return None
+    return values[max(0, math.ceil(pct / 100 * len(values)) - 1)]
+
+
+def post_callback(session, url, body, timeout, poll_interval):
+    """Post a callback request; for a background callback, poll for its result as the browser does."""
+    response = session.post(url, json=body, timeout=timeout)
+    if response.status_code != 200:
+        return response
+    job = response.json()
+    if "cacheKey" not in job:
+        return response
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(poll_interval)
+        response = session.post(
+            url, params={"cacheKey": job["cacheKey"], "job": job["job"]}, json=body, timeout=timeout
+        )
+        if response.status_code != 200 or "response" in response.json():
+            return response
+    raise requests.Timeout(f"background job {job['job']} did not finish")
+
+
+def run_user(user, url, n_requests, deadline, think_time, timeout, poll_interval, samples, lock):
+    session = requests.Session()
+    count = 0
+    while count < n_requests and time.monotonic() < deadline:
+        action, body = user.next_request()
+        start = time.perf_counter()
+        try:
+            response = post_callback(session, url, body, timeout, poll_interval)
+        except requests.RequestException as exc:
+            sample = (action, time.perf_counter() - start, type(exc).__name__, 0)
+        else:
+            # 204 is Dash's PreventUpdate response, not an error.
+            error = None if response.status_code in (200, 204) else str(response.status_code)
+            sample = (action, time.perf_counter() - start, error, len(response.content))
+            user.update(action, response)
+        with lock:
+            samples.append(sample)
+        count += 1
+        time.sleep(user.think_time(think_time))
+    session.close()
+
+
+def summarize(samples, elapsed):
+    """Return the per-callback and per-action statistics of the samples."""
+    groups = {}
+    for action, latency, error, size in samples:
+        for key in (CALLBACKS[action], f"{CALLBACKS[action]}:{action}"):
+            groups.setdefault(key, []).append((latency, error, size))
+    report = {}
+    for key, group in sorted(groups.items()):
+        latencies = sorted(latency for latency, _, _ in group)
+        errors = [error for _, error, _ in group if error]
+        report[key] = {
+            "requests": len(group),
+            "throughput_rps": len(group) / elapsed if elapsed else None,
+            "error_rate": len(errors) / len(group),
+            "errors": {e: errors.count(e) for e in sorted(set(errors))},
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": latencies[-1],
+            "mean_response_bytes": sum(size for _, _, size in group) / len(group),
+        }
+    return report
+
+
+def _parse_mix(items):
+    mix = {}
+    for item in items:
+        action, _, weight = item.partition("=")
+        if action not in CALLBACKS:
+            raise argparse.ArgumentTypeError(f"unknown action {action!r}, expected one of {', '.join(CALLBACKS)}")
+        mix[action] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="load_test", description="Load test a running Earthquakes_v2 server")
+    parser.add_argument("--url", default="http://127.0.0.1:8051", help="The app's base url")
+    parser.add_argument("--users", type=int, default=10, help="Number of concurrent simulated users")
+    parser.add_argument("--requests", type=int, default=20, help="Requests per user")
+    parser.add_argument("--duration", type=float, default=0, help="Stop after this many seconds (0: no limit)")
+    parser.add_argument("--mix", nargs="+", default=["filter=1", "zoom=2", "select=6"],
+                        help="Action weights as action=weight (actions: filter, zoom, select)")
+    parser.add_argument("--think-time", type=float, default=0.5, help="Mean seconds between a user's requests")
+    parser.add_argument("--ramp-up", type=float, default=0, help="Seconds over which the users are started")
+    parser.add_argument("--timeout", type=float, default=60, help="Request timeout in seconds")
+    parser.add_argument("--poll-interval", type=float, default=0.25, help="Background callback poll interval")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the traffic mix")
+    parser.add_argument("--events", type=Path, default=REPO_DIR / "data" / "SC_Earthquake.geojson")
+    parser.add_argument("-o", "--output", type=Path, help="Write the results to a JSON file")
+    args = parser.parse_args()
+    try:
+        mix = _parse_mix(args.mix)
+    except argparse.ArgumentTypeError as exc:
+        parser.error(str(exc))
+
+    url = args.url.rstrip("/") + "/_dash-update-component"
+    events = load_events(args.events)
+    users = [User(n, args.seed, events, mix) for n in range(args.users)]
+    samples = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.duration if args.duration else float("inf")
+    threads = [
+        threading.Thread(
+            target=run_user,
+            args=(user, url, args.requests, deadline, args.think_time, args.timeout, args.poll_interval, samples,
+                  lock),
+            daemon=True,
+        )
+        for user in users
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+        if args.ramp_up:
+            time.sleep(args.ramp_up / len(threads))
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    report = summarize(samples, elapsed)
+    print(f"{len(samples)} requests from {args.users} users in {elapsed:.1f}s", file=sys.stderr)
+    print(f"{'callback':28} {'requests':>8} {'req/s':>7} {'errors':>7} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7}")
+    for key, stats in report.items():
+        print(
+            f"{key:28} {stats['requests']:8d} {stats['throughput_rps']:7.2f} {stats['error_rate']:7.1%} "
+            f"{stats['p50']:7.3f} {stats['p95']:7.3f} {stats['p99']:7.3f}"
+        )
+    if args.output:
+        results = {
+            "started": datetime.now().isoformat(timespec="seconds"),
+            "arguments": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()},
+            "elapsed_seconds": elapsed,
+            "callbacks": report,
+        }
+        with open(args.output, "w", encoding="utf-8") as fout:
+            json.dump(results, fout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
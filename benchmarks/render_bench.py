@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+Rendering benchmark for the Earthquakes_v2 request path.
+
+Times and memory-profiles the graph-plot functions (display_intensity_plot_auto, display_intensity_plot_1km,
+display_intensity_plot_10km, display_zip_plot, display_intensity_dist_plot, display_response_time_plot,
+display_dyfi_responses_tbl, display_response_grid_plot and display_intensity_surface_plot) and the update_output map
+callback.  Each graph-plot function is run against bundled data/se* events, and against synthetic events made by
+replicating an event's DYFI cells, responses and data points 10x and 100x.  update_output is run against the bundled
+event catalog and against the catalog replicated 10x and 100x.
+
+Each graph-plot function is run in two modes:
+    cold      -- no stored figure artifact; the figure is built from the DYFI files (and stored).
+    artifact  -- the stored figure artifact is loaded.
+
+The time of every run is split into load (reading files), transform (parsing and building the figure), artifact
+(writing the stored figure, cold runs only) and serialize (Dash's JSON serialization of the returned component).  The
+peak traced memory of each function is measured in a separate, untimed run.  The results are written as JSON, and
+--compare prints the change against an earlier results file.
+
+Run from the repository root (a .mapbox_token file is required to import the app):
+
+    python3 benchmarks/render_bench.py -o bench_results.json
+    python3 benchmarks/render_bench.py --scales 1 10 --repeat 5 --compare bench_results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from statistics import median
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+os.chdir(REPO_DIR)
+sys.path.insert(0, str(REPO_DIR))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+import plotly  # noqa: E402
+from plotly.io.json import to_json_plotly  # noqa: E402
+
+import figures  # noqa: E402
+import metrics  # noqa: E402
+from event_grid import build_grid_index  # noqa: E402
+from event_table import column, find_epicenter  # noqa: E402
+from reloader import EventData  # noqa: E402
+import Earthquakes_v2 as app_module  # noqa: E402
+
+DISPLAY_FUNCTIONS = {
+    "display_intensity_plot_auto": ("intensity_pyramid", True),
+    "display_intensity_plot_1km": ("intensity_1km", True),
+    "display_intensity_plot_10km": ("intensity_10km", True),
+    "display_zip_plot": ("zip_map", True),
+    "display_intensity_dist_plot": ("intensity_dist", False),
+    "display_response_time_plot": ("response_time", False),
+    "display_dyfi_responses_tbl": ("dyfi_responses", False),
+    "display_response_grid_plot": (figures.PLOT_TYPES["Response Grid"], True),
+    "display_intensity_surface_plot": (figures.PLOT_TYPES["Intensity Surface"], True),
+}
+DYFI_FILES = (
+    "cdi_zip.csv",
+    "dyfi_geo_1km.geojson",
+    "dyfi_geo_10km.geojson",
+    "dyfi_plot_atten.json",
+    "dyfi_plot_numresp.json",
+)
+UTM_NAME = re.compile(r"UTM:\((\S+) (\d+) (\d+) (\d+)\)")
+
+
+# --------------------------------------------------------------------------------------------------------------------
+# Synthetic events
+
+
+def _scale_geo(geojson, scale):
+    """Replicate the cells of a DYFI geocoded GeoJSON onto a grid of shifted copies."""
+    features = geojson["features"]
+    if not features:
+        return geojson
+    lons = [p[0] for f in features for p in f["geometry"]["coordinates"][0]]
+    lats = [p[1] for f in features for p in f["geometry"]["coordinates"][0]]
+    span_lon = max(lons) - min(lons) + 0.02
+    span_lat = max(lats) - min(lats) + 0.02
+    width = int(np.ceil(np.sqrt(scale)))
+    scaled = []
+    for copy in range(scale):
+        d_lon = (copy % width) * span_lon
+        d_lat = (copy // width) * span_lat
+        for feature in features:
+            new = json.loads(json.dumps(feature))
+            ring = new["geometry"]["coordinates"][0]
+            new["geometry"]["coordinates"][0] = [[x + d_lon, y + d_lat] for x, y in ring]
+            if copy:
+                # Keep the UTM name format, but make every copy's cell name unique.
+                new["properties"]["name"] = UTM_NAME.sub(
+                    lambda m, c=copy: "UTM:({} {} {} {})".format(
+                        m.group(1),
+                        str(int(m.group(2)) + 1000 * c).zfill(len(m.group(2))),
+                        m.group(3),
+                        m.group(4),
+                    ),
+                    new["properties"]["name"],
+                )
+            scaled.append(new)
+    return dict(geojson, features=scaled)
+
+
+def _scale_plot_data(plot_json, scale, rng):
+    """Replicate the data points of a DYFI plot JSON file with a little jitter."""
+    for dataset in plot_json["datasets"]:
+        data = dataset["data"]
+        dataset["data"] = data + [
+            {**point, "x": point["x"] * (1 + rng.normal(0, 0.01))}
+            for _ in range(scale - 1)
+            for point in data
+        ]
+    return plot_json
+
+
+def make_synthetic_event(src_dir, dst_dir, scale, seed=0):
+    """Write a synthetic event with scale times the responses, cells and data points of a real event.
+
+    Parameters
+    ----------
+    src_dir : Path
+        The real event's data directory.
+    dst_dir : Path
+        The synthetic event's data directory to create.
+    scale : int
+        The replication factor.
+    seed : int
+        The random seed of the jitter.
+
+    """
+    rng = np.random.default_rng(seed)
+    dst_dir.mkdir(parents=True, exist_ok=True)
+
+    cdi_zip_df = pd.read_csv(src_dir / "cdi_zip.csv")
+    scaled_df = pd.concat([cdi_zip_df] * scale, ignore_index=True)
+    for col in ("Latitude", "Longitude"):
+        if col in scaled_df:
+            scaled_df[col] = scaled_df[col] + rng.normal(0, 0.01, len(scaled_df))
+    scaled_df.to_csv(dst_dir / "cdi_zip.csv", index=False)
+
+    for name in ("dyfi_geo_1km.geojson", "dyfi_geo_10km.geojson"):
+        with open(src_dir / name, encoding="utf-8") as fin:
+            geojson = json.load(fin)
+        with open(dst_dir / name, "w", encoding="utf-8") as fout:
+            json.dump(_scale_geo(geojson, scale), fout)
+
+    for name in ("dyfi_plot_atten.json", "dyfi_plot_numresp.json"):
+        with open(src_dir / name, encoding="utf-8") as fin:
+            plot_json = json.load(fin)
+        with open(dst_dir / name, "w", encoding="utf-8") as fout:
+            json.dump(_scale_plot_data(plot_json, scale, rng), fout)
+
+
+def make_synthetic_catalog(geo_df, scale, seed=0):
+    """Return the event catalog replicated scale times with jittered locations and unique ids."""
+    if scale == 1:
+        return geo_df
+    rng = np.random.default_rng(seed)
+    copies = []
+    for copy in range(scale):
+        df = geo_df.copy()
+        if copy:
+            df["id"] = df["id"] + f"x{copy}"
+            df["Lat"] = (df["Lat"] + rng.normal(0, 0.5, len(df))).astype("float32")
+            df["Lon"] = (df["Lon"] + rng.normal(0, 0.5, len(df))).astype("float32")
+        copies.append(df)
+    return pd.concat(copies, ignore_index=True)
+
+
+# --------------------------------------------------------------------------------------------------------------------
+# Timing
+
+
+def _phase_sums(snapshot, scope):
+    hists = snapshot["histograms"]
+
+    def total(name):
+        return hists.get(f"{scope}.{name}_seconds", {}).get("sum", 0.0)
+
+    return {
+        "load": total("load"),
+        "transform": total("parse") + total("build"),
+        "artifact": total("serialize"),
+    }
+
+
+def _summarize(samples):
+    summary = {}
+    for key in samples[0]:
+        values = [s[key] for s in samples]
+        summary[key] = {"min": min(values), "median": median(values), "max": max(values)}
+    return summary
+
+
+def bench_display(name, evnt_id, sdata, mode, repeat):
+    """Time a graph-plot function; returns the per-phase timing summary and the payload size."""
+    artifact, needs_sdata = DISPLAY_FUNCTIONS[name]
+    func = getattr(app_module, name)
+    args = (evnt_id, sdata) if needs_sdata else (evnt_id,)
+    samples = []
+    payload = 0
+
+    if mode == "artifact":
+        # Make sure the stored artifact exists and is current.
+        figures.save_artifact(
+            evnt_id, artifact, figures.build_plot(artifact, evnt_id, app_module.selected_epicenter(sdata))
+        )
+
+    for _ in range(repeat):
+        app_module.plot_prefetcher.invalidate(evnt_id)
+        if mode == "cold":
+            figures.artifact_path(evnt_id, artifact).unlink(missing_ok=True)
+        metrics.REGISTRY.reset()
+        start = time.perf_counter()
+        component = func(*args)
+        called = time.perf_counter()
+        payload_json = to_json_plotly(component)
+        finished = time.perf_counter()
+        payload = len(payload_json)
+        sample = _phase_sums(metrics.REGISTRY.snapshot(), name)
+        sample["serialize"] = finished - called
+        sample["total"] = finished - start
+        samples.append(sample)
+
+    app_module.plot_prefetcher.invalidate(evnt_id)
+    if mode == "cold":
+        figures.artifact_path(evnt_id, artifact).unlink(missing_ok=True)
+    tracemalloc.start()
+    to_json_plotly(func(*args))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"timings": _summarize(samples), "payload_bytes": payload, "peak_memory_bytes": peak}
+
+
+def bench_update_output(catalog, repeat):
+    """Time the update_output callback through the Dash request path for a catalog."""
+    saved = app_module.event_reloader.data
+    app_module.event_reloader.data = EventData(
+        catalog, build_grid_index(column(catalog, "Lon"), column(catalog, "Lat")), f"{saved.version}-bench"
+    )
+    client = app_module.server.test_client()
+    body = {
+        "output": "..map-graph.figure...map-grid-level.data..",
+        "outputs": [
+            {"id": "map-graph", "property": "figure"},
+            {"id": "map-grid-level", "property": "data"},
+        ],
+        "inputs": [
+            {"id": "my-date-picker-range", "property": "start_date", "value": "2021-12-01"},
+            {"id": "my-date-picker-range", "property": "end_date", "value": "2099-12-31"},
+            {"id": "min-mag-input", "property": "value", "value": 1},
+            {"id": "max-mag-input", "property": "value", "value": 10},
+            {"id": "map-graph", "property": "relayoutData", "value": None},
+        ],
+        "state": [{"id": "map-grid-level", "property": "data", "value": None}],
+        "changedPropIds": ["my-date-picker-range.start_date"],
+    }
+    try:
+        samples = []
+        payload = 0
+        for _ in range(repeat):
+            metrics.REGISTRY.reset()
+            start = time.perf_counter()
+            response = client.post("/_dash-update-component", json=body)
+            elapsed = time.perf_counter() - start
+            payload = len(response.data)
+            hists = metrics.REGISTRY.snapshot()["histograms"]
+
+            def total(key):
+                return hists.get(f"update_output.{key}_seconds", {}).get("sum", 0.0)
+
+            samples.append(
+                {
+                    "load": 0.0,
+                    "transform": total("filter") + total("aggregate") + total("build"),
+                    "serialize": total("serialize"),
+                    "total": elapsed,
+                }
+            )
+        tracemalloc.start()
+        client.post("/_dash-update-component", json=body)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    finally:
+        app_module.event_reloader.data = saved
+    return {
+        "events": len(catalog),
+        "timings": _summarize(samples),
+        "payload_bytes": payload,
+        "peak_memory_bytes": peak,
+    }
+
+
+# --------------------------------------------------------------------------------------------------------------------
+# Driver
+
+
+def _largest_events(n):
+    events = [d for d in figures.DATA_DIR.glob("se*") if all((d / f).exists() for f in DYFI_FILES)]
+    events.sort(key=lambda d: (d / "dyfi_geo_1km.geojson").stat().st_size, reverse=True)
+    return [d.name for d in events[:n]]
+
+
+def _selected_data(evnt_id, catalog):
+    epicenter = find_epicenter(catalog, evnt_id) or {"lat": 34.0, "lon": -81.0, "place": "No Location"}
+    return {"points": [{"lat": epicenter["lat"], "lon": epicenter["lon"], "customdata": [None, epicenter["place"]]}]}
+
+
+def _environment():
+    try:
+        rev = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        rev = None
+    return {
+        "git_rev": rev,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "pandas": pd.__version__,
+        "plotly": plotly.__version__,
+        "numpy": np.__version__,
+    }
+
+
+def compare(results, baseline):
+    """Print the median total time and payload change of every benchmark also present in the baseline."""
+    old = {(r["function"], r["event"], r["scale"], r["mode"]): r for r in baseline["results"]}
+    print(f"{'function':34} {'event':12} {'scale':>5} {'mode':9} {'median s':>9} {'change':>8} {'payload':>8}")
+    for r in results["results"]:
+        key = (r["function"], r["event"], r["scale"], r["mode"])
+        if key not in old or "timings" not in r or "timings" not in old[key]:
+            continue
+        new_t = r["timings"]["total"]["median"]
+        old_t = old[key]["timings"]["total"]["median"]
+        old_p = old[key]["payload_bytes"] or 1
+        print(
+            f"{r['function']:34} {r['event']:12} {r['scale']:>5} {r['mode']:9} {new_t:9.4f} "
+            f"{(new_t / old_t - 1) * 100:+7.1f}% {(r['payload_bytes'] / old_p - 1) * 100:+7.1f}%"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="render_bench", description="Benchmark the Earthquakes_v2 request path")
+    parser.add_argument("-e", "--event", action="append", dest="events", help="Bundled event id (may be repeated)")
+    parser.add_argument("-n", "--n-events", type=int, default=3, help="Number of largest bundled events to use")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100], help="Synthetic scale factors")
+    parser.add_argument("--functions", nargs="+", default=list(DISPLAY_FUNCTIONS) + ["update_output"])
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark")
+    parser.add_argument("-o", "--output", type=Path, default=Path("bench_results.json"))
+    parser.add_argument("--compare", type=Path, help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    events = args.events or _largest_events(args.n_events)
+    catalog = app_module.event_reloader.data.events_df
+    results = {"environment": _environment(), "started": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": []}
+
+    with tempfile.TemporaryDirectory(prefix="eq-bench-") as tmp:
+        tmp_dir = Path(tmp)
+        (tmp_dir / figures.ZC_DATA_PATH).symlink_to((figures.DATA_DIR / figures.ZC_DATA_PATH).resolve())
+        saved_data_dir = figures.DATA_DIR
+        figures.DATA_DIR = tmp_dir
+        try:
+            for evnt_id in events:
+                sdata = _selected_data(evnt_id, catalog)
+                for scale in args.scales:
+                    bench_id = evnt_id if scale == 1 else f"{evnt_id}x{scale}"
+                    if scale == 1:
+                        shutil.copytree(saved_data_dir / evnt_id, tmp_dir / bench_id,
+                                        ignore=shutil.ignore_patterns(figures.ARTIFACT_DIR))
+                    else:
+                        make_synthetic_event(saved_data_dir / evnt_id, tmp_dir / bench_id, scale)
+                    for name in DISPLAY_FUNCTIONS:
+                        if name not in args.functions:
+                            continue
+                        for mode in ("cold", "artifact"):
+                            entry = {"function": name, "event": evnt_id, "scale": scale, "mode": mode}
+                            try:
+                                entry.update(bench_display(name, bench_id, sdata, mode, args.repeat))
+                            except Exception as exc:  # pylint: disable='broad-exception-caught'
+                                entry["error"] = f"{type(exc).__name__}: {exc}"
+                            results["results"].append(entry)
+                            print(json.dumps(entry)[:160], file=sys.stderr)
+                    shutil.rmtree(tmp_dir / bench_id)
+        finally:
+            figures.DATA_DIR = saved_data_dir
+
+    if "update_output" in args.functions:
+        for scale in args.scales:
+            entry = {"function": "update_output", "event": "catalog", "scale": scale, "mode": "request"}
+            entry.update(bench_update_output(make_synthetic_catalog(catalog, scale), args.repeat))
+            results["results"].append(entry)
+            print(json.dumps(entry)[:160], file=sys.stderr)
+
+    with open(args.output, "w", encoding="utf-8") as fout:
+        json.dump(results, fout, indent=2)
+    print(f"Results saved to {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fin:
+            compare(results, json.load(fin))
+
+
+if __name__ == "__main__":
+    main()
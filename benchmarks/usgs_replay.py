@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+Offline stand-in for the USGS FDSN event and product endpoints used by usgs_api.py.
+
+The server answers the kinds of requests usgs_api.py makes:
+
+    /fdsnws/event/1/query.geojson?...            the FDSN event summary query
+    /fdsnws/event/1/query?eventid=<id>&...       an event detail document with its DYFI product contents
+    /earthquakes/feed/v1.0/summary/<feed>.geojson
+                                                 a real-time summary feed (all_hour ... all_month), see below
+    /earthquakes/feed/v1.0/detail/<id>.geojson   an event detail document, as linked from the feeds
+    /product/dyfi/<id>/<file>                    a DYFI product file
+
+Responses come from a recording directory when one was recorded for the request (see --record), otherwise they are
+made from the local data/ tree: data/SC_Earthquake.geojson is the catalog, and each data/<event_id>/ directory holds
+the event's DYFI products (cdi_zip.csv is served in the original cdi_zip.txt format).  --synthetic adds generated
+events to the catalog whose products are copies of the bundled events' products.
+
+Latency, bandwidth, server errors and 429 rate limiting can be injected, from a seeded random generator, so ingest
+concurrency strategies can be load-tested reproducibly on an offline box:
+
+    python3 benchmarks/usgs_replay.py --port 8642 --latency 0.15 --jitter 0.05 --bandwidth 2000000 --error-rate 0.01
+    python3 usgs_api.py --host http://127.0.0.1:8642
+
+The summary feeds list the events of the last hour, day, week or month before the newest catalog event, so a replayed
+catalog of past events still has non-empty feeds.  They answer conditional requests (If-None-Match and
+If-Modified-Since) with 304 Not Modified until the catalog changes.  --live adds a synthetic event, dated now, every
+given number of seconds, to exercise usgs_api.py --watch:
+
+    python3 benchmarks/usgs_replay.py --port 8642 --live 30
+    python3 usgs_api.py --host http://127.0.0.1:8642 --watch 10
+
+With --record the server instead forwards every request to --upstream and saves the responses to the recording
+directory for later replay.
+"""
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+PRODUCT_FILES = (
+    "cdi_zip.txt",
+    "dyfi_geo_1km.geojson",
+    "dyfi_geo_10km.geojson",
+    "dyfi_plot_atten.json",
+    "dyfi_plot_numresp.json",
+)
+CDI_ZIP_HEADER = (
+    "# Columns: ZIP/Location,CDI,No. of responses,Hypocentral distance,Latitude,Longitude,Suspect?,City,State[,"
+    "Standard deviation,cityid]"
+)
+FEED_PATH = "/earthquakes/feed/v1.0/summary/"
+FEED_DETAIL_PATH = "/earthquakes/feed/v1.0/detail/"
+FEED_WINDOWS = {"all_hour": 3600, "all_day": 86400, "all_week": 7 * 86400, "all_month": 30 * 86400}
+CONTENT_TYPES = {".txt": "text/plain", ".geojson": "application/json", ".json": "application/json"}
+
+
+class ReplayConfig:
+    """Fault injection and data settings of the replay server."""
+
+    def __init__(self, data_dir, record_dir=None, upstream=None, record=False, latency=0.0, jitter=0.0,
+                 bandwidth=0, error_rate=0.0, throttle_rate=0.0, seed=0):
+        self.data_dir = Path(data_dir)
+        self.record_dir = Path(record_dir) if record_dir else None
+        self.upstream = upstream
+        self.record = record
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def draw(self):
+        """Return the (delay, fault) of the next request; fault is None, 429 or 500."""
+        with self._rng_lock:
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+            roll = self._rng.random()
+        if roll < self.throttle_rate:
+            return delay, 429
+        if roll < self.throttle_rate + self.error_rate:
+            return delay, 500
+        return delay, None
+
+
+def synthetic_catalog(n_events, templates, seed=0):
+    """Generate synthetic catalog features.
+
+    Parameters
+    ----------
+    n_events : int
+        The number of events to generate.
+    templates : list
+        Ids of bundled events with downloaded products; synthetic event i serves the products of templates[i % n].
+    seed : int
+        The random seed.
+
+    Returns
+    -------
+    features : list
+        GeoJSON catalog features.
+    product_source : dict
+        Synthetic event id -> bundled event id its products are copied from.
+    """
+    rng = random.Random(seed)
+    features = []
+    product_source = {}
+    start = datetime(2021, 12, 1, tzinfo=timezone.utc).timestamp() * 1000
+    for i in range(n_events):
+        evnt_id = f"sy{i:08d}"
+        mag = round(rng.uniform(1.0, 4.5), 2)
+        event_time = int(start + rng.uniform(0, 3 * 365 * 86400 * 1000))
+        lon = rng.uniform(-83.485, -77.86)
+        lat = rng.uniform(31.977, 35.261)
+        depth = round(rng.uniform(0.5, 12.0), 2)
+        features.append(
+            {
+                "type": "Feature",
+                "properties": {
+                    "mag": mag,
+                    "place": f"{rng.randint(1, 30)} km of Synthetic, SC",
+                    "time": event_time,
+                    "updated": event_time + 86400000,
+                    "felt": rng.randint(1, 500),
+                    "cdi": round(rng.uniform(1.0, 5.0), 1),
+                    "title": f"M {mag:.1f} - Synthetic, SC",
+                    "types": ",dyfi,origin,",
+                },
+                "geometry": {"type": "Point", "coordinates": [lon, lat, depth]},
+                "id": evnt_id,
+            }
+        )
+        if templates:
+            product_source[evnt_id] = templates[i % len(templates)]
+    return features, product_source
+
+
+def cdi_zip_txt(csv_file):
+    """Convert a cleaned data/<event>/cdi_zip.csv back to the cdi_zip.txt format served by USGS."""
+    out = io.StringIO()
+    out.write(CDI_ZIP_HEADER + "\n")
+    writer = csv.writer(out, lineterminator="\n")
+    with open(csv_file, newline="", encoding="utf-8") as fin:
+        reader = csv.reader(fin)
+        next(reader)
+        for fields in reader:
+            # ZIP,CDI,count,dist,lat,lon,City,State: Suspect? goes after lon; std. dev. and city id at the end.
+            writer.writerow(fields[:6] + ["0"] + fields[6:] + ["0.3", ""])
+    return out.getvalue().encode("utf-8")
+
+
+class ReplayStore:
+    """The catalog, detail documents and product files served by the replay server."""
+
+    def __init__(self, config, n_synthetic=0):
+        self.config = config
+        with open(config.data_dir / "SC_Earthquake.geojson", encoding="utf-8") as fin:
+            self.catalog = json.load(fin)
+        self.templates = [
+            f["id"] for f in self.catalog["features"]
+            if all(self._product_path(f["id"], name).exists() for name in PRODUCT_FILES)
+        ]
+        features, self.product_source = synthetic_catalog(n_synthetic, self.templates)
+        self.catalog["features"] = self.catalog["features"] + features
+        self.events = {f["id"]: f for f in self.catalog["features"]}
+        self.changed = time.time()
+        self._live_lock = threading.Lock()
+        self._n_live = 0
+
+    def _product_path(self, evnt_id, name):
+        if name == "cdi_zip.txt":
+            name = "cdi_zip.csv"
+        return self.config.data_dir / evnt_id / name
+
+    def query(self, host, params):
+        """Return the summary query response, filtered by time range, magnitude and bounding box."""
+
+        def param(name, default):
+            return float(params[name][0]) if name in params else default
+
+        def ms(name, default):
+            if name not in params:
+                return default
+            value = params[name][0].replace(" ", "T")
+            return datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp() * 1000
+
+        start, end = ms("starttime", float("-inf")), ms("endtime", float("inf"))
+        min_mag, max_mag = param("minmagnitude", float("-inf")), param("maxmagnitude", float("inf"))
+        min_lat, max_lat = param("minlatitude", -90), param("maxlatitude", 90)
+        min_lon, max_lon = param("minlongitude", -180), param("maxlongitude", 180)
+        features = []
+        for feature in self.catalog["features"]:
+            props = feature["properties"]
+            lon, lat = feature["geometry"]["coordinates"][:2]
+            mag = props["mag"] if props["mag"] is not None else 0
+            if (start <= props["time"] <= end and min_mag <= mag <= max_mag
+                    and min_lat <= lat <= max_lat and min_lon <= lon <= max_lon):
+                feature = dict(feature, properties=dict(
+                    props, detail=f"{host}/fdsnws/event/1/query?eventid={feature['id']}&format=geojson"))
+                features.append(feature)
+        metadata = dict(self.catalog.get("metadata", {}), count=len(features), status=200)
+        return json.dumps(dict(self.catalog, metadata=metadata, features=features)).encode("utf-8")
+
+    def feed(self, host, name):
+        """Return a summary feed response, or None for an unknown feed.
+
+        The feed lists the events of its window before the newest catalog event, newest first.
+        """
+        if name not in FEED_WINDOWS:
+            return None
+        catalog = self.catalog["features"]
+        newest = max((f["properties"]["time"] for f in catalog), default=0)
+        start = newest - FEED_WINDOWS[name] * 1000
+        features = [
+            dict(feature, properties=dict(feature["properties"],
+                                          detail=f"{host}{FEED_DETAIL_PATH}{feature['id']}.geojson"))
+            for feature in sorted(catalog, key=lambda f: f["properties"]["time"], reverse=True)
+            if feature["properties"]["time"] >= start
+        ]
+        metadata = {"generated": int(self.changed * 1000), "url": f"{host}{FEED_PATH}{name}.geojson",
+                    "title": f"USGS Replay {name}", "status": 200, "count": len(features)}
+        return json.dumps({"type": "FeatureCollection", "metadata": metadata, "features": features}).encode("utf-8")
+
+    def add_live_event(self):
+        """Add a synthetic event dated now, with the products of a bundled event; returns its id."""
+        with self._live_lock:
+            features, sources = synthetic_catalog(1, self.templates, seed=self._n_live)
+            feature = features[0]
+            evnt_id = f"lv{self._n_live:08d}"
+            self._n_live += 1
+            now = int(time.time() * 1000)
+            feature["id"] = evnt_id
+            feature["properties"].update(time=now, updated=now)
+            if sources:
+                self.product_source[evnt_id] = next(iter(sources.values()))
+            # Replaced rather than appended to, so a request being served keeps iterating the previous list.
+            self.events = dict(self.events, **{evnt_id: feature})
+            self.catalog["features"] = self.catalog["features"] + [feature]
+            self.changed = time.time()
+        return evnt_id
+
+    def detail(self, host, evnt_id):
+        """Return an event detail document, or None for an unknown event."""
+        feature = self.events.get(evnt_id)
+        if feature is None:
+            return None
+        source = self.product_source.get(evnt_id, evnt_id)
+        contents = {}
+        for name in PRODUCT_FILES:
+            if self._product_path(source, name).exists():
+                contents[name] = {
+                    "contentType": CONTENT_TYPES[Path(name).suffix],
+                    "url": f"{host}/product/dyfi/{evnt_id}/{name}",
+                }
+        dyfi = [{"id": f"urn:usgs-product:us:dyfi:{evnt_id}:1", "preferredWeight": 1, "contents": contents}]
+        properties = dict(feature["properties"], products={"dyfi": dyfi})
+        return json.dumps(dict(feature, properties=properties)).encode("utf-8")
+
+    def product(self, evnt_id, name):
+        """Return a product file's bytes, or None if it does not exist."""
+        source = self.product_source.get(evnt_id, evnt_id)
+        path = self._product_path(source, name)
+        if name not in PRODUCT_FILES or not path.exists():
+            return None
+        if name == "cdi_zip.txt":
+            return cdi_zip_txt(path)
+        return path.read_bytes()
+
+
+def _recording_name(path_qs):
+    return hashlib.sha1(path_qs.encode("utf-8")).hexdigest()
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """Serves recorded, or locally made, USGS responses with the configured faults."""
+
+    server_version = "USGSReplay/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):  # pylint: disable='redefined-builtin'
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):  # pylint: disable='invalid-name'
+        config = self.server.config
+        delay, fault = config.draw()
+        if delay:
+            time.sleep(delay)
+        if fault == 429:
+            self._send(429, b"Too Many Requests", "text/plain", {"Retry-After": "1"})
+            return
+        if fault == 500:
+            self._send(500, b"Injected server error", "text/plain")
+            return
+
+        if config.record:
+            self._record()
+            return
+        recorded = self._recorded()
+        if recorded is not None:
+            status, content_type, body = recorded
+            self._send(status, body, content_type)
+            return
+
+        host = f"http://{self.headers.get('Host', '%s:%d' % self.server.server_address[:2])}"
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        store = self.server.store
+        body = None
+        content_type = "application/json"
+        if url.path == "/fdsnws/event/1/query.geojson":
+            body = store.query(host, params)
+        elif url.path == "/fdsnws/event/1/query" and "eventid" in params:
+            body = store.detail(host, params["eventid"][0])
+        elif url.path.startswith(FEED_PATH) and url.path.endswith(".geojson"):
+            self._send_feed(store, host, url.path[len(FEED_PATH):-len(".geojson")])
+            return
+        elif url.path.startswith(FEED_DETAIL_PATH) and url.path.endswith(".geojson"):
+            body = store.detail(host, url.path[len(FEED_DETAIL_PATH):-len(".geojson")])
+        elif url.path.startswith("/product/dyfi/"):
+            parts = url.path.split("/")
+            if len(parts) == 5:
+                body = store.product(parts[3], parts[4])
+                content_type = CONTENT_TYPES.get(Path(parts[4]).suffix, "application/octet-stream")
+        if body is None:
+            self._send(404, b"Not Found", "text/plain")
+        else:
+            self._send(200, body, content_type)
+
+    def _send_feed(self, store, host, name):
+        changed = store.changed
+        body = store.feed(host, name)
+        if body is None:
+            self._send(404, b"Not Found", "text/plain")
+            return
+        validators = {"ETag": '"%s"' % hashlib.sha1(body).hexdigest()[:16],
+                      "Last-Modified": formatdate(changed, usegmt=True)}
+        if_none_match = self.headers.get("If-None-Match")
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_none_match is not None:
+            not_modified = if_none_match == validators["ETag"]
+        elif if_modified_since is not None:
+            try:
+                not_modified = int(changed) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                not_modified = False
+        else:
+            not_modified = False
+        if not_modified:
+            self._send(304, b"", "application/json", validators)
+        else:
+            self._send(200, body, "application/json", validators)
+
+    def _recorded(self):
+        record_dir = self.server.config.record_dir
+        if record_dir is None:
+            return None
+        name = _recording_name(self.path)
+        meta_file = record_dir / f"{name}.json"
+        if not meta_file.exists():
+            return None
+        meta = json.loads(meta_file.read_text(encoding="utf-8"))
+        body = (record_dir / f"{name}.body").read_bytes()
+        # Recorded urls point at the upstream host; point them back at this server.
+        body = body.replace(self.server.config.upstream.encode("utf-8"),
+                            f"http://{self.headers.get('Host')}".encode("utf-8"))
+        return meta["status"], meta["content_type"], body
+
+    def _record(self):
+        config = self.server.config
+        response = requests.get(config.upstream + self.path, timeout=(3.05, 60))
+        content_type = response.headers.get("Content-Type", "application/octet-stream")
+        name = _recording_name(self.path)
+        config.record_dir.mkdir(parents=True, exist_ok=True)
+        (config.record_dir / f"{name}.body").write_bytes(response.content)
+        (config.record_dir / f"{name}.json").write_text(
+            json.dumps({"path": self.path, "status": response.status_code, "content_type": content_type}),
+            encoding="utf-8")
+        body = response.content.replace(config.upstream.encode("utf-8"),
+                                        f"http://{self.headers.get('Host')}".encode("utf-8"))
+        self._send(response.status_code, body, content_type)
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        bandwidth = self.server.config.bandwidth
+        if not bandwidth:
+            self.wfile.write(body)
+            return
+        # Throttle to the configured bytes per second, per connection.
+        chunk = max(1024, bandwidth // 20)
+        stream = io.BytesIO(body)
+        while True:
+            data = stream.read(chunk)
+            if not data:
+                break
+            self.wfile.write(data)
+            time.sleep(len(data) / bandwidth)
+
+
+def make_server(config, n_synthetic=0, host="127.0.0.1", port=8642, verbose=False):
+    """Create the replay server; call serve_forever() on it to start serving."""
+    server = ThreadingHTTPServer((host, port), ReplayHandler)
+    server.daemon_threads = True
+    server.config = config
+    server.store = ReplayStore(config, n_synthetic)
+    server.verbose = verbose
+    return server
+
+
+def _add_live_events(store, interval):
+    while True:
+        time.sleep(interval)
+        print(f"Added live event {store.add_live_event()}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="usgs_replay", description="Offline stand-in for the USGS web services")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8642)
+    parser.add_argument("--data-dir", type=Path, default=REPO_DIR / "data")
+    parser.add_argument("--recordings", type=Path, help="Directory of recorded responses to replay (or record to)")
+    parser.add_argument("--record", action="store_true", help="Forward requests to --upstream and record them")
+    parser.add_argument("--upstream", default="https://earthquake.usgs.gov")
+    parser.add_argument("--synthetic", type=int, default=0, help="Number of synthetic events to add to the catalog")
+    parser.add_argument("--live", type=float, default=0.0,
+                        help="Add a synthetic event dated now every LIVE seconds (0: never)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Response delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- uniform jitter of the delay in seconds")
+    parser.add_argument("--bandwidth", type=int, default=0, help="Bytes per second per connection (0: unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with a 429")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the injected faults")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+    if args.record and not args.recordings:
+        parser.error("--record needs --recordings")
+
+    config = ReplayConfig(args.data_dir, args.recordings, args.upstream, args.record, args.latency, args.jitter,
+                          args.bandwidth, args.error_rate, args.throttle_rate, args.seed)
+    server = make_server(config, args.synthetic, args.host, args.port, args.verbose)
+    print(f"Serving USGS replay on http://{args.host}:{args.port} "
+          f"({len(server.store.events)} events)")
+    if args.live > 0:
+        threading.Thread(target=_add_live_events, args=(server.store, args.live), daemon=True).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
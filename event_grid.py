@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+Multi-resolution grid index used to aggregate earthquake events on the event map.
+
+When the map is zoomed out over a large catalog, plotting every event as its own marker floods the browser.  The
+events are instead binned into square lat/lon grid cells, and one marker per cell is drawn showing the event count,
+the maximum magnitude and the mean depth of the events in that cell.  The cell keys for every grid level are
+computed once when the event data is loaded, so each map update only has to group the already filtered events.
+
+event_grid.py module contains the following functions:
+
+    build_grid_index() - returns a dictionary of cell key arrays, one per grid level.
+    grid_level_for_zoom() - returns the grid cell size to use at a map zoom level, or None for individual events.
+    aggregate_events() - returns a dataframe with one row per occupied grid cell.
+"""
+
+import numpy as np
+import pandas as pd
+
+from event_table import column
+
+# Grid cell sizes in degrees, finest to coarsest.
+GRID_LEVELS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0)
+
+# Filtered catalogs smaller than this are always plotted as individual events.
+MIN_AGGREGATE_EVENTS = 2000
+
+# At or above this map zoom level individual events are plotted.
+DETAIL_ZOOM = 9
+
+# Approximate on-screen width of a grid cell in pixels.
+CELL_PIXELS = 40
+
+
+def build_grid_index(longitudes, latitudes, levels=GRID_LEVELS):
+    """build_grid_index() Compute the grid cell key of every event for each grid level.
+
+    Parameters
+    ----------
+    longitudes : array-like
+        Event longitudes in degrees.
+    latitudes : array-like
+        Event latitudes in degrees.
+    levels : tuple of float
+        Grid cell sizes in degrees.
+
+    Returns
+    -------
+    grid_index : dict
+        A dictionary mapping each cell size to an int64 numpy array of cell keys, aligned with the input coordinates.
+    """
+    lons = np.asarray(longitudes, dtype="float64")
+    lats = np.asarray(latitudes, dtype="float64")
+    grid_index = {}
+    for cell_size in levels:
+        col = np.floor((lons + 180.0) / cell_size).astype("int64")
+        row = np.floor((lats + 90.0) / cell_size).astype("int64")
+        grid_index[cell_size] = col * 1_000_000 + row
+    return grid_index
+
+
+def grid_level_for_zoom(zoom, n_events, levels=GRID_LEVELS):
+    """grid_level_for_zoom() Select the grid cell size to aggregate events at for a map zoom level.
+
+    Parameters
+    ----------
+    zoom : float
+        The mapbox zoom level.
+    n_events : int
+        The number of events that will be displayed.
+    levels : tuple of float
+        Grid cell sizes in degrees, finest to coarsest.
+
+    Returns
+    -------
+    cell_size : float or None
+        The grid cell size in degrees, or None if the events should be plotted individually.
+    """
+    if n_events < MIN_AGGREGATE_EVENTS or zoom >= DETAIL_ZOOM:
+        return None
+    # Degrees of longitude covered by CELL_PIXELS pixels at this zoom (256 pixel tiles).
+    target = CELL_PIXELS * 360.0 / (256.0 * 2.0**zoom)
+    for cell_size in levels:
+        if cell_size >= target:
+            return cell_size
+    return levels[-1]
+
+
+def aggregate_events(events_df, cell_keys):
+    """aggregate_events() Aggregate events into their grid cells.
+
+    Parameters
+    ----------
+    events_df : pandas dataframe
+        The events to aggregate, rows of the event table.
+    cell_keys : numpy array
+        The grid cell key of each event in events_df.
+
+    Returns
+    -------
+    cells_df : pandas dataframe
+        One row per occupied grid cell with the columns Lat, Lon (mean event location), Count, Max_Mag and
+        Mean_Depth.
+    """
+    cells_df = (
+        pd.DataFrame(
+            {
+                "Cell": cell_keys,
+                "Lat": column(events_df, "Lat"),
+                "Lon": column(events_df, "Lon"),
+                "Mag": column(events_df, "Mag"),
+                "Depth": column(events_df, "Depth"),
+            }
+        )
+        .groupby("Cell", sort=False)
+        .agg(
+            Lat=("Lat", "mean"),
+            Lon=("Lon", "mean"),
+            Count=("Mag", "size"),
+            Max_Mag=("Mag", "max"),
+            Mean_Depth=("Depth", "mean"),
+        )
+        .reset_index(drop=True)
+    )
+    cells_df["Mean_Depth"] = cells_df.Mean_Depth.round(2)
+    return cells_df
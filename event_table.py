@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+Compact in-memory table of the catalog events for the earthquake data app.
+
+The app used to keep the catalog as a GeoDataFrame of shapely Points, with the event dates and times as Python date
+and time objects and the titles, places and detail urls as Python strings; about a kilobyte per event, in every
+worker process.  The event table is a plain pandas dataframe of fixed-width columns instead:
+
+    id                      the USGS event id (object).
+    time                    the origin time in milliseconds since the epoch, UTC (int64).
+    Event_Day               the origin date in LOCAL_TZ, in days since 1970-01-01 (int32).
+    Event_Second            the origin time of day in LOCAL_TZ, in whole seconds (int32).
+    Lat, Lon, Depth         the hypocenter (float32).
+    Mag, CDI                the magnitude rounded to one decimal and the maximum DYFI intensity (float32).
+    Felt                    the number of DYFI responses (int32).
+    Place, Title            dictionary encoded strings (category).
+
+The Event_Date and Event_Time strings, the detail Url and the float64 coordinates are derived on demand by column(),
+for the rows that are displayed.  float32 values are decoded at their stored precision (DECIMALS), e.g. a magnitude
+of 2.3 is 2.3 again rather than 2.299999952316284; five decimals of latitude or longitude are about a meter.  Shapely
+geometries are only built by to_geodataframe(), for code that needs a GeoDataFrame.
+
+usgs_api.py --watch appends new and updated events to the catalog's journal file, one GeoJSON feature per line,
+instead of rewriting the catalog file on every poll.  read_features() applies the journal to the catalog.
+
+event_table.py module contains the following:
+
+    journal_file() - returns the journal file of a catalog file.
+    read_features() - returns the features of a catalog file with its journal applied.
+    read_events() - returns the event table of a catalog GeoJSON file.
+    events_from_features() - returns the event table of catalog GeoJSON features.
+    column() - returns a stored or derived column of the event table as a numpy array.
+    event_filter() - returns the mask of the events in a date and magnitude range.
+    custom_data() - returns the map's per-event customdata array.
+    find_epicenter() - returns the epicenter dictionary of an event in the table.
+    event_url() - returns the USGS detail url of an event.
+    to_geodataframe() - returns the event table as a GeoDataFrame with Point geometries.
+"""
+
+import json
+from datetime import date
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+LOCAL_TZ = "America/New_York"
+DETAIL_URL = "https://earthquake.usgs.gov/fdsnws/event/1/query?eventid={}&format=geojson"
+EPOCH = date(1970, 1, 1)
+JOURNAL_SUFFIX = ".journal"
+
+# Decimals that float32 columns are decoded at.
+DECIMALS = {"Lat": 5, "Lon": 5, "Depth": 3, "Mag": 1, "CDI": 1}
+
+
+def journal_file(event_file):
+    """Return the journal file of a catalog file, e.g. data/SC_Earthquake.journal."""
+    return Path(event_file).with_suffix(JOURNAL_SUFFIX)
+
+
+def read_features(event_file):
+    """Return the features of a catalog file with its journal applied.
+
+    A journal feature replaces the catalog feature with the same id, or is added after the catalog features.  An
+    unfinished last journal line (one still being written) is ignored.
+
+    Parameters
+    ----------
+    event_file : Path
+        The catalog GeoJSON file saved by usgs_api.py -f.
+
+    Returns
+    -------
+    list
+        features -- The GeoJSON features, one per event id.
+
+    """
+    with open(event_file, encoding="utf-8") as fin:
+        features = {feature["id"]: feature for feature in json.load(fin)["features"]}
+    try:
+        with open(journal_file(event_file), encoding="utf-8") as fin:
+            for line in fin:
+                if not line.endswith("\n"):
+                    break
+                feature = json.loads(line)
+                features[feature["id"]] = feature
+    except FileNotFoundError:
+        pass
+    return list(features.values())
+
+
+def read_events(event_file):
+    """Return the event table of a catalog GeoJSON file.
+
+    Parameters
+    ----------
+    event_file : Path
+        The catalog GeoJSON file saved by usgs_api.py -f; its journal is applied.
+
+    Returns
+    -------
+    pandas dataframe
+        events_df -- The event table, one row per event, catalog events first, in file order.
+
+    """
+    return events_from_features(read_features(event_file))
+
+
+def events_from_features(features):
+    """Return the event table of catalog GeoJSON features.
+
+    Parameters
+    ----------
+    features : list
+        The catalog's GeoJSON Point features.
+
+    Returns
+    -------
+    pandas dataframe
+        events_df -- The event table, one row per feature.
+
+    """
+    props = [feature["properties"] for feature in features]
+    coords = np.array([feature["geometry"]["coordinates"][:3] for feature in features], dtype="float64")
+    coords = coords.reshape(-1, 3)
+    times = np.array([p["time"] for p in props], dtype="int64")
+    local = pd.to_datetime(times, unit="ms", utc=True).tz_convert(LOCAL_TZ).tz_localize(None)
+    local_seconds = local.asi8 // 1_000_000_000
+    return pd.DataFrame(
+        {
+            "id": np.array([feature["id"] for feature in features], dtype=object),
+            "time": times,
+            "Event_Day": (local_seconds // 86400).astype("int32"),
+            "Event_Second": (local_seconds % 86400).astype("int32"),
+            "Lat": coords[:, 1].astype("float32"),
+            "Lon": coords[:, 0].astype("float32"),
+            "Depth": coords[:, 2].astype("float32"),
+            "Mag": np.round(np.array([p["mag"] for p in props], dtype="float64"), 1).astype("float32"),
+            "CDI": np.array([p["cdi"] or 0 for p in props], dtype="float32"),
+            "Felt": np.array([p["felt"] or 0 for p in props], dtype="int32"),
+            "Place": pd.Categorical(["No Location" if p["place"] is None else p["place"] for p in props]),
+            "Title": pd.Categorical([p["title"] for p in props]),
+        }
+    )
+
+
+def event_url(evnt_id):
+    """Return the USGS.gov detail url of an event."""
+    return DETAIL_URL.format(evnt_id)
+
+
+def _day_number(day):
+    return (day - EPOCH).days
+
+
+def column(events_df, name):
+    """Return a column of the event table as a numpy array.
+
+    Besides the stored columns, the derived columns Event_Date ("YYYY-MM-DD" strings), Event_Time ("HH:MM:SS" strings)
+    and Url are available.  float32 columns are returned as float64, decoded at their DECIMALS precision, and the
+    dictionary encoded columns as object arrays of strings.
+
+    Parameters
+    ----------
+    events_df : pandas dataframe
+        The event table, or a subset of its rows.
+    name : String
+        The column name.
+
+    Returns
+    -------
+    numpy array
+        The column values, aligned with the rows of events_df.
+
+    """
+    if name == "Event_Date":
+        days = events_df["Event_Day"].to_numpy().astype("int64").astype("datetime64[D]")
+        return np.datetime_as_string(days).astype(object)
+    if name == "Event_Time":
+        seconds = events_df["Event_Second"].to_numpy().astype("int64").astype("datetime64[s]")
+        iso = np.datetime_as_string(seconds).astype("U19")  # 1970-01-01THH:MM:SS
+        return iso.view("U1").reshape(-1, 19)[:, 11:].copy().view("U8").ravel().astype(object)
+    if name == "Url":
+        return np.array([event_url(evnt_id) for evnt_id in events_df["id"]], dtype=object)
+    values = events_df[name].to_numpy()
+    if name in DECIMALS:
+        return np.round(values.astype("float64"), DECIMALS[name])
+    return values
+
+
+def event_filter(events_df, start_date, end_date, min_mag, max_mag):
+    """Return the mask of the events in a date and magnitude range.
+
+    Parameters
+    ----------
+    events_df : pandas dataframe
+        The event table.
+    start_date, end_date : datetime.date
+        The first and last local event dates.
+    min_mag, max_mag : float
+        The magnitude range, inclusive.
+
+    Returns
+    -------
+    numpy array
+        event_mask -- A boolean array aligned with the rows of events_df.
+
+    """
+    days = events_df["Event_Day"].to_numpy()
+    mags = column(events_df, "Mag")
+    return (
+        (days >= _day_number(start_date))
+        & (days <= _day_number(end_date))
+        & (mags >= min_mag)
+        & (mags <= max_mag)
+    )
+
+
+def custom_data(events_df, columns):
+    """Return the map's per-event customdata array.
+
+    Parameters
+    ----------
+    events_df : pandas dataframe
+        The events displayed on the map.
+    columns : list
+        The stored or derived column names, in customdata order.
+
+    Returns
+    -------
+    numpy array
+        An object array with one row per event and one column per name.
+
+    """
+    data = np.empty((len(events_df), len(columns)), dtype=object)
+    for i, name in enumerate(columns):
+        data[:, i] = column(events_df, name)
+    return data
+
+
+def find_epicenter(events_df, evnt_id):
+    """Return the epicenter dictionary (lat, lon, place) of an event, or None if it is not in the table."""
+    rows = np.flatnonzero(events_df["id"].to_numpy() == evnt_id)
+    if len(rows) == 0:
+        return None
+    row = events_df.iloc[rows[:1]]
+    return {
+        "lat": column(row, "Lat")[0],
+        "lon": column(row, "Lon")[0],
+        "place": row["Place"].iat[0],
+    }
+
+
+def to_geodataframe(events_df):
+    """Return the event table as a GeoDataFrame with Point geometries.
+
+    The GeoDataFrame has the columns, dtypes and Python date and time objects of the events GeoDataFrame the app
+    used to keep.
+
+    Parameters
+    ----------
+    events_df : pandas dataframe
+        The event table, or a subset of its rows.
+
+    Returns
+    -------
+    geopandas GeoDataFrame
+        geo_df -- The events, with Point(lon, lat, depth) geometries in EPSG:4326.
+
+    """
+    lon, lat, depth = column(events_df, "Lon"), column(events_df, "Lat"), column(events_df, "Depth")
+    days = events_df["Event_Day"].to_numpy().astype("int64").astype("datetime64[D]").astype(object)
+    seconds = events_df["Event_Second"].to_numpy().astype("int64").astype("datetime64[s]").astype(object)
+    return gpd.GeoDataFrame(
+        {
+            "id": events_df["id"].to_numpy(),
+            "Mag": column(events_df, "Mag"),
+            "Place": column(events_df, "Place").astype(object),
+            "Url": column(events_df, "Url"),
+            "Felt": events_df["Felt"].to_numpy().astype("int64"),
+            "CDI": column(events_df, "CDI"),
+            "Title": column(events_df, "Title").astype(object),
+            "geometry": gpd.points_from_xy(lon, lat, depth),
+            "Event_Date": days,
+            "Event_Time": [t.time() for t in seconds],
+            "time": events_df["time"].to_numpy(),
+            "Depth": depth,
+            "Lat": lat,
+            "Lon": lon,
+        },
+        crs="EPSG:4326",
+    )
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+Incremental parser of the features of a GeoJSON FeatureCollection, as its bytes arrive.
+
+get_eq_events() in usgs_api.py used to hold the whole FDSN event query response in memory with response.json(), then
+flatten every property of every feature with pandas.json_normalize(), to keep four fields of each event.  A multi-year
+query of a large region is hundreds of megabytes of transient Python objects.  iter_features() reads the response body
+in chunks instead and yields one feature dictionary at a time, decoded with json.JSONDecoder.raw_decode(); the caller
+keeps the fields it needs and drops the feature.  Only the unparsed part of the current chunks is buffered, so the
+peak memory is a few chunks plus the largest feature, whatever the number of features.
+
+The other members of the FeatureCollection (type, metadata, bbox) are decoded whole, and can be kept in a dictionary.
+Every chunk can also be written to a file as it is read, e.g. to save the catalog file without holding its text.
+
+feature_stream.py module contains the following:
+
+    iter_features() - yields the features of a GeoJSON FeatureCollection read as a sequence of byte chunks.
+"""
+
+import codecs
+import json
+
+WHITESPACE = " \t\n\r"
+
+
+class _Reader:
+    """A text buffer over a sequence of byte chunks, refilled as values are decoded from it."""
+
+    def __init__(self, chunks, tee=None):
+        self._chunks = iter(chunks)
+        self._tee = tee
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, min_chars=1):
+        """Read chunks until at least min_chars more characters are buffered; return False at the end of the input."""
+        if self.eof:
+            return False
+        # Drop the consumed text, so the buffer holds only what is left to parse.
+        self.buffer = self.buffer[self.pos:]
+        self.pos = 0
+        parts, n_chars = [self.buffer], 0
+        while n_chars < min_chars:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self.eof = True
+                parts.append(self._decoder.decode(b"", final=True))
+                break
+            if self._tee is not None:
+                self._tee.write(chunk)
+            text = self._decoder.decode(chunk)
+            parts.append(text)
+            n_chars += len(text)
+        self.buffer = "".join(parts)
+        return n_chars > 0 or len(parts[-1]) > 0
+
+    def peek(self):
+        """Return the next character that is not whitespace, without consuming it; "" at the end of the input."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, characters):
+        """Consume and return the next character that is not whitespace, which must be one of characters."""
+        char = self.peek()
+        if not char or char not in characters:
+            found = repr(char) if char else "the end of the input"
+            raise json.JSONDecodeError(f"Expecting one of {characters!r}, found {found}", self.buffer, self.pos)
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Decode and consume the next JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # An incomplete value; read at least as much again, so a large value is not re-parsed per chunk.
+                if not self.fill(max(len(self.buffer) - self.pos, 1)):
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk.
+            if end < len(self.buffer) or self.eof:
+                self.pos = end
+                return value
+            if not self.fill():
+                self.pos = end
+                return value
+
+
+def iter_features(chunks, members=None, tee=None):
+    """Yield the features of a GeoJSON FeatureCollection read as a sequence of byte chunks.
+
+    Parameters
+    ----------
+    chunks : iterable
+        The UTF-8 bytes of the FeatureCollection, e.g. requests.Response.iter_content(); a chunk may end anywhere.
+    members : Python dictionary
+        If given, the other members of the FeatureCollection, e.g. metadata, are stored in it.
+    tee : binary file
+        If given, every chunk is written to it as it is read.
+
+    Yields
+    ------
+    Python dictionary
+        Each feature of the features array, in order.
+
+    Raises
+    ------
+    json.JSONDecodeError
+        If the input is not a JSON object, or ends before the object does.
+
+    """
+    reader = _Reader(chunks, tee)
+    reader.expect("{")
+    closed = reader.peek() == "}"
+    if closed:
+        reader.pos += 1
+    while not closed:
+        key = reader.value()
+        reader.expect(":")
+        if key == "features":
+            reader.expect("[")
+            if reader.peek() == "]":
+                reader.pos += 1
+            else:
+                while True:
+                    yield reader.value()
+                    if reader.expect(",]") == "]":
+                        break
+        else:
+            value = reader.value()
+            if members is not None:
+                members[key] = value
+        closed = reader.expect(",}") == "}"
+    # Read the rest of the input, so a tee gets all of it.
+    while reader.fill():
+        pass
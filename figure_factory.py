@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+Plain dictionary figure construction for the earthquake data app.
+
+Building a figure through plotly.graph_objects (go.Figure, add_trace, update_layout, update_traces, or Plotly Express)
+validates every property of every trace and of the layout, including large nested blocks such as the templates,
+colorbars, colorscales and mapbox settings that are the same in every figure of a kind.  Here each layout is
+validated once, by plotly.graph_objects, when it is registered at import time, and kept as a plain dictionary.  A
+figure is then a plain dictionary of hand-written trace dictionaries and a copy of the validated layout with the few
+per-figure values (map center, titles) merged in.  dcc.Graph, Dash and plotly.io accept the figure dictionaries
+directly.
+
+validate_figure() runs a figure dictionary through plotly.graph_objects; benchmarks/figure_equivalence.py uses it to
+check the figures against the graph_objects figures they replace.
+
+figure_factory.py module contains the following functions:
+
+    register_layout() - validates and registers a named layout.
+    layout_template() - returns a named layout validated by plotly.graph_objects, as a dictionary.
+    figure() - returns a figure dictionary of traces and a named layout with per-figure values merged in.
+    epicenter_trace() - returns the scattermapbox trace dictionary of an event epicenter star marker.
+    validate_figure() - returns a figure dictionary as validated and normalized by plotly.graph_objects.
+"""
+
+import plotly.graph_objects as go
+
+_LAYOUTS = {}
+
+
+def register_layout(name, **layout):
+    """Validate and register a named layout.
+
+    The layout is validated when it is registered, at import time, rather than on first use in a request, so that the
+    lazy imports of plotly's validators never run while a background callback worker may be forked.  go.Figure() fills
+    in the default template when the layout does not name one, as it does for any figure.
+
+    Parameters
+    ----------
+    name : String
+        The layout name used with figure().
+    **layout
+        The layout properties, as they would be passed to go.Figure.update_layout(); magic underscores are allowed.
+
+    """
+    fig = go.Figure()
+    fig.update_layout(**layout)
+    _LAYOUTS[name] = fig.to_dict()["layout"]
+
+
+def layout_template(name):
+    """Return a named layout validated by plotly.graph_objects, as a dictionary.
+
+    The returned dictionary is shared and must not be modified; figure() copies what it changes.
+
+    """
+    return _LAYOUTS[name]
+
+
+def _merge(base, updates):
+    """Return a copy of base with updates merged in; only the dictionaries along updated paths are copied."""
+    merged = dict(base)
+    for key, value in updates.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def figure(data, layout, **updates):
+    """Return a figure dictionary.
+
+    Parameters
+    ----------
+    data : list
+        The trace dictionaries, each with its "type".
+    layout : String
+        The name of a registered layout.
+    **updates
+        Per-figure layout values, as nested dictionaries (no magic underscores), merged into a copy of the layout.
+
+    Returns
+    -------
+    Python dictionary
+        fig -- The figure dictionary with "data" and "layout".
+
+    """
+    return {"data": data, "layout": _merge(layout_template(layout), updates)}
+
+
+def epicenter_trace(epicenter, marker, **properties):
+    """Return the scattermapbox trace dictionary of an event epicenter star marker.
+
+    Parameters
+    ----------
+    epicenter : Python dictionary
+        The event's epicenter with the keys lat, lon and place.
+    marker : Python dictionary
+        The marker properties; a star symbol is added.
+    **properties
+        Any other trace properties.
+
+    Returns
+    -------
+    Python dictionary
+        trace -- The scattermapbox trace dictionary.
+
+    """
+    return {
+        "type": "scattermapbox",
+        "lon": [epicenter["lon"]],
+        "lat": [epicenter["lat"]],
+        "mode": "markers+lines",
+        "marker": dict(marker, symbol=["star"]),
+        "name": "",
+        "text": [epicenter["place"]],
+        "hoverlabel": {"bgcolor": "#323232"},
+        "hovertemplate": "Epicenter -- Latitude:  %{lat},  Longitude:  %{lon}<br>"
+        + "Location -- %{text}",
+        **properties,
+    }
+
+
+def validate_figure(fig):
+    """Return a figure dictionary as validated and normalized by plotly.graph_objects.
+
+    Raises ValueError if a trace or layout property is invalid.
+
+    """
+    return go.Figure(fig).to_dict()
@@ -0,0 +1,1093 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+Graph-plot figures for the earthquake data app and their precomputed per-event artifacts.
+
+Every graph-plot shown below the events map is a deterministic function of the event's DYFI files in
+data/<event_id>/ and the event's epicenter.  The figures are built here, outside the Dash app, so that usgs_api.py can
+render them once after downloading an event and store them as ready-to-serve JSON in data/<event_id>/figures/.  At
+request time the app only has to read the stored JSON.  The mapbox access token is never stored in an artifact; the
+app passes it to the dcc.Graph config instead.  The figures are plain dictionaries made with figure_factory.py from
+the layouts registered below, without plotly.graph_objects validation.  The intensity maps store their cells as
+compact cell tables (see utm_cells.py), whose polygons the app makes for just the cells it sends (see viewport.py).
+
+figures.py module contains the following functions:
+
+    intensity_plot_figure() - returns a 1km or 10km spacing choropleth map of the DYFI intensities.
+    intensity_pyramid_figure() - returns the multi-resolution choropleth map of the DYFI intensities.
+    level_figure() - returns the figure of one level of a multi-resolution choropleth map.
+    level_title() - returns the title of a level of a multi-resolution choropleth map.
+    zip_plot_figure() - returns a zipcode choropleth map of the DYFI intensities.
+    response_grid_figure() - returns a choropleth map of the DYFI responses binned into UTM squares of any spacing.
+    intensity_surface_figure() - returns a map of the smoothed DYFI intensity surface.
+    intensity_dist_figure() - returns a graph of the DYFI intensities vs. hypo-central distance.
+    response_time_figure() - returns a line graph of the DYFI number of responses vs. time.
+    dyfi_responses_table() - returns the DYFI responses table columns and rows.
+    build_plot() - returns the figure (or table) of a plot type for an event.
+    response_grid_spacing() - returns the cell spacing of a response grid artifact name.
+    surface_resolution() - returns the pixel size of an intensity surface artifact name.
+    source_files() - returns the DYFI files an artifact is built from.
+    load_artifact() - returns a stored plot artifact if it is up-to-date with the event's DYFI files.
+    sources_changed() - returns True if an artifact's DYFI files changed after a given time.
+    missing_sources() - returns the DYFI files of an artifact that have not been downloaded.
+    save_artifact() - saves a plot artifact to the event's figures directory.
+    artifact_lock() - context manager that serializes the build of a plot artifact across processes.
+    build_event_artifacts() - builds and saves the artifacts of every plot type for an event.
+"""
+
+import argparse
+import json
+import os
+import re
+import tempfile
+from contextlib import ExitStack, contextmanager
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from plotly.io.json import to_json_plotly
+
+from figure_factory import epicenter_trace, figure, register_layout
+from intensity_pyramid import build_pyramid
+from intensity_surface import cell_centroids, interpolate_surface, surface_image
+from metrics import observe_bytes, phase
+from singleflight import file_lock
+from utm_cells import aggregate_cells, encode_cells, utm_coordinates
+
+DATA_DIR = Path(r"./data")
+ZC_DATA_PATH = Path(r"zipcode_data")
+ARTIFACT_DIR = "figures"
+# The version of the stored artifact format, part of the artifact file names.  Change it whenever a change to the figure
+# code changes the artifacts, so that the stored ones are rebuilt; the artifacts without a version are format 1.
+FIGURE_FORMAT_VERSION = 2
+
+# Response grid artifact names, by cell spacing in km; PLOT_TYPES has the default spacing
+RESPONSE_GRID_ARTIFACT = "response_grid_{}km"
+RESPONSE_GRID_NAME = re.compile(r"response_grid_(\d+)km")
+RESPONSE_GRID_SPACING = 5
+RESPONSE_GRID_SPACINGS = range(1, 101)
+
+# Intensity surface artifact names, by pixel size in meters; PLOT_TYPES has the default resolution
+SURFACE_ARTIFACT = "intensity_surface_{}m"
+SURFACE_NAME = re.compile(r"intensity_surface_(\d+)m")
+SURFACE_RESOLUTION = 1000
+SURFACE_RESOLUTIONS = (250, 500, 1000, 2000, 5000)
+
+# Dropdown plot type -> artifact name
+PLOT_TYPES = {
+    "Intensity Plot(Auto)": "intensity_pyramid",
+    "Intensity Plot(1km)": "intensity_1km",
+    "Intensity Plot(10km)": "intensity_10km",
+    "Zip Map": "zip_map",
+    "Intensity Vs. Distance": "intensity_dist",
+    "Response Vs. Time": "response_time",
+    "DYFI Responses": "dyfi_responses",
+    "Response Grid": RESPONSE_GRID_ARTIFACT.format(RESPONSE_GRID_SPACING),
+    "Intensity Surface": SURFACE_ARTIFACT.format(SURFACE_RESOLUTION),
+}
+
+# Artifact name -> DYFI files the artifact is built from (see source_files())
+SOURCE_FILES = {
+    "intensity_pyramid": ("dyfi_geo_1km.geojson",),
+    "intensity_1km": ("dyfi_geo_1km.geojson",),
+    "intensity_10km": ("dyfi_geo_10km.geojson",),
+    "zip_map": ("cdi_zip.csv",),
+    "intensity_dist": ("dyfi_plot_atten.json",),
+    "response_time": ("dyfi_plot_numresp.json",),
+    "dyfi_responses": ("cdi_zip.csv",),
+}
+
+CDI_COLORBAR = dict(
+    orientation="v",
+    lenmode="pixels",
+    len=435,
+    thicknessmode="pixels",
+    thickness=10,
+    xanchor="left",
+    x=-0.025,
+    xpad=1,
+    ticks="inside",
+    tickcolor="white",
+    title=dict(text="CDI"),
+)
+PLOT_MARGIN = {"r": 4, "t": 25, "l": 4, "b": 4}
+
+register_layout(
+    "intensity_map",
+    mapbox=dict(zoom=7.5, style="streets"),
+    coloraxis=dict(colorscale="Portland"),
+    coloraxis_colorbar=CDI_COLORBAR,
+    showlegend=False,
+    paper_bgcolor="#FFDEAD",
+    hovermode="closest",
+    hoverdistance=5,
+    title=dict(font=dict(color="#2F4F4F", size=14)),
+    template="ggplot2",
+    margin=PLOT_MARGIN,
+)
+register_layout(
+    "zip_map",
+    mapbox_style="streets",
+    mapbox_zoom=7.5,
+    autosize=True,
+    margin=PLOT_MARGIN,
+    template="ggplot2",
+    title=dict(font=dict(color="#2F4F4F"), text="Zipcode CDI Choropleth Map"),
+    paper_bgcolor="#FFDEAD",
+    hovermode="closest",
+    hoverdistance=3,
+    coloraxis=dict(colorscale="Portland"),
+    coloraxis_colorbar=CDI_COLORBAR,
+    showlegend=False,
+)
+register_layout(
+    "intensity_dist",
+    margin=PLOT_MARGIN,
+    legend=dict(
+        orientation="v",
+        x=1,
+        y=1.0,
+        xanchor="right",
+        bordercolor="Black",
+        borderwidth=1.0,
+    ),
+)
+register_layout(
+    "response_time",
+    plot_bgcolor="#FAEBD7",
+    paper_bgcolor="#FFDEAD",
+    template="ggplot2",
+    margin=PLOT_MARGIN,
+)
+
+
+def _data_dir(data_dir):
+    """Return the data directory to use; the module's DATA_DIR unless one is given."""
+    return DATA_DIR if data_dir is None else Path(data_dir)
+
+
+def _intensity_choropleth(geojson, names, cdi, dist, nresp, below=False):
+    """Return the choroplethmapbox trace of DYFI intensity cells, given their names, CDI, distance and responses."""
+    nh = np.empty(shape=(len(cdi), 4, 1), dtype="object")
+    nh[:, 0] = np.array(list(names)).reshape(-1, 1)
+    nh[:, 1] = np.array(list(cdi)).reshape(-1, 1)
+    nh[:, 2] = np.array(list(dist)).reshape(-1, 1)
+    nh[:, 3] = np.array(list(nresp)).reshape(-1, 1)
+
+    choropleth = {
+        "type": "choroplethmapbox",
+        "geojson": geojson,
+        "locations": names,
+        "z": cdi,
+        "featureidkey": "properties.name",
+        "coloraxis": "coloraxis",
+        "name": "",
+        "customdata": nh,
+        "hoverlabel": {"bgcolor": "#323232"},
+        "hovertemplate": "UTM Geocode/City: %{customdata[0]}<br>"
+        + "Response Count:  %{customdata[3]} -- "
+        + "CDI: %{customdata[1]} -"
+        + "- Distance %{customdata[2]} km",
+        "marker": {"opacity": 0.30},
+    }
+    if below:
+        choropleth["below"] = ""
+    return choropleth
+
+
+def _cell_table_choropleth(cells, below=False):
+    """Return the choroplethmapbox trace of DYFI intensity cells stored as a cell table (see utm_cells.py).
+
+    The trace has no cells of its own; viewport.cull_figure() makes the features and values of the cells it sends.
+    """
+    choropleth = _intensity_choropleth({"type": "FeatureCollection", "features": []}, [], [], [], [], below)
+    choropleth["utm_cells"] = cells
+    return choropleth
+
+
+def intensity_plot_figure(evnt_id, epicenter, spacing="1km", data_dir=None):
+    """Build a 1km or 10km spacing choropleth map of earthquake DYFI intensities
+
+    Parameters
+    ----------
+    evnt_id : String
+        The event id identifying the selected earthquake event.
+    epicenter : Python dictionary
+        The event's epicenter with the keys lat, lon and place.
+    spacing : String
+        The DYFI geocoded grid spacing, either "1km" or "10km".
+    data_dir : Path
+        The directory containing the event data directories; DATA_DIR if None.
+
+    Returns
+    -------
+    Python dictionary
+        fig -- A figure dictionary containing a 1km or 10km spacing choropleth map, with its cells as a cell table
+        (see utm_cells.py) unless they cannot be encoded as one.
+
+    """
+    filename = _data_dir(data_dir) / evnt_id / f"dyfi_geo_{spacing}.geojson"
+
+    with phase("load"):
+        raw = _read_bytes(filename)
+    with phase("parse"):
+        cdi_geo_geojson = json.loads(raw)
+        cells = encode_cells(cdi_geo_geojson)
+
+    if cells is not None:
+        choropleth = _cell_table_choropleth(cells, below=spacing == "1km")
+    else:
+        cdi_geo_df = pd.json_normalize(cdi_geo_geojson, ["features"])
+        choropleth = _intensity_choropleth(
+            cdi_geo_geojson,
+            cdi_geo_df["properties.name"],
+            cdi_geo_df["properties.cdi"],
+            cdi_geo_df["properties.dist"],
+            cdi_geo_df["properties.nresp"],
+            below=spacing == "1km",
+        )
+
+    return figure(
+        [
+            choropleth,
+            epicenter_trace(epicenter, {"size": 12, "opacity": 1}, showlegend=False),
+        ],
+        "intensity_map",
+        mapbox={"center": {"lat": epicenter["lat"], "lon": epicenter["lon"]}},
+        title={"text": f"CDI Choropleth Mapbox Plot - {spacing} Spacing"},
+    )
+
+
+def intensity_pyramid_figure(evnt_id, epicenter, data_dir=None):
+    """Build the multi-resolution choropleth map of earthquake DYFI intensities.
+
+    The 1km DYFI cells are aggregated into every PYRAMID_LEVELS spacing (see intensity_pyramid.py).  The map is stored
+    without its choropleth trace; level_figure() returns the figure of one level.
+
+    Parameters
+    ----------
+    evnt_id : String
+        The USGS.gov id string of the earthquake event.
+    epicenter : Python dictionary
+        The event's epicenter with the keys lat, lon and place.
+    data_dir : Path
+        The directory containing the event data directories; DATA_DIR if None.
+
+    Returns
+    -------
+    Python dictionary
+        fig -- A figure dictionary with only the epicenter trace, and a "levels" dictionary of the choropleth trace of
+        each level, keyed by its spacing in km as a string.
+
+    """
+    filename = _data_dir(data_dir) / evnt_id / "dyfi_geo_1km.geojson"
+
+    with phase("load"):
+        raw = _read_bytes(filename)
+    with phase("parse"):
+        cells = encode_cells(json.loads(raw))
+    if cells is None:
+        raise ValueError(f"{filename} has cells that are not UTM squares of one spacing")
+
+    levels = {
+        str(level): _cell_table_choropleth(table, below=level == 1) for level, table in build_pyramid(cells).items()
+    }
+
+    fig = figure(
+        [epicenter_trace(epicenter, {"size": 12, "opacity": 1}, showlegend=False)],
+        "intensity_map",
+        mapbox={"center": {"lat": epicenter["lat"], "lon": epicenter["lon"]}},
+    )
+    fig["levels"] = levels
+    return fig
+
+
+def level_figure(plot, level):
+    """Return the figure of one level of a multi-resolution intensity map (see intensity_pyramid_figure())."""
+    layout = dict(plot["layout"], title=dict(plot["layout"].get("title", {}), text=level_title(level)))
+    return {"data": [plot["levels"][str(level)], *plot["data"]], "layout": layout}
+
+
+def level_title(level):
+    """Return the title of a level of a multi-resolution intensity map."""
+    return f"CDI Choropleth Mapbox Plot - {level}km Spacing (Auto)"
+
+
+def response_grid_figure(evnt_id, epicenter, spacing, data_dir=None):
+    """Build a choropleth map of the DYFI responses binned into UTM squares of any spacing.
+
+    The geocoded responses of cdi_zip.csv are projected to their UTM zones and binned into squares of the spacing;
+    a square's CDI and distance are the response-weighted means of its responses' (see utm_cells.aggregate_cells()).
+
+    Parameters
+    ----------
+    evnt_id : String
+        The USGS.gov id string of the earthquake event.
+    epicenter : Python dictionary
+        The event's epicenter with the keys lat, lon and place.
+    spacing : int
+        The cell spacing in km, one of RESPONSE_GRID_SPACINGS.
+    data_dir : Path
+        The directory containing the event data directories; DATA_DIR if None.
+
+    Returns
+    -------
+    Python dictionary
+        fig -- A figure dictionary containing a choropleth map of the responses, with its cells as a cell table.
+
+    """
+    filename = _data_dir(data_dir) / evnt_id / "cdi_zip.csv"
+
+    with phase("load"):
+        raw = _read_bytes(filename)
+    with phase("parse"):
+        responses_df = pd.read_csv(
+            BytesIO(raw), usecols=["CDI", "Response_Count", "Hypocentral_Distance", "Latitude", "Longitude"]
+        ).dropna()
+
+    zone, band, easting, northing = utm_coordinates(responses_df["Longitude"], responses_df["Latitude"])
+    cells = aggregate_cells(
+        zone,
+        band,
+        easting,
+        northing,
+        responses_df["CDI"],
+        responses_df["Hypocentral_Distance"],
+        responses_df["Response_Count"],
+        spacing * 1000,
+    )
+
+    return figure(
+        [
+            _cell_table_choropleth(cells, below=True),
+            epicenter_trace(epicenter, {"size": 12, "opacity": 1}, showlegend=False),
+        ],
+        "intensity_map",
+        mapbox={"center": {"lat": epicenter["lat"], "lon": epicenter["lon"]}},
+        title={"text": f"Response CDI Choropleth Mapbox Plot - {spacing}km Spacing"},
+    )
+
+
+def intensity_surface_figure(evnt_id, epicenter, resolution, data_dir=None):
+    """Build a map of the smoothed DYFI intensity surface of an event.
+
+    The CDI of the 1km cells is interpolated into a raster (see intensity_surface.py), shown as a mapbox image layer.
+
+    Parameters
+    ----------
+    evnt_id : String
+        The USGS.gov id string of the earthquake event.
+    epicenter : Python dictionary
+        The event's epicenter with the keys lat, lon and place.
+    resolution : int
+        The pixel size in meters, one of SURFACE_RESOLUTIONS.
+    data_dir : Path
+        The directory containing the event data directories; DATA_DIR if None.
+
+    Returns
+    -------
+    Python dictionary
+        fig -- A figure dictionary containing the epicenter and the intensity surface image.
+
+    """
+    filename = _data_dir(data_dir) / evnt_id / "dyfi_geo_1km.geojson"
+
+    with phase("load"):
+        raw = _read_bytes(filename)
+    with phase("parse"):
+        lon, lat, cdi, nresp = cell_centroids(json.loads(raw))
+    if len(cdi) == 0:
+        raise ValueError(f"{filename} has no cells")
+
+    surface, coordinates = interpolate_surface(lon, lat, cdi, nresp, resolution / 1000, epicenter)
+    cmin, cmax = float(cdi.min()), float(cdi.max())
+
+    return figure(
+        [
+            epicenter_trace(epicenter, {"size": 12, "opacity": 1}, showlegend=False),
+            # Shows the coloraxis colorbar of the image; its markers are invisible.
+            {
+                "type": "scattermapbox",
+                "lat": [epicenter["lat"]] * 2,
+                "lon": [epicenter["lon"]] * 2,
+                "mode": "markers",
+                "marker": {"color": [cmin, cmax], "coloraxis": "coloraxis", "opacity": 0},
+                "hoverinfo": "skip",
+                "showlegend": False,
+            },
+        ],
+        "intensity_map",
+        mapbox={
+            "center": {"lat": epicenter["lat"], "lon": epicenter["lon"]},
+            "layers": [
+                {
+                    "sourcetype": "image",
+                    "source": surface_image(surface, cmin, cmax),
+                    "coordinates": coordinates,
+                }
+            ],
+        },
+        coloraxis={"cmin": cmin, "cmax": cmax},
+        title={"text": f"CDI Intensity Surface - {resolution}m Resolution"},
+    )
+
+
+def _read_bytes(filename):
+    """Read a DYFI file and record its size."""
+    with open(filename, "rb") as fin:
+        raw = fin.read()
+    observe_bytes("source", len(raw))
+    return raw
+
+
+@lru_cache(maxsize=2)
+def _read_zipcodes(data_dir):
+    """Read the SC zipcode shapefile once per data directory."""
+    zc_filename = _data_dir(data_dir) / ZC_DATA_PATH / "cb_2010_45_zcta510.shp"
+    sc_zip_df = gpd.read_file(zc_filename)
+    sc_zip_df["Zipcode"] = sc_zip_df[["Zipcode"]].astype("str")
+    return sc_zip_df
+
+
+def zip_plot_figure(evnt_id, epicenter, data_dir=None):
+    """Build a zipcode choropleth map of the earthquake DYFI intensities.
+
+    Parameters
+    ----------
+    evnt_id : String
+        The USGS.gov id string of the earthquake event.
+    epicenter : Python dictionary
+        The event's epicenter with the keys lat, lon and place.
+    data_dir : Path
+        The directory containing the event data directories; DATA_DIR if None.
+
+    Returns
+    -------
+    Python dictionary
+        fig -- A figure dictionary containing a zipcode DYFI intensities choropleth map.
+
+    """
+    filename = _data_dir(data_dir) / evnt_id / "cdi_zip.csv"
+    with phase("load"):
+        raw = _read_bytes(filename)
+    with phase("parse"):
+        cdi_zip_df = pd.read_csv(BytesIO(raw))
+    cdi_zip_df.rename({"# Columns: ZIP/Location": "ZIP/Location"}, axis=1, inplace=True)
+
+    # Using NC, SC, & GA region zipcodes instead of just SC
+    # zc_filename = DATA_DIR / "NC_SC_GA_region_zipcodes.geojson"
+    # Used parquet file format for the zip code file because it is read in faster; geojson file read is way too slow
+
+    # zc_filename = DATA_DIR / "NC_SC_GA_region_zipcodes.parquet"
+    # sc_zip_df = gpd.read_parquet(zc_filename, columns=["geometry", "ZCTA5CE10"])
+
+    with phase("load"):
+        sc_zip_df = _read_zipcodes(_data_dir(data_dir))
+
+    cdi_zip_df["ZIP/Location"] = cdi_zip_df[["ZIP/Location"]].astype("str")
+
+    df = cdi_zip_df.copy()
+    geo_dff = gpd.GeoDataFrame(sc_zip_df).merge(
+        df, left_on="Zipcode", right_on="ZIP/Location"
+    )
+
+    geo_dff = geo_dff[
+        ["Zipcode", "CDI", "Response_Count", "Hypocentral_Distance", "geometry"]
+    ]
+
+    state_zip_json = json.loads(geo_dff.to_json())
+
+    ww = list(df["CDI"])
+    xx = list(df["ZIP/Location"])
+    yy = list(df["Response_Count"])
+    zz = list(df["Hypocentral_Distance"])
+
+    nh = np.empty(shape=(len(yy), 4, 1), dtype="object")
+    nh[:, 0] = np.array(xx).reshape(-1, 1)
+    nh[:, 1] = np.array(yy).reshape(-1, 1)
+    nh[:, 2] = np.array(zz).reshape(-1, 1)
+    nh[:, 3] = np.array(ww).reshape(-1, 1)
+
+    return figure(
+        [
+            {
+                "type": "choroplethmapbox",
+                "geojson": state_zip_json,
+                "locations": df["ZIP/Location"],
+                "z": df["CDI"],
+                "featureidkey": "properties.Zipcode",
+                "marker": {"opacity": 0.3, "line": {"width": 0.5}},
+                "showscale": True,
+                "coloraxis": "coloraxis",
+                "name": "",
+                "customdata": nh,
+                "hoverlabel": {"bgcolor": "#323232"},
+                "hovertemplate": "ZIP/Postal Code:  %{customdata[0]}<br>"
+                + "Responses:  %{customdata[1]}<br>"
+                + "CDI:  %{customdata[3]}"
+                + " -- Distance:  %{customdata[2]} km",
+            },
+            epicenter_trace(epicenter, {"size": 10}),
+        ],
+        "zip_map",
+        mapbox={"center": {"lat": epicenter["lat"], "lon": epicenter["lon"]}},
+    )
+
+
+def intensity_dist_figure(evnt_id, data_dir=None):
+    """Build a graph of the event's DYFI reported intensities vs. hypo-central distance from the event.
+
+    The graph contains various intensity vs. distance statistics.
+      First -- Every DYFI intensity reported vs. hypo-central distance
+      Second -- Intensity prediction based on the indicated equation
+      Third -- Mean intensity +/- one Std. Dev. each distance bin
+      Fourth -- Median Intensity for each distance bin
+
+    Parameters
+    ----------
+    evnt_id : String
+        The USGS.gov id string for the earthquake event.
+    data_dir : Path
+        The directory containing the event data directories; DATA_DIR if None.
+
+    Returns
+    -------
+    Python dictionary
+        fig -- A figure dictionary containing the four intensity vs. distance subplots.
+
+    """
+    filename = _data_dir(data_dir) / evnt_id / "dyfi_plot_atten.json"
+    with phase("load"):
+        raw = _read_bytes(filename)
+    with phase("parse"):
+        intensity_dist_df = pd.read_json(BytesIO(raw))
+
+    # Hover text lists are strings, as plotly.graph_objects validation used to make them.
+    traces = []
+    xaxis = {}
+    yaxis = {}
+    updates = {}
+    for dsi in range(len(intensity_dist_df)):
+        dataset_df = pd.DataFrame(intensity_dist_df.datasets[dsi])
+        if dataset_df["class"][0] == "scatterplot1":
+            sct_plt_df = dataset_df.from_records(data=dataset_df.data)
+            xi = list(sct_plt_df.x)
+            yi = list(sct_plt_df.y)
+            ylabel = intensity_dist_df.ylabel[0]
+
+            traces.append(
+                {
+                    "type": "scatter",
+                    "x": xi,
+                    "y": yi,
+                    "mode": "markers",
+                    "marker": {"color": "rgb(148, 223, 234)", "size": 6},
+                    "name": "All Reported Data",
+                    "customdata": xi,
+                    "text": [str(y) for y in yi],
+                    "hovertemplate": "Hypocentral Dist. (km):  %{customdata}<br>"
+                    + "CDI:  %{text}",
+                }
+            )
+            yaxis.update(
+                title={"text": ylabel},
+                range=[0, 10],
+                tickvals=[0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10],
+                fixedrange=True,
+            )
+            updates.update(
+                title={"text": "Intensity Vs. Distance"},
+                plot_bgcolor="#FAEBD7",
+                paper_bgcolor="#FFDEAD",
+            )
+
+        elif dataset_df["class"][0] == "estimated1":
+            est_plt_df = dataset_df.from_records(data=dataset_df.data)
+            xi = list(est_plt_df.x)
+            yi = list(est_plt_df.y)
+            name = dataset_df["legend"][0]
+
+            traces.append(
+                {
+                    "type": "scatter",
+                    "x": xi,
+                    "y": yi,
+                    "name": name,
+                    "mode": "lines+markers",
+                    "line": {"color": "rgb(214, 86, 23)", "width": 2},
+                    "marker": {"color": "rgb(214, 86, 23)", "size": 6},
+                    "customdata": xi,
+                    "text": [str(y) for y in yi],
+                    "hovertemplate": "Hypocentral Dist. (km):  %{customdata}<br>"
+                    + "Estimated CDI:  %{text:.2f}",
+                }
+            )
+
+        elif dataset_df["class"][0] == "estimated2":
+            est_plt_df = dataset_df.from_records(data=dataset_df.data)
+            xi = list(est_plt_df.x)
+            yi = list(est_plt_df.y)
+            name = dataset_df["legend"][0]
+
+            traces.append(
+                {
+                    "type": "scatter",
+                    "x": xi,
+                    "y": yi,
+                    "name": name,
+                    "mode": "lines+markers",
+                    "line": {"color": "orange", "width": 2},
+                    "marker": {"color": "orange", "size": 6},
+                    "customdata": xi,
+                    "text": [str(y) for y in yi],
+                    "hovertemplate": "Hypocentral Dist. (km):  %{customdata}<br>"
+                    + "Estimated CDI:  %{text:.2f}",
+                }
+            )
+
+        elif dataset_df["class"][0] == "binned":
+            mean_plt_df = dataset_df.from_records(data=dataset_df.data)
+
+            xi = mean_plt_df.x
+            yi = mean_plt_df.y
+            yerr = mean_plt_df.stdev
+            xlabel = intensity_dist_df.xlabel[0]
+            ylabel = intensity_dist_df.ylabel[0]
+            name = dataset_df["legend"][0]
+
+            xx = list(mean_plt_df.x)
+            yy = list(mean_plt_df.y)
+            yyerr = list(mean_plt_df.stdev)
+            nk = np.empty(shape=(len(xx), 3, 1))
+            nk[:, 0] = np.array(xx).reshape(-1, 1)
+            nk[:, 1] = np.array(yy).reshape(-1, 1)
+            nk[:, 2] = np.array(yyerr).reshape(-1, 1)
+
+            traces.append(
+                {
+                    "type": "scatter",
+                    "x": xi,
+                    "y": yi,
+                    "name": name,
+                    "error_y": {
+                        "type": "data",
+                        "array": yerr,
+                        "color": "rgb(141, 145, 235)",
+                        "visible": True,
+                    },
+                    "mode": "markers",
+                    "marker": {"color": "rgb(141, 145, 235)", "size": 6},
+                    "customdata": nk,
+                    "hovertemplate": "Hypocentral Dist. (km):  %{customdata[0]}<br>"
+                    + "Mean CDI:  %{customdata[1]:.1f}<br>"
+                    + "Std. Dev. %{customdata[2]:.2f}",
+                }
+            )
+            xaxis["title"] = {"text": xlabel}
+            yaxis["title"] = {"text": ylabel}
+
+        elif dataset_df["class"][0] == "median":
+            median_plt_df = dataset_df.from_records(data=dataset_df.data)
+            xi = median_plt_df.x  # Distance
+            yi = median_plt_df.y  # CDI
+            xlabel = intensity_dist_df.xlabel[0]
+            name = dataset_df["legend"][0]
+
+            traces.append(
+                {
+                    "type": "scatter",
+                    "x": xi,
+                    "y": yi,
+                    "mode": "markers",
+                    "name": name,
+                    "marker": {"color": "rgb(254, 77, 85)", "size": 6},
+                    "customdata": xi,
+                    "text": yi,
+                    "hovertemplate": "Hypocentral Dist. (km):  %{customdata}<br>"
+                    + "Median CDI:  %{text}",
+                }
+            )
+            xaxis.update(title={"text": xlabel}, range=[0, max(xi)])
+
+    if xaxis:
+        updates["xaxis"] = xaxis
+    if yaxis:
+        updates["yaxis"] = yaxis
+    return figure(traces, "intensity_dist", **updates)
+
+
+def response_time_figure(evnt_id, data_dir=None):
+    """Build a line graph of DYFI number of responses vs. time since earthquake event.
+
+    Parameters
+    ----------
+    evnt_id : String
+        The USGS.gov id string for the earthquake event.
+    data_dir : Path
+        The directory containing the event data directories; DATA_DIR if None.
+
+    Returns
+    -------
+    Python dictionary
+        fig -- A figure dictionary containing a line graph of responses vs. time.
+
+    """
+    filename = _data_dir(data_dir) / evnt_id / "dyfi_plot_numresp.json"
+    with phase("load"):
+        raw = _read_bytes(filename)
+    with phase("parse"):
+        resp_time_df = pd.read_json(BytesIO(raw))
+
+    resp_time_ds_df = pd.DataFrame(resp_time_df.datasets[0])
+    resp_time_plot_df = resp_time_ds_df.from_records(data=resp_time_ds_df.data)
+
+    xi = list(resp_time_plot_df.x)
+    yi = list(resp_time_plot_df.y)
+    xlabel = resp_time_df.xlabel[0]
+    ylabel = resp_time_df.ylabel[0]
+    title = resp_time_df.title[0]
+
+    return figure(
+        [
+            {
+                "type": "scatter",
+                "x": xi,
+                "y": yi,
+                "mode": "lines+markers",
+                "line": {"color": "green", "width": 2},
+                "marker": {"color": "green", "size": 6},
+                "hovertemplate": "Responses:  %{y}<br>"
+                + "Time Since Event:  %{x}<extra></extra>",
+            }
+        ],
+        "response_time",
+        title={"text": title},
+        xaxis={"title": {"text": xlabel}},
+        yaxis={"title": {"text": ylabel}},
+    )
+
+
+def dyfi_responses_table(evnt_id, data_dir=None):
+    """Build the DYFI responses table data.
+
+    Parameters
+    ----------
+    evnt_id : String
+        The USGS.gov id string for the earthquake event.
+    data_dir : Path
+        The directory containing the event data directories; DATA_DIR if None.
+
+    Returns
+    -------
+    Python dictionary
+        table -- A dictionary with the table "columns" names and the table "rows", each row a list of cell strings.
+
+    """
+    filename = _data_dir(data_dir) / evnt_id / "cdi_zip.csv"
+    with phase("load"):
+        raw = _read_bytes(filename)
+    with phase("parse"):
+        dyfi_responses_df = pd.read_csv(BytesIO(raw), index_col=False)
+    return {
+        "columns": list(dyfi_responses_df.columns),
+        "rows": [
+            [str(c) for c in r] for r in dyfi_responses_df.to_records(index=False)
+        ],
+    }
+
+
+def build_plot(artifact, evnt_id, epicenter, data_dir=None):
+    """Build the figure, or the table data, of an artifact name for an event.
+
+    Parameters
+    ----------
+    artifact : String
+        The artifact name, one of the PLOT_TYPES values, or a response grid or intensity surface artifact name of
+        another spacing or resolution.
+    evnt_id : String
+        The USGS.gov id string for the earthquake event.
+    epicenter : Python dictionary
+        The event's epicenter with the keys lat, lon and place.
+    data_dir : Path
+        The directory containing the event data directories; DATA_DIR if None.
+
+    Returns
+    -------
+    Python dictionary
+        The plot figure dictionary, or the table data for the "dyfi_responses" artifact.
+
+    """
+    with phase("build"):
+        if artifact == "intensity_pyramid":
+            return intensity_pyramid_figure(evnt_id, epicenter, data_dir)
+        elif artifact == "intensity_1km":
+            return intensity_plot_figure(evnt_id, epicenter, "1km", data_dir)
+        elif artifact == "intensity_10km":
+            return intensity_plot_figure(evnt_id, epicenter, "10km", data_dir)
+        elif artifact == "zip_map":
+            return zip_plot_figure(evnt_id, epicenter, data_dir)
+        elif artifact == "intensity_dist":
+            return intensity_dist_figure(evnt_id, data_dir)
+        elif artifact == "response_time":
+            return response_time_figure(evnt_id, data_dir)
+        elif artifact == "dyfi_responses":
+            return dyfi_responses_table(evnt_id, data_dir)
+        elif response_grid_spacing(artifact) is not None:
+            return response_grid_figure(evnt_id, epicenter, response_grid_spacing(artifact), data_dir)
+        elif surface_resolution(artifact) is not None:
+            return intensity_surface_figure(evnt_id, epicenter, surface_resolution(artifact), data_dir)
+    raise ValueError(f"Unknown plot artifact {artifact!r}")
+
+
+def response_grid_spacing(artifact):
+    """Return the cell spacing in km of a response grid artifact name, or None for another artifact name."""
+    match = RESPONSE_GRID_NAME.fullmatch(artifact)
+    if match is None or int(match.group(1)) not in RESPONSE_GRID_SPACINGS:
+        return None
+    return int(match.group(1))
+
+
+def surface_resolution(artifact):
+    """Return the pixel size in meters of an intensity surface artifact name, or None for another artifact name."""
+    match = SURFACE_NAME.fullmatch(artifact)
+    if match is None or int(match.group(1)) not in SURFACE_RESOLUTIONS:
+        return None
+    return int(match.group(1))
+
+
+def source_files(artifact):
+    """Return the DYFI files an artifact is built from."""
+    if response_grid_spacing(artifact) is not None:
+        return ("cdi_zip.csv",)
+    if surface_resolution(artifact) is not None:
+        return ("dyfi_geo_1km.geojson",)
+    return SOURCE_FILES[artifact]
+
+
+def artifact_path(evnt_id, artifact, data_dir=None):
+    """Return the path of an event's stored plot artifact of the current FIGURE_FORMAT_VERSION."""
+    return _data_dir(data_dir) / evnt_id / ARTIFACT_DIR / f"{artifact}.v{FIGURE_FORMAT_VERSION}.json"
+
+
+def load_artifact(evnt_id, artifact, data_dir=None):
+    """Load a stored plot artifact.
+
+    Parameters
+    ----------
+    evnt_id : String
+        The USGS.gov id string for the earthquake event.
+    artifact : String
+        The artifact name, one of the PLOT_TYPES values.
+    data_dir : Path
+        The directory containing the event data directories; DATA_DIR if None.
+
+    Returns
+    -------
+    Python dictionary or None
+        The stored figure (or table) dictionary, or None if the artifact has not been built in the current
+        FIGURE_FORMAT_VERSION or is older than any of the DYFI files it was built from.
+
+    """
+    filename = artifact_path(evnt_id, artifact, data_dir)
+    try:
+        built = filename.stat().st_mtime
+        for source in source_files(artifact):
+            if (_data_dir(data_dir) / evnt_id / source).stat().st_mtime > built:
+                return None
+        with phase("load"):
+            raw = _read_bytes(filename)
+        with phase("parse"):
+            return json.loads(raw)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def sources_changed(evnt_id, artifact, since, data_dir=None):
+    """Return True if any of the DYFI files an artifact is built from was modified, or removed, after a time.
+
+    Parameters
+    ----------
+    evnt_id : String
+        The USGS.gov id string for the earthquake event.
+    artifact : String
+        The artifact name, one of the PLOT_TYPES values.
+    since : float
+        The time, as a time.time() value.
+    data_dir : Path
+        The directory containing the event data directories; DATA_DIR if None.
+
+    """
+    for source in source_files(artifact):
+        try:
+            if (_data_dir(data_dir) / evnt_id / source).stat().st_mtime > since:
+                return True
+        except FileNotFoundError:
+            return True
+    return False
+
+
+def missing_sources(evnt_id, artifact, data_dir=None):
+    """Return the DYFI files an artifact is built from that are not in the event's data directory.
+
+    Parameters
+    ----------
+    evnt_id : String
+        The USGS.gov id string for the earthquake event.
+    artifact : String
+        The artifact name, one of the PLOT_TYPES values.
+    data_dir : Path
+        The directory containing the event data directories; DATA_DIR if None.
+
+    Returns
+    -------
+    list
+        The missing file names; empty if the artifact can be built.
+
+    """
+    event_dir = _data_dir(data_dir) / evnt_id
+    return [source for source in source_files(artifact) if not (event_dir / source).exists()]
+
+
+def save_artifact(evnt_id, artifact, plot, data_dir=None):
+    """Save a plot artifact as JSON.
+
+    The artifact is written to a temporary file and then renamed, so a reader never sees a partially written file.
+    The artifact's files of other FIGURE_FORMAT_VERSIONs are removed.
+
+    Parameters
+    ----------
+    evnt_id : String
+        The USGS.gov id string for the earthquake event.
+    artifact : String
+        The artifact name, one of the PLOT_TYPES values.
+    plot : Python dictionary
+        The figure dictionary, or the table data, to save.
+    data_dir : Path
+        The directory containing the event data directories; DATA_DIR if None.
+
+    Returns
+    -------
+    String
+        The JSON text that was saved.
+
+    """
+    with phase("serialize"):
+        plot_json = to_json_plotly(plot)
+    observe_bytes("artifact", len(plot_json))
+    filename = artifact_path(evnt_id, artifact, data_dir)
+    filename.parent.mkdir(exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=filename.parent, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as fout:
+        fout.write(plot_json)
+    os.chmod(tmp_name, 0o644)
+    os.replace(tmp_name, filename)
+    for stale in (filename.parent / f"{artifact}.json", *filename.parent.glob(f"{artifact}.v*.json")):
+        if stale != filename:
+            stale.unlink(missing_ok=True)
+    return plot_json
+
+
+@contextmanager
+def artifact_lock(evnt_id, artifact, timeout=None, data_dir=None):
+    """Hold the lock of an event's plot artifact, so only one process at a time builds it.
+
+    A process that gets the lock after another process built the artifact should load_artifact() again before
+    building it.  If the lock file cannot be created (no event directory, or a read-only data directory), the block
+    runs without the lock.
+
+    Parameters
+    ----------
+    evnt_id : String
+        The USGS.gov id string for the earthquake event.
+    artifact : String
+        The artifact name, one of the PLOT_TYPES values.
+    timeout : float
+        The maximum number of seconds to wait for the lock; None waits for as long as it takes.
+    data_dir : Path
+        The directory containing the event data directories; DATA_DIR if None.
+
+    Raises
+    ------
+    TimeoutError
+        If another process held the lock for longer than the timeout.
+
+    """
+    filename = artifact_path(evnt_id, artifact, data_dir).with_suffix(".lock")
+    with ExitStack() as stack:
+        try:
+            filename.parent.mkdir(exist_ok=True)
+            stack.enter_context(file_lock(filename, timeout))
+        except TimeoutError:
+            raise
+        except OSError:
+            pass
+        yield
+
+
+def build_event_artifacts(evnt_id, epicenter, data_dir=None):
+    """Build and save the artifacts of every plot type for an event.
+
+    Parameters
+    ----------
+    evnt_id : String
+        The USGS.gov id string for the earthquake event.
+    epicenter : Python dictionary
+        The event's epicenter with the keys lat, lon and place.
+    data_dir : Path
+        The directory containing the event data directories; DATA_DIR if None.
+
+    Returns
+    -------
+    Python dictionary
+        failed -- Artifact name -> error message for every artifact that could not be built.
+
+    """
+    failed = {}
+    for artifact in PLOT_TYPES.values():
+        try:
+            with artifact_lock(evnt_id, artifact, data_dir=data_dir):
+                plot = build_plot(artifact, evnt_id, epicenter, data_dir)
+                save_artifact(evnt_id, artifact, plot, data_dir)
+        except Exception as exc:  # pylint: disable='broad-exception-caught'
+            failed[artifact] = f"{type(exc).__name__}: {exc}"
+    return failed
+
+
+def event_epicenter(feature):
+    """Return the epicenter dictionary of an event GeoJSON feature."""
+    lon, lat = feature["geometry"]["coordinates"][:2]
+    place = feature["properties"]["place"]
+    return {"lat": lat, "lon": lon, "place": place if place else "No Location"}
+
+
+if __name__ == "__main__":
+    """Build the plot artifacts of every downloaded event."""
+    my_parser = argparse.ArgumentParser(
+        prog="figures",
+        description="Build the graph-plot artifacts of the downloaded earthquake events",
+    )
+    my_parser.add_argument(
+        "-e",
+        "--event",
+        action="append",
+        dest="events",
+        help="Only build the artifacts of this event id (may be repeated)",
+    )
+    args = my_parser.parse_args()
+
+    with open(DATA_DIR / "SC_Earthquake.geojson", encoding="utf-8") as fin:
+        features = json.load(fin)["features"]
+    for feature in features:
+        event_id = feature["id"]
+        if args.events and event_id not in args.events:
+            continue
+        if not (DATA_DIR / event_id).is_dir():
+            continue
+        for name, error in build_event_artifacts(
+            event_id, event_epicenter(feature)
+        ).items():
+            print(f"{event_id}: {name} not built -- {error}")
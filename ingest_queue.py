@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+Durable queue of the per-event ingest jobs of usgs_api.py, shared by any number of worker processes.
+
+A usgs_api.py run downloads the DYFI products of every event in one process, so a backfill of many events is bounded
+by one machine.  With --enqueue, the run only retrieves the events (part one) and adds one job per event to a JobQueue,
+an SQLite database in the data directory; every usgs_api.py --worker process, on the same host or on another host that
+mounts the same data directory, then claims jobs and runs them: the event's detail document, its five DYFI product
+files and its figure artifacts.  A job only writes the files of its event, atomically, so running a job twice is
+harmless.
+
+A worker claims a job with a lease of LEASE_SECONDS.  A job whose worker died is claimed again once its lease
+expires.  A failed job is retried after RETRY_DELAY seconds, doubled at every attempt, and is marked failed after
+MAX_ATTEMPTS attempts.  Enqueuing an event again only resets its job when the event was updated since it was enqueued,
+or when its job failed, so a backfill can be enqueued again to pick up the changed and new events and to retry the
+failed ones.
+
+Every operation is a short transaction on its own connection, so the queue can be used from several threads and
+processes at once; SQLite's file locks serialize the claims.  A queue on a network file system needs working POSIX
+file locks (e.g. NFSv4); the database is not switched to WAL mode, which does not work over a network file system.
+
+ingest_queue.py module contains the following:
+
+    JobQueue - a durable queue of event ingest jobs, with leases and retries.
+"""
+
+import sqlite3
+import time
+from contextlib import closing
+
+LEASE_SECONDS = 600
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 30
+BUSY_TIMEOUT = 60  # seconds a connection waits for another process's transaction
+JOB_FIELDS = ("event_id", "detail", "place", "lon", "lat", "updated")
+STATES = ("pending", "leased", "done", "failed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    event_id TEXT PRIMARY KEY,
+    detail TEXT NOT NULL,
+    place TEXT,
+    lon REAL,
+    lat REAL,
+    updated INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    error TEXT,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, available_at);
+"""
+
+
+class JobQueue:
+    """A durable queue of event ingest jobs, with leases and retries.
+
+    A job is a dictionary of JOB_FIELDS: the event id, its detail url, place, epicenter longitude and latitude, and
+    update time (milliseconds since the epoch).
+
+    Parameters
+    ----------
+    path : Path
+        The SQLite database file; created if it does not exist.
+    lease_seconds : float
+        How long a claimed job belongs to its worker before another worker can claim it.
+    max_attempts : int
+        The number of attempts after which a failing job is marked failed.
+    retry_delay : float
+        The number of seconds before the first retry of a failed job; doubled at every attempt.
+
+    """
+
+    def __init__(self, path, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS, retry_delay=RETRY_DELAY):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        # Autocommit mode; transactions are started explicitly with BEGIN IMMEDIATE.
+        return sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+
+    def enqueue(self, jobs):
+        """Add jobs to the queue; return the number of jobs added or reset.
+
+        A job of an event already in the queue is only reset, to pending with no attempts, if its update time is newer
+        than the queued job's or if the queued job failed.
+
+        Parameters
+        ----------
+        jobs : iterable
+            The job dictionaries.
+
+        Returns
+        -------
+        int
+            The number of new or reset jobs.
+
+        """
+        rows = [tuple(job[field] for field in JOB_FIELDS) for job in jobs]
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT INTO jobs (event_id, detail, place, lon, lat, updated) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (event_id) DO UPDATE SET detail = excluded.detail, place = excluded.place, "
+                "lon = excluded.lon, lat = excluded.lat, updated = excluded.updated, state = 'pending', attempts = 0, "
+                "available_at = 0, lease_owner = NULL, lease_expires = NULL, error = NULL, finished_at = NULL "
+                "WHERE excluded.updated > jobs.updated OR jobs.state = 'failed'",
+                rows,
+            )
+            changed = conn.total_changes - before
+            conn.execute("COMMIT")
+        return changed
+
+    def claim(self, worker):
+        """Claim the next available job for a worker.
+
+        A job is available when it is pending and its retry delay has passed, or when its lease expired.  An expired
+        job that had its last attempt is marked failed instead.
+
+        Parameters
+        ----------
+        worker : String
+            The worker's id, e.g. host:pid:thread.
+
+        Returns
+        -------
+        Python dictionary or None
+            The job, with its attempt number (attempts); None if no job is available.
+
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "UPDATE jobs SET state = 'failed', error = 'lease expired', lease_owner = NULL, finished_at = ? "
+                "WHERE state = 'leased' AND lease_expires <= ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            )
+            row = conn.execute(
+                f"SELECT {', '.join(JOB_FIELDS)}, attempts FROM jobs "
+                "WHERE (state = 'pending' AND available_at <= ?) OR (state = 'leased' AND lease_expires <= ?) "
+                "ORDER BY available_at, rowid LIMIT 1",
+                (now, now),
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET state = 'leased', attempts = attempts + 1, lease_owner = ?, lease_expires = ? "
+                    "WHERE event_id = ?",
+                    (worker, now + self.lease_seconds, row[0]),
+                )
+            conn.execute("COMMIT")
+        if row is None:
+            return None
+        return dict(zip(JOB_FIELDS, row[:-1]), attempts=row[-1] + 1)
+
+    def complete(self, job, worker):
+        """Mark a claimed job done; return False if the worker's lease was lost, to another worker or to enqueue()."""
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET state = 'done', lease_owner = NULL, lease_expires = NULL, error = NULL, "
+                "finished_at = ? WHERE event_id = ? AND state = 'leased' AND lease_owner = ?",
+                (time.time(), job["event_id"], worker),
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, job, worker, error):
+        """Release a claimed job that failed, for a retry after its delay or as failed after its last attempt.
+
+        Parameters
+        ----------
+        job : Python dictionary
+            The job, as returned by claim().
+        worker : String
+            The worker's id.
+        error : String
+            The error, kept with the job.
+
+        Returns
+        -------
+        String or None
+            The job's new state: pending if it will be retried, failed after its last attempt; None if the worker's
+            lease was lost, to another worker or to a reset by enqueue().
+
+        """
+        now = time.time()
+        retry = job["attempts"] < self.max_attempts
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET state = ?, available_at = ?, lease_owner = NULL, lease_expires = NULL, error = ?, "
+                "finished_at = ? WHERE event_id = ? AND state = 'leased' AND lease_owner = ?",
+                (
+                    "pending" if retry else "failed",
+                    now + self.retry_delay * 2 ** (job["attempts"] - 1),
+                    error,
+                    None if retry else now,
+                    job["event_id"],
+                    worker,
+                ),
+            )
+        if cursor.rowcount != 1:
+            return None
+        return "pending" if retry else "failed"
+
+    def counts(self):
+        """Return the number of jobs in each of STATES."""
+        with closing(self._connect()) as conn:
+            counts = dict(conn.execute("SELECT state, count(*) FROM jobs GROUP BY state").fetchall())
+        return {state: counts.get(state, 0) for state in STATES}
+
+    def failures(self, limit=100):
+        """Return the event id and error of up to limit failed jobs."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT event_id, error FROM jobs WHERE state = 'failed' LIMIT ?", (limit,)).fetchall()
+        return [dict(event_id=event_id, error=error) for event_id, error in rows]
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+Multi-resolution pyramid of the DYFI intensity cells of an event, and its level-of-detail selection.
+
+build_pyramid() groups the 1km cells of dyfi_geo_1km.geojson, as a cell table (see utm_cells.py), into the coarser
+UTM squares of every PYRAMID_LEVELS spacing: a coarse cell's response count is the sum of its cells' counts, and its
+intensity and distance are the response-weighted means of theirs.  Each level is a cell table too, so its polygons are
+only made for the cells being rendered.
+
+lod_level() picks the coarsest level whose cells are at most MAX_CELL_PIXELS wide on a web map at a zoom level, so a
+zoomed-out map gets few large cells and a zoomed-in map the 1km cells, and the number of cells in view stays bounded.
+
+intensity_pyramid.py module contains the following:
+
+    build_pyramid() - returns the cell table of every pyramid level of the 1km DYFI cells.
+    lod_level() - returns the pyramid level to show at a map zoom level.
+"""
+
+import numpy as np
+
+from utm_cells import CellTable, aggregate_cells
+
+PYRAMID_LEVELS = (1, 2, 5, 10, 25)  # cell spacing in km
+MAX_CELL_PIXELS = 16
+TILE_PIXELS = 512  # mapbox-gl world width in pixels at zoom 0
+EARTH_CIRCUMFERENCE_KM = 40075.017
+
+
+def build_pyramid(table, levels=PYRAMID_LEVELS):
+    """Return the cell table of every pyramid level of the 1km DYFI cells.
+
+    Parameters
+    ----------
+    table : Python dictionary
+        The cell table of dyfi_geo_1km.geojson (see utm_cells.encode_cells()).
+    levels : tuple
+        The level spacings in km; a level of the cells' own spacing is the table itself.
+
+    Returns
+    -------
+    Python dictionary
+        Level spacing in km -> the JSON-ready cell table of the level's cells.
+
+    """
+    cells = CellTable(table)
+    pyramid = {}
+    for level in levels:
+        spacing = level * 1000
+        if spacing == cells.spacing:
+            pyramid[level] = table
+        else:
+            pyramid[level] = aggregate_cells(
+                cells.zone, cells.band, cells.easting, cells.northing, cells.cdi, cells.dist, cells.nresp, spacing
+            )
+    return pyramid
+
+
+def lod_level(zoom, lat, levels=PYRAMID_LEVELS, max_cell_pixels=MAX_CELL_PIXELS):
+    """Return the pyramid level to show at a map zoom level.
+
+    Parameters
+    ----------
+    zoom : float
+        The map zoom level.
+    lat : float
+        The latitude of the map center; web mercator maps are stretched by 1/cos(lat).
+    levels : iterable
+        The available level spacings in km.
+    max_cell_pixels : float
+        The largest cell width in pixels that still looks right.
+
+    Returns
+    -------
+    int
+        The coarsest level whose cells are at most max_cell_pixels wide, or the finest level.
+
+    """
+    levels = sorted(int(level) for level in levels)
+    km_pixels = TILE_PIXELS * 2.0**zoom / (EARTH_CIRCUMFERENCE_KM * np.cos(np.radians(lat)))
+    fitting = [level for level in levels if level * km_pixels <= max_cell_pixels]
+    return fitting[-1] if fitting else levels[0]
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+Smoothed intensity surface of the DYFI cells of an event.
+
+The intensity maps show the DYFI cells as separate squares.  interpolate_surface() makes a continuous CDI raster of an
+event instead: the cell centroids go into a scipy cKDTree, in km, and the CDI of every raster pixel is the inverse-
+distance weighted mean of its IDW_NEIGHBORS nearest cells within IDW_RADIUS_KM, weighted by their response counts as
+well.  Pixels with no cell in range are left transparent.  The neighbor query and the weighting are vectorized over
+all the pixels.
+
+The raster rows are evenly spaced in web mercator, not in latitude, so that the image can be stretched over its four
+corners as a mapbox image layer.  surface_image() colors it with the CDI colorscale of the intensity maps and encodes
+it as a PNG data URI; the figure built from it (see figures.intensity_surface_figure()) is stored like any other plot
+artifact, so the surface is computed once per event and resolution.
+
+intensity_surface.py module contains the following:
+
+    cell_centroids() - returns the centroids, CDI and response counts of the cells of a DYFI FeatureCollection.
+    interpolate_surface() - returns the IDW-interpolated CDI raster of some cells and its corner coordinates.
+    surface_image() - returns a CDI raster as a colored PNG data URI.
+"""
+
+import base64
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+from plotly.colors import get_colorscale, unlabel_rgb
+from scipy.spatial import cKDTree
+
+IDW_POWER = 2
+IDW_NEIGHBORS = 8
+IDW_RADIUS_KM = 20
+MIN_DISTANCE_KM = 0.1  # a pixel at a cell centroid weighs the cell as if it were this far
+MAX_PIXELS = 1024  # the longest side of a raster; a larger area gets coarser pixels
+WINDOW_KM = 300  # the raster extends at most this far from the epicenter; farther cells are sparse felt reports
+KM_PER_DEGREE = 111.195  # great circle km per degree of latitude
+COLORSCALE = "Portland"  # the colorscale of the intensity maps' coloraxis
+
+
+def cell_centroids(geojson):
+    """Return the centroids, CDI and response counts of the cells of a DYFI geocoded FeatureCollection.
+
+    Parameters
+    ----------
+    geojson : Python dictionary
+        The dyfi_geo_1km.geojson or dyfi_geo_10km.geojson FeatureCollection.
+
+    Returns
+    -------
+    numpy arrays
+        lon, lat, cdi and nresp of each cell; the centroid is the mean of the cell's polygon corners.
+
+    """
+    features = geojson["features"]
+    lon = np.empty(len(features))
+    lat = np.empty(len(features))
+    for i, feature in enumerate(features):
+        ring = np.asarray(feature["geometry"]["coordinates"][0], dtype="float64")[:, :2]
+        if len(ring) > 1 and np.array_equal(ring[0], ring[-1]):
+            ring = ring[:-1]
+        lon[i], lat[i] = ring.mean(axis=0)
+    cdi = np.array([f["properties"]["cdi"] for f in features], dtype="float64")
+    nresp = np.array([f["properties"]["nresp"] for f in features], dtype="float64")
+    return lon, lat, cdi, nresp
+
+
+def _mercator_y(lat):
+    return np.log(np.tan(np.pi / 4 + np.radians(lat) / 2))
+
+
+def _mercator_lat(y):
+    return np.degrees(2 * np.arctan(np.exp(y)) - np.pi / 2)
+
+
+def interpolate_surface(lon, lat, cdi, nresp, resolution_km, center=None):
+    """Return the IDW-interpolated CDI raster of some cells and its corner coordinates.
+
+    Parameters
+    ----------
+    lon, lat : numpy arrays
+        The cell centroids.
+    cdi : numpy array
+        The CDI of each cell.
+    nresp : numpy array
+        The response count of each cell; a cell of no responses weighs as one.
+    resolution_km : float
+        The pixel size in km at the center of the raster; coarser if the raster would be more than MAX_PIXELS wide or
+        high.
+    center : Python dictionary
+        The epicenter, with the keys lat and lon; if given, the raster extends at most WINDOW_KM from it.
+
+    Returns
+    -------
+    numpy array
+        surface -- The (rows, columns) CDI raster, north row first; NaN where there is no cell within IDW_RADIUS_KM.
+    list
+        coordinates -- The [lon, lat] of the raster's north-west, north-east, south-east and south-west corners.
+
+    """
+    lat0 = (lat.min() + lat.max()) / 2 if center is None else center["lat"]
+    km_per_lon = KM_PER_DEGREE * np.cos(np.radians(lat0))
+    # The raster covers the cells plus the interpolation radius, within the window around the epicenter.
+    west = lon.min() - IDW_RADIUS_KM / km_per_lon
+    east = lon.max() + IDW_RADIUS_KM / km_per_lon
+    south = max(lat.min() - IDW_RADIUS_KM / KM_PER_DEGREE, -85.0)
+    north = min(lat.max() + IDW_RADIUS_KM / KM_PER_DEGREE, 85.0)
+    if center is not None:
+        west = max(west, center["lon"] - WINDOW_KM / km_per_lon)
+        east = min(east, center["lon"] + WINDOW_KM / km_per_lon)
+        south = max(south, center["lat"] - WINDOW_KM / KM_PER_DEGREE)
+        north = min(north, center["lat"] + WINDOW_KM / KM_PER_DEGREE)
+    pixel_km = max(resolution_km, (east - west) * km_per_lon / MAX_PIXELS, (north - south) * KM_PER_DEGREE / MAX_PIXELS)
+    columns = max(1, int(np.ceil((east - west) * km_per_lon / pixel_km)))
+    rows = max(1, int(np.ceil((north - south) * KM_PER_DEGREE / pixel_km)))
+
+    # Pixel centers, evenly spaced in longitude and in web mercator y.
+    y_north, y_south = _mercator_y(north), _mercator_y(south)
+    pixel_lon = west + (np.arange(columns) + 0.5) * (east - west) / columns
+    pixel_lat = _mercator_lat(y_north - (np.arange(rows) + 0.5) * (y_north - y_south) / rows)
+    grid_lon, grid_lat = np.meshgrid(pixel_lon, pixel_lat)
+
+    tree = cKDTree(np.column_stack([lon * km_per_lon, lat * KM_PER_DEGREE]))
+    distance, neighbor = tree.query(
+        np.column_stack([grid_lon.ravel() * km_per_lon, grid_lat.ravel() * KM_PER_DEGREE]),
+        k=min(IDW_NEIGHBORS, len(lon)),
+        distance_upper_bound=IDW_RADIUS_KM,
+    )
+    distance = distance.reshape(len(distance), -1)
+    neighbor = neighbor.reshape(len(neighbor), -1)
+    found = np.isfinite(distance)
+    neighbor = np.where(found, neighbor, 0)
+    weight = np.where(found, np.maximum(nresp, 1)[neighbor] / np.maximum(distance, MIN_DISTANCE_KM) ** IDW_POWER, 0)
+    total = weight.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        surface = (weight * cdi[neighbor]).sum(axis=1) / total
+    surface[total == 0] = np.nan
+
+    coordinates = [[west, north], [east, north], [east, south], [west, south]]
+    return surface.reshape(rows, columns), [[round(float(x), 6), round(float(y), 6)] for x, y in coordinates]
+
+
+def surface_image(surface, cmin, cmax, opacity=0.75):
+    """Return a CDI raster as a colored PNG data URI.
+
+    Parameters
+    ----------
+    surface : numpy array
+        The CDI raster; NaN pixels are transparent.
+    cmin, cmax : float
+        The CDI range of the colorscale.
+    opacity : float
+        The opacity of the colored pixels.
+
+    Returns
+    -------
+    String
+        The "data:image/png;base64,..." URI of the image.
+
+    """
+    stops = get_colorscale(COLORSCALE)
+    positions = np.array([stop[0] for stop in stops])
+    colors = np.array([unlabel_rgb(stop[1]) for stop in stops], dtype="float64")
+    scaled = np.clip((np.nan_to_num(surface, nan=cmin) - cmin) / max(cmax - cmin, 1e-9), 0, 1)
+    rgba = np.empty(surface.shape + (4,), dtype="uint8")
+    for channel in range(3):
+        rgba[..., channel] = np.round(np.interp(scaled, positions, colors[:, channel]))
+    rgba[..., 3] = np.where(np.isnan(surface), 0, round(255 * opacity))
+    buffer = BytesIO()
+    Image.fromarray(rgba, "RGBA").save(buffer, format="PNG", optimize=True)
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
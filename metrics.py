@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+Latency and payload size metrics for the earthquake data app and the usgs_api.py ingest script.
+
+Callbacks and graph-plot functions are wrapped with the instrumented() decorator, which sets the metrics scope and
+records the function's total time.  Inside a scope, phase() blocks record the file-load, parse, figure-build and
+serialization time separately; a phase's time excludes the time of the phases nested inside it.  All timings and
+payload byte sizes are kept as histograms in the module's REGISTRY.
+
+install() hooks the registry into the app's Flask server.  It records the time and response size of every Dash
+callback request and serves the histograms and counters as JSON at /metrics to local clients.  When the
+PROFILE_DIR_ENV environment variable names a directory, a request sent with the X-Profile header is profiled with
+cProfile (or with pyinstrument if the header value is "pyinstrument" and it is installed) and the profile is saved to
+that directory.
+
+A Dash background callback runs in a job process forked from the server, whose copy of the registry ends with the
+job.  begin_job() and end_job() collect the job's metrics in the job process, and merge_job() adds them to the server's
+registry when the job's result is returned (see background.py).
+
+metrics.py module contains the following:
+
+    Histogram - a fixed-bucket histogram.
+    MetricsRegistry - a thread-safe collection of named histograms and counters.
+    JsonFormatter - a logging formatter that writes each record as one line of JSON.
+    phase() - context manager that records the time of a phase in the current scope.
+    instrumented() - decorator that records a function's time and sets the scope of its phases.
+    observe_bytes() - records a payload size in the current scope.
+    install() - adds the request hooks and the /metrics endpoint to a Flask server.
+    begin_job(), end_job(), merge_job() - carry the metrics of a background callback job back to the server process.
+"""
+
+import contextvars
+import copy
+import cProfile
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = tuple(1024 * 4**i for i in range(8))  # 1 KiB to 16 MiB
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_DIR_ENV = "EQ_PROFILE_DIR"
+
+_scope = contextvars.ContextVar("metrics_scope", default="background")
+_child_time = contextvars.ContextVar("metrics_child_time", default=None)
+_job_callbacks = contextvars.ContextVar("metrics_job_callbacks", default=None)
+
+
+class Histogram:
+    """A histogram of observed values with fixed, cumulative upper-bound buckets."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        """Add a value to the histogram."""
+        idx = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                idx = i
+                break
+        self.counts[idx] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        """Add the observations of another histogram with the same buckets."""
+        if other.buckets != self.buckets:
+            raise ValueError("cannot merge histograms with different buckets")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def snapshot(self):
+        """Return the histogram as a dictionary with cumulative bucket counts."""
+        cumulative = []
+        total = 0
+        for count in self.counts:
+            total += count
+            cumulative.append(total)
+        bounds = [str(b) for b in self.buckets] + ["+Inf"]
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "max": self.max,
+            "buckets": dict(zip(bounds, cumulative)),
+        }
+
+
+class MetricsRegistry:
+    """A thread-safe collection of named histograms and counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        # A forked process (a background callback worker) may inherit the lock held by another thread.
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS):
+        """Add a value to the named histogram, creating it with the given buckets if needed."""
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram(buckets)
+            histogram.observe(value)
+
+    def increment(self, name, value=1):
+        """Add a value to the named counter."""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def counter(self, name):
+        """Return the value of the named counter, 0 if it has never been incremented."""
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self):
+        """Return every counter and every histogram as dictionaries, by name."""
+        with self._lock:
+            return {
+                "counters": dict(sorted(self._counters.items())),
+                "histograms": {
+                    name: h.snapshot() for name, h in sorted(self._histograms.items())
+                },
+            }
+
+    def export(self):
+        """Return a copy of every histogram and counter, which can be pickled and added to a registry with merge()."""
+        with self._lock:
+            return {"counters": dict(self._counters), "histograms": copy.deepcopy(self._histograms)}
+
+    def merge(self, exported):
+        """Add the histograms and counters exported from another registry."""
+        with self._lock:
+            for name, value in exported["counters"].items():
+                self._counters[name] = self._counters.get(name, 0) + value
+            for name, other in exported["histograms"].items():
+                histogram = self._histograms.get(name)
+                if histogram is None:
+                    histogram = self._histograms[name] = Histogram(other.buckets)
+                histogram.merge(other)
+
+    def reset(self):
+        """Drop every histogram and counter."""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+class JsonFormatter(logging.Formatter):
+    """Format a log record as one line of JSON.
+
+    The keys of a dictionary passed as extra={"fields": {...}} to the logging call are added to the JSON object.
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+REGISTRY = MetricsRegistry()
+
+
+@contextmanager
+def phase(name):
+    """Record the time spent in a phase of the current scope as <scope>.<name>_seconds.
+
+    The recorded time excludes the time spent in phases nested inside this one.
+    """
+    parent = _child_time.get()
+    children = [0.0]
+    token = _child_time.set(children)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _child_time.reset(token)
+        if parent is not None:
+            parent[0] += elapsed
+        REGISTRY.observe(f"{_scope.get()}.{name}_seconds", elapsed - children[0])
+
+
+def observe_bytes(name, size):
+    """Record a payload size of the current scope as <scope>.<name>_bytes."""
+    REGISTRY.observe(f"{_scope.get()}.{name}_bytes", size, SIZE_BUCKETS)
+
+
+def instrumented(name):
+    """Decorator that records a function's total time as <name>.total_seconds and makes <name> the scope of the
+    phases recorded while it runs.
+
+    The outermost instrumented function of a Flask request is reported as the request's callback.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            outermost = _scope.get() == "background"
+            scope_token = _scope.set(name)
+            child_token = _child_time.set(None)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                _child_time.reset(child_token)
+                _scope.reset(scope_token)
+                REGISTRY.observe(f"{name}.total_seconds", elapsed)
+                if outermost:
+                    _note_callback(name, elapsed)
+
+        return wrapper
+
+    return decorator
+
+
+def _note_callback(name, elapsed):
+    """Remember the outermost instrumented function of the current Flask request, or of a background job."""
+    callbacks = _job_callbacks.get()
+    if callbacks is not None:
+        callbacks.append(name)
+        return
+    try:
+        from flask import g, has_request_context
+    except ImportError:
+        return
+    if has_request_context() and "metrics_callback" not in g:
+        g.metrics_callback = (name, elapsed)
+
+
+def begin_job():
+    """Start collecting the metrics of a background callback job, in its job process.
+
+    The job process inherited a copy of the server's registry; it is emptied so that only the job's own metrics are
+    sent back.
+    """
+    REGISTRY.reset()
+    _job_callbacks.set([])
+
+
+def end_job():
+    """Return the metrics the job recorded since begin_job(), to be passed to merge_job() in the server process."""
+    callbacks = _job_callbacks.get() or []
+    return {"registry": REGISTRY.export(), "callback": callbacks[0] if callbacks else None}
+
+
+def merge_job(state):
+    """Add the metrics of a background callback job to the registry, in the request that returns the job's result.
+
+    The job's outermost instrumented function is reported as the request's callback, so its request.<name>.seconds
+    and serialize_seconds are those of the request that returned the result, not of the job.
+    """
+    REGISTRY.merge(state["registry"])
+    if state["callback"] is not None:
+        _note_callback(state["callback"], 0.0)
+
+
+def _start_profiler(kind):
+    if kind == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            pass
+        else:
+            profiler = Profiler()
+            profiler.start()
+            return "pyinstrument", profiler
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return "cprofile", profiler
+
+
+def _save_profile(kind, profiler, profile_dir, label):
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    if kind == "pyinstrument":
+        profiler.stop()
+        filename = Path(profile_dir) / f"{stamp}-{label}.html"
+        filename.write_text(profiler.output_html(), encoding="utf-8")
+    else:
+        profiler.disable()
+        filename = Path(profile_dir) / f"{stamp}-{label}.prof"
+        profiler.dump_stats(filename)
+    return filename
+
+
+def install(server, registry=REGISTRY):
+    """Add the metrics request hooks and the /metrics endpoint to a Flask server.
+
+    Parameters
+    ----------
+    server : flask.Flask
+        The Dash app's Flask server.
+    registry : MetricsRegistry
+        The registry the request metrics are recorded in and served from.
+
+    """
+    from flask import abort, g, jsonify, request
+
+    @server.before_request
+    def _metrics_start():
+        g.metrics_start = time.perf_counter()
+        profile_dir = os.environ.get(PROFILE_DIR_ENV)
+        if profile_dir and PROFILE_HEADER in request.headers:
+            g.metrics_profiler = _start_profiler(request.headers[PROFILE_HEADER].lower())
+
+    @server.after_request
+    def _metrics_finish(response):
+        if "metrics_start" not in g:
+            return response
+        elapsed = time.perf_counter() - g.metrics_start
+        callback = g.get("metrics_callback")
+        if request.path.endswith("/_dash-update-component") and callback is not None:
+            name, callback_time = callback
+            registry.observe(f"request.{name}.seconds", elapsed)
+            # What is left after the callback itself is mostly Dash serializing the callback outputs.
+            registry.observe(f"{name}.serialize_seconds", max(elapsed - callback_time, 0.0))
+            if not response.direct_passthrough:
+                registry.observe(
+                    f"request.{name}.response_bytes", len(response.get_data()), SIZE_BUCKETS
+                )
+        if "metrics_profiler" in g:
+            kind, profiler = g.metrics_profiler
+            label = callback[0] if callback else request.path.strip("/").replace("/", "_") or "index"
+            filename = _save_profile(kind, profiler, os.environ[PROFILE_DIR_ENV], label)
+            response.headers["X-Profile-File"] = str(filename)
+        return response
+
+    @server.route("/metrics")
+    def _metrics_endpoint():
+        if request.remote_addr not in ("127.0.0.1", "::1"):
+            abort(403)
+        return jsonify(registry.snapshot())
+
+    return server
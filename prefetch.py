@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+Background prefetch of the graph-plots a user is likely to look at next.
+
+When an event is selected on the map only the chosen plot type is rendered.  The PlotPrefetcher warms an in-memory
+cache with the other plot types of the selected event and with the plots of its temporal and spatial neighbors, using
+a small pool of worker threads.  The work queue is bounded, and selecting a different event cancels every queued job
+of the previous selection.
+
+When the graph-plots are rendered by Dash background callbacks, each render runs in a job process forked from the
+server, which inherits a copy of the cache that ends with the job.  begin_job() and end_job() collect the plots a job
+added to its copy, and merge_job() adds them to the server's cache, which the jobs forked later inherit (see
+background.py).
+
+prefetch.py module contains the following:
+
+    PlotPrefetcher - a worker pool and LRU cache of prefetched plots.
+    neighbor_events() - returns the ids of an event's temporal and spatial neighbors.
+"""
+
+import os
+import queue
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def neighbor_events(events_df, evnt_id, n_time=2, n_space=3):
+    """neighbor_events() Find the events nearest in time and in space to an event.
+
+    Parameters
+    ----------
+    events_df : pandas dataframe
+        The events, with id, time, Lat, Lon and Felt columns.  Events without DYFI responses are never returned.
+    evnt_id : String
+        The id of the event to find the neighbors of.
+    n_time : int
+        The number of events before and after the event in time.
+    n_space : int
+        The number of nearest events by epicenter distance.
+
+    Returns
+    -------
+    neighbors : list
+        The neighbor event ids, temporal neighbors first, nearest first, without duplicates.
+    """
+    felt_df = events_df[(events_df.Felt > 0) | (events_df.id == evnt_id)]
+    felt_df = felt_df.sort_values("time", kind="stable").reset_index(drop=True)
+    matches = np.flatnonzero(felt_df.id.to_numpy() == evnt_id)
+    if len(matches) == 0:
+        return []
+    pos = matches[0]
+
+    neighbors = []
+    for offset in range(1, n_time + 1):
+        for idx in (pos - offset, pos + offset):
+            if 0 <= idx < len(felt_df):
+                neighbors.append(felt_df.id.iat[idx])
+
+    # Equirectangular distance is plenty to rank epicenters a few hundred km apart.
+    lat = felt_df.Lat.to_numpy()
+    lon = felt_df.Lon.to_numpy()
+    dx = (lon - lon[pos]) * np.cos(np.radians(lat[pos]))
+    dy = lat - lat[pos]
+    for idx in np.argsort(dx * dx + dy * dy, kind="stable")[1 : n_space + 1]:
+        neighbors.append(felt_df.id.iat[idx])
+
+    return list(dict.fromkeys(n for n in neighbors if n != evnt_id))
+
+
+class PlotPrefetcher:
+    """A pool of worker threads that builds plots ahead of time into an LRU cache.
+
+    Parameters
+    ----------
+    build_fn : callable
+        build_fn(evnt_id, artifact, epicenter) returns the plot to cache.
+    max_workers : int
+        The number of worker threads.
+    max_queue : int
+        The maximum number of queued jobs; jobs scheduled beyond it are dropped.
+    cache_size : int
+        The maximum number of cached plots.
+    """
+
+    def __init__(self, build_fn, max_workers=2, max_queue=32, cache_size=32):
+        self._build_fn = build_fn
+        self._jobs = queue.Queue(maxsize=max_queue)
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._job_keys = None
+        self._workers = [
+            threading.Thread(target=self._work, name=f"plot-prefetch-{i}", daemon=True)
+            for i in range(max_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+        # A forked process (a background callback worker) inherits the cache but not the worker threads, and may
+        # inherit a lock one of them was holding.
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._jobs = queue.Queue(maxsize=self._jobs.maxsize)
+
+    def get(self, evnt_id, artifact):
+        """Return a cached plot, or None if it has not been prefetched."""
+        with self._lock:
+            plot = self._cache.get((evnt_id, artifact))
+            if plot is not None:
+                self._cache.move_to_end((evnt_id, artifact))
+            return plot
+
+    def put(self, evnt_id, artifact, plot):
+        """Add a plot to the cache, evicting the least recently used plot if the cache is full."""
+        with self._lock:
+            self._cache[(evnt_id, artifact)] = plot
+            self._cache.move_to_end((evnt_id, artifact))
+            if self._job_keys is not None:
+                self._job_keys.append((evnt_id, artifact))
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+    def invalidate(self, evnt_id, artifact=None):
+        """Drop every cached plot of an event, or only its plot of one artifact."""
+        with self._lock:
+            for key in [key for key in self._cache if key[0] == evnt_id and artifact in (None, key[1])]:
+                del self._cache[key]
+
+    def cached(self):
+        """Return the (evnt_id, artifact) keys of the cached plots."""
+        with self._lock:
+            return list(self._cache)
+
+    def begin_job(self):
+        """Start recording the plots added to the cache, in a background callback job process."""
+        with self._lock:
+            self._job_keys = []
+
+    def end_job(self):
+        """Return the (evnt_id, artifact, plot) of the plots added since begin_job() that are still cached."""
+        with self._lock:
+            keys = dict.fromkeys(key for key in self._job_keys if key in self._cache)
+            return [(evnt_id, artifact, self._cache[(evnt_id, artifact)]) for evnt_id, artifact in keys]
+
+    def merge_job(self, plots):
+        """Add the plots returned by end_job() in a background callback job process to the cache."""
+        for evnt_id, artifact, plot in plots:
+            self.put(evnt_id, artifact, plot)
+
+    def schedule(self, jobs):
+        """Replace the queued jobs with a new list of jobs.
+
+        Jobs queued by an earlier call are cancelled; a job that is already being built runs to completion and its
+        plot is still cached.
+
+        Parameters
+        ----------
+        jobs : list of tuple
+            (evnt_id, artifact, epicenter) jobs in priority order.
+        """
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+        while True:
+            try:
+                self._jobs.get_nowait()
+                self._jobs.task_done()
+            except queue.Empty:
+                break
+        for evnt_id, artifact, epicenter in jobs:
+            if self.get(evnt_id, artifact) is not None:
+                continue
+            try:
+                self._jobs.put_nowait((generation, evnt_id, artifact, epicenter))
+            except queue.Full:
+                break
+
+    def _work(self):
+        while True:
+            generation, evnt_id, artifact, epicenter = self._jobs.get()
+            try:
+                if generation == self._generation and self.get(evnt_id, artifact) is None:
+                    self.put(evnt_id, artifact, self._build_fn(evnt_id, artifact, epicenter))
+            except Exception:  # pylint: disable='broad-exception-caught'
+                # A plot that cannot be prefetched is built (and its error shown) on request instead.
+                pass
+            finally:
+                self._jobs.task_done()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+Read-through loader of the DYFI product files of the events selected in the earthquake data app.
+
+The graph-plots are built from the DYFI files in data/<event_id>/, which usgs_api.py used to download for every event
+of the catalog.  An event in SC_Earthquake.geojson whose files were never downloaded (e.g. after usgs_api.py --lazy, or
+an interrupted run) made its plots fail with a file-not-found error.  The ProductLoader downloads the missing files of
+a selected event instead, with usgs_api.fetch_event_products(): the same detail, cdi_zip.txt and product requests as a
+usgs_api.py run, written to the same files.  Only the events users look at are downloaded.
+
+Concurrent requests for the same event share one download.  A failed download is remembered for RETRY_AFTER seconds,
+so a user who keeps selecting the event sees the error rather than a new download every time, and then forgotten.
+The USGS host is usgs_api.USGS_HOST, or the one in the USGS_HOST_ENV environment variable (e.g. a
+benchmarks/usgs_replay.py server).
+
+product_loader.py module contains the following:
+
+    ProductLoader - downloads the missing DYFI product files of an event, in the calling thread or in the background.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import usgs_api
+from singleflight import SingleFlight
+
+log = logging.getLogger("product_loader")
+
+USGS_HOST_ENV = "EQ_USGS_HOST"
+DETAIL_QUERY = "/fdsnws/event/1/query?eventid={}&format=geojson"
+LOAD_TIMEOUT = 120
+RETRY_AFTER = 60
+
+
+class ProductLoader:
+    """Downloads the missing DYFI product files of an event.
+
+    Parameters
+    ----------
+    host : String
+        The USGS web service host; the USGS_HOST_ENV environment variable or usgs_api.USGS_HOST if None.
+    registry : metrics.MetricsRegistry
+        If given, the downloads, their errors and the coalesced requests are counted in it.
+    max_workers : int
+        The number of threads of request().
+    retry_after : float
+        The number of seconds a failed download is reported before the event is downloaded again.
+
+    """
+
+    def __init__(self, host=None, registry=None, max_workers=2, retry_after=RETRY_AFTER):
+        self.host = (host or os.environ.get(USGS_HOST_ENV) or usgs_api.USGS_HOST).rstrip("/")
+        self._registry = registry
+        self._flight = SingleFlight(registry, "products")
+        self._max_workers = max_workers
+        self._retry_after = retry_after
+        self._lock = threading.Lock()
+        self._http = None
+        self._executor = None
+        self._pending = set()
+        self._failed = {}
+        # A forked process (a background callback worker) has none of the parent's download threads, may inherit a
+        # lock one of them was holding, and must not share the parent's pooled connections.
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._http = None
+        self._executor = None
+        self._pending = set()
+
+    def _count(self, event):
+        if self._registry is not None:
+            self._registry.increment(f"products.{event}")
+
+    def _recent_failure(self, evnt_id):
+        """Return the error message of a download of the event that failed less than retry_after seconds ago, or None.
+
+        The failures that are older are dropped.  Called with the lock held.
+        """
+        now = time.monotonic()
+        for key in [key for key, (failed_at, _) in self._failed.items() if now - failed_at >= self._retry_after]:
+            del self._failed[key]
+        failed = self._failed.get(evnt_id)
+        return None if failed is None else failed[1]
+
+    def _session(self):
+        with self._lock:
+            if self._http is None:
+                self._http = usgs_api.create_session()
+            return self._http
+
+    def _download(self, evnt_id):
+        started = time.monotonic()
+        missing = usgs_api.fetch_event_products(self._session(), evnt_id, self.host + DETAIL_QUERY.format(evnt_id))
+        if missing:
+            raise OSError(f"could not download {', '.join(missing)}")
+        self._count("downloads")
+        log.info("products downloaded", extra={"fields": dict(event_id=evnt_id,
+                                                              seconds=round(time.monotonic() - started, 3))})
+
+    def load(self, evnt_id):
+        """Download the missing DYFI product files of an event in this thread.
+
+        Parameters
+        ----------
+        evnt_id : String
+            The USGS.gov id string for the earthquake event.
+
+        Returns
+        -------
+        String or None
+            None once the files are stored, or the error message of a failed download.
+
+        """
+        with self._lock:
+            failed = self._recent_failure(evnt_id)
+        if failed is not None:
+            return failed
+        try:
+            self._flight.do(evnt_id, self._download, evnt_id, timeout=LOAD_TIMEOUT)
+        except Exception as exc:  # pylint: disable='broad-exception-caught'
+            self._count("errors")
+            message = str(exc) or type(exc).__name__
+            log.warning("product download failed", extra={"fields": dict(event_id=evnt_id, error=repr(exc))})
+            with self._lock:
+                self._failed[evnt_id] = (time.monotonic(), message)
+            return message
+        with self._lock:
+            self._failed.pop(evnt_id, None)
+        return None
+
+    def request(self, evnt_id):
+        """Start downloading the missing DYFI product files of an event in the background.
+
+        Parameters
+        ----------
+        evnt_id : String
+            The USGS.gov id string for the earthquake event.
+
+        Returns
+        -------
+        String or None
+            The error message of a recent failed download of the event; None while it is being downloaded.
+
+        """
+        with self._lock:
+            failed = self._recent_failure(evnt_id)
+            if failed is not None:
+                return failed
+            if evnt_id not in self._pending:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self._max_workers, thread_name_prefix="product-loader")
+                self._pending.add(evnt_id)
+                self._executor.submit(self._load_pending, evnt_id)
+        return None
+
+    def _load_pending(self, evnt_id):
+        try:
+            self.load(evnt_id)
+        finally:
+            with self._lock:
+                self._pending.discard(evnt_id)
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+Hot reload of the event table in a running earthquake data app.
+
+The event table and its grid index used to be built once, when Earthquakes_v2 was imported, so events downloaded by
+usgs_api.py only appeared after a restart, which also dropped every warm cache.  The EventReloader polls the sizes and
+modification times of the catalog file and its journal from a background thread.  When they change it builds the new
+event table and grid index (or maps the new shared table, see shared_table.py) while the app keeps serving the old
+one, then swaps them in with a single assignment of an immutable EventData.  A callback reads the reloader's data
+once and uses that EventData throughout, so it never sees the table of one version with the grid index of another.
+If the new catalog cannot be read, the old data is kept and the reload is tried again at the next poll.
+
+After a swap, the on_reload callback is called with the old and new EventData and the time of the previous reload, so
+the app can drop just the cached plots whose DYFI files changed since then.
+
+reloader.py module contains the following:
+
+    EventData - an event table, its grid index and its version.
+    load_event_data() - builds (or maps) the EventData of a catalog file.
+    EventReloader - polls a catalog file and swaps in its new EventData when it changes.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from pathlib import Path
+
+from event_grid import build_grid_index
+from event_table import column, read_events
+from shared_table import load_shared_table, source_stamp
+
+log = logging.getLogger("reloader")
+
+RELOAD_INTERVAL_ENV = "EQ_RELOAD_INTERVAL"
+RELOAD_INTERVAL = 60
+
+EventData = namedtuple("EventData", ["events_df", "grid_index", "version"])
+
+
+def load_event_data(event_file, table_dir=None):
+    """Build the event table and grid index of a catalog file, or map its shared table.
+
+    Parameters
+    ----------
+    event_file : Path
+        The catalog GeoJSON file.
+    table_dir : Path
+        The shared table directory (see shared_table.py); None to build the table in this process.
+
+    Returns
+    -------
+    EventData
+        The event table, its grid index and its version; the shared table version, or the catalog's modification
+        time and journal size.
+
+    """
+    if table_dir is not None:
+        return EventData(*load_shared_table(event_file, Path(table_dir)))
+    stamp = source_stamp(event_file)
+    version = f"{stamp['mtime_ns']}.{stamp.get('journal_size', 0)}"
+    events_df = read_events(event_file)
+    grid_index = build_grid_index(column(events_df, "Lon"), column(events_df, "Lat"))
+    return EventData(events_df, grid_index, version)
+
+
+class EventReloader:
+    """Polls a catalog file and swaps in its new EventData when it changes.
+
+    The current EventData is the data attribute; it is replaced, never modified.
+
+    Parameters
+    ----------
+    event_file : Path
+        The catalog GeoJSON file.
+    table_dir : Path
+        The shared table directory; None to build the table in this process.
+    on_reload : callable
+        on_reload(old, new, since) is called after each swap with the old and new EventData and the time.time() of
+        the previous load.
+
+    """
+
+    def __init__(self, event_file, table_dir=None, on_reload=None):
+        self.event_file = Path(event_file)
+        self.table_dir = table_dir
+        self.on_reload = on_reload
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        # The stamp is taken before loading, so a change made while loading is picked up by the next check.
+        self._stamp = source_stamp(self.event_file)
+        self.loaded_at = time.time()
+        self.data = load_event_data(self.event_file, table_dir)
+        # A forked process (a background callback worker) has no poll thread, and may inherit a lock it was holding.
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def check(self):
+        """Reload the event data if the catalog file changed since the last load.
+
+        Returns
+        -------
+        bool
+            True if new event data was swapped in.
+
+        """
+        with self._lock:
+            stamp = source_stamp(self.event_file)
+            if stamp == self._stamp:
+                return False
+            started = time.time()
+            new = load_event_data(self.event_file, self.table_dir)
+            old, since = self.data, self.loaded_at
+            self.data, self._stamp, self.loaded_at = new, stamp, started
+        log.info("event data reloaded", extra={"fields": dict(events=len(new.events_df), version=new.version)})
+        if self.on_reload is not None:
+            self.on_reload(old, new, since)
+        return True
+
+    def _poll(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.check()
+            except Exception as exc:  # pylint: disable='broad-exception-caught'
+                # e.g. a catalog file being rewritten; keep serving the old data and try again.
+                log.warning("event data reload failed", extra={"fields": dict(error=repr(exc))})
+
+    def start(self, interval=RELOAD_INTERVAL):
+        """Start polling the catalog file every interval seconds from a daemon thread."""
+        if self._thread is None and interval > 0:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._poll, args=(interval,), name="event-reloader", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop polling."""
+        self._stop.set()
+        self._thread = None
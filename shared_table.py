@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+Memory-mapped event table shared by the worker processes of the earthquake data app.
+
+Each worker process that imports Earthquakes_v2 (e.g. under gunicorn) reads SC_Earthquake.geojson and builds its own
+event table and grid index.  When the SHARED_TABLE_ENV environment variable names a directory, they are built once
+instead: the first process writes every column of the event table, and the cell keys of every grid level, as .npy
+files into a new version directory, and the other processes map them read-only with numpy.load(mmap_mode="r").  The
+mapped pages live once in the OS page cache however many workers there are.  The dictionary encoded columns are
+mapped as their codes, with their categories in the version's meta.json.  The event ids are the one column each
+process copies into memory, as pandas keeps strings as Python objects.
+
+The CURRENT file names the version directory to map.  A process that finds the catalog file or its journal changed
+since the current version was built (their size or modification time differ) builds a new version, under a lock file
+so that only one process builds it, and then replaces CURRENT with os.replace(), atomically.  Processes keep using the
+version they mapped; the two versions before the current one are kept so that a process that has just read CURRENT
+can still map its version, and older ones are removed (a removed file stays mapped until every process unmaps it).
+
+shared_table.py module contains the following:
+
+    write_table() - writes an event table and grid index as a new version and makes it the current one.
+    open_table() - maps the current version of a shared event table.
+    load_shared_table() - maps the shared event table of a catalog file, building it first if it is out of date.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from event_grid import build_grid_index
+from event_table import column, journal_file, read_events
+from singleflight import file_lock
+
+SHARED_TABLE_ENV = "EQ_SHARED_TABLE_DIR"
+CURRENT_FILE = "CURRENT"
+META_FILE = "meta.json"
+LOCK_FILE = "build.lock"
+KEEP_VERSIONS = 3
+BUILD_TIMEOUT = 300
+
+
+def source_stamp(event_file):
+    """Return the sizes and modification times of a catalog file and its journal, which identify its version."""
+    stat = Path(event_file).stat()
+    stamp = {"file": str(event_file), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    try:
+        journal = journal_file(event_file).stat()
+        stamp.update(journal_size=journal.st_size, journal_mtime_ns=journal.st_mtime_ns)
+    except FileNotFoundError:
+        pass
+    return stamp
+
+
+def _write_atomic(filename, text):
+    fd, tmp_name = tempfile.mkstemp(dir=filename.parent, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as fout:
+        fout.write(text)
+    os.replace(tmp_name, filename)
+
+
+def _prune(table_dir, current):
+    versions = sorted(d for d in table_dir.iterdir() if d.is_dir() and d.name.startswith("v"))
+    for version_dir in versions[:-KEEP_VERSIONS]:
+        if version_dir.name != current:
+            shutil.rmtree(version_dir, ignore_errors=True)
+    for tmp_dir in table_dir.glob("tmp-*"):
+        # An interrupted build; one in progress is younger than the build timeout.
+        if time.time() - tmp_dir.stat().st_mtime > BUILD_TIMEOUT:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def write_table(table_dir, events_df, grid_index, source=None):
+    """Write an event table and its grid index as a new version, and make it the current one.
+
+    Parameters
+    ----------
+    table_dir : Path
+        The shared table directory; created if it does not exist.
+    events_df : pandas dataframe
+        The event table (see event_table.py).
+    grid_index : dict
+        The grid cell keys of every event for each grid level (see event_grid.build_grid_index()).
+    source : Python dictionary
+        The source_stamp() of the catalog file the table was built from.
+
+    Returns
+    -------
+    String
+        version -- The name of the new version directory.
+
+    """
+    table_dir = Path(table_dir)
+    table_dir.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix="tmp-", dir=table_dir))
+    meta = {"rows": len(events_df), "columns": [], "categories": {}, "grid_levels": [], "source": source}
+    for name in events_df.columns:
+        values = events_df[name]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            meta["categories"][name] = values.cat.categories.tolist()
+            values = values.cat.codes.to_numpy()
+        elif values.dtype == object:
+            values = values.to_numpy().astype(str)
+        else:
+            values = values.to_numpy()
+        np.save(tmp_dir / f"{name}.npy", values)
+        meta["columns"].append(name)
+    for level, (cell_size, cell_keys) in enumerate(grid_index.items()):
+        np.save(tmp_dir / f"grid-{level}.npy", cell_keys)
+        meta["grid_levels"].append(cell_size)
+    (tmp_dir / META_FILE).write_text(json.dumps(meta), encoding="utf-8")
+
+    version = f"v{time.time_ns()}-{os.getpid()}"
+    os.chmod(tmp_dir, 0o755)
+    os.replace(tmp_dir, table_dir / version)
+    _write_atomic(table_dir / CURRENT_FILE, version)
+    _prune(table_dir, version)
+    return version
+
+
+def _current_version(table_dir):
+    try:
+        return (Path(table_dir) / CURRENT_FILE).read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _read_meta(table_dir, version):
+    return json.loads((Path(table_dir) / version / META_FILE).read_text(encoding="utf-8"))
+
+
+def open_table(table_dir):
+    """Map the current version of a shared event table.
+
+    Parameters
+    ----------
+    table_dir : Path
+        The shared table directory.
+
+    Returns
+    -------
+    pandas dataframe
+        events_df -- The event table; its columns are read-only views of the mapped files.
+    dict
+        grid_index -- The grid cell keys of every event for each grid level.
+    String
+        version -- The name of the mapped version directory.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the directory has no current version.
+
+    """
+    for _ in range(3):
+        version = _current_version(table_dir)
+        if version is None:
+            raise FileNotFoundError(f"no shared event table in {table_dir}")
+        version_dir = Path(table_dir) / version
+        try:
+            meta = _read_meta(table_dir, version)
+            columns = {}
+            for name in meta["columns"]:
+                values = np.load(version_dir / f"{name}.npy", mmap_mode="r")
+                if name in meta["categories"]:
+                    values = pd.Categorical.from_codes(values, categories=meta["categories"][name])
+                elif values.dtype.kind == "U":
+                    values = values.astype(object)
+                columns[name] = values
+            grid_index = {
+                cell_size: np.load(version_dir / f"grid-{level}.npy", mmap_mode="r")
+                for level, cell_size in enumerate(meta["grid_levels"])
+            }
+        except FileNotFoundError:
+            # The version was removed after CURRENT was read; read CURRENT again.
+            continue
+        return pd.DataFrame(columns, copy=False), grid_index, version
+    raise FileNotFoundError(f"the shared event table in {table_dir} keeps changing")
+
+
+def _is_current(table_dir, source):
+    version = _current_version(table_dir)
+    if version is None:
+        return False
+    try:
+        return _read_meta(table_dir, version)["source"] == source
+    except (FileNotFoundError, ValueError, KeyError):
+        return False
+
+
+def load_shared_table(event_file, table_dir):
+    """Map the shared event table of a catalog file, building it first if it is missing or out of date.
+
+    Parameters
+    ----------
+    event_file : Path
+        The catalog GeoJSON file.
+    table_dir : Path
+        The shared table directory.
+
+    Returns
+    -------
+    pandas dataframe
+        events_df -- The event table; its columns are read-only views of the mapped files.
+    dict
+        grid_index -- The grid cell keys of every event for each grid level.
+    String
+        version -- The name of the mapped version directory.
+
+    """
+    table_dir = Path(table_dir)
+    source = source_stamp(event_file)
+    if not _is_current(table_dir, source):
+        table_dir.mkdir(parents=True, exist_ok=True)
+        with file_lock(table_dir / LOCK_FILE, BUILD_TIMEOUT):
+            # Another process may have built it while this one waited for the lock.
+            if not _is_current(table_dir, source):
+                events_df = read_events(event_file)
+                grid_index = build_grid_index(column(events_df, "Lon"), column(events_df, "Lat"))
+                write_table(table_dir, events_df, grid_index, source)
+    return open_table(table_dir)
+
+
+if __name__ == "__main__":
+    """Build (or refresh) the shared event table of a catalog file."""
+    my_parser = argparse.ArgumentParser(
+        prog="shared_table",
+        description="Build the memory-mapped event table shared by the app's worker processes",
+    )
+    my_parser.add_argument("--events", type=Path, default=Path("data/SC_Earthquake.geojson"), help="Catalog file")
+    my_parser.add_argument(
+        "--dir",
+        type=Path,
+        default=Path(os.environ.get(SHARED_TABLE_ENV, "cache/event_table")),
+        help=f"Shared table directory (default: ${SHARED_TABLE_ENV} or cache/event_table)",
+    )
+    args = my_parser.parse_args()
+    events, _, current = load_shared_table(args.events, args.dir)
+    print(f"{args.dir / current}: {len(events)} events")
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+Single-flight coalescing of concurrent identical requests.
+
+When several users select the same event at once, or a user asks for a plot that a prefetch thread is already
+building, every request would otherwise load the DYFI files and build the same figure.  SingleFlight lets the first
+caller of a key (the leader) run the computation while every later caller of the same key (a follower) waits for the
+leader's result.  A follower waits at most its timeout, and if the computation raises, the leader and every follower
+get the same exception.  Nothing is kept once the computation finishes, so the next call of the key starts a new one.
+
+SingleFlight only coalesces callers in one process.  Graph-plots rendered by Dash background callbacks are built in
+separate worker processes, so file_lock() additionally serializes the build of an artifact across processes, and the
+process that gets the lock second finds the artifact already stored.
+
+singleflight.py module contains the following:
+
+    SingleFlight - coalesces concurrent calls with the same key into one computation.
+    SingleFlightTimeout - raised when a follower's wait for the leader times out.
+    file_lock() - context manager that holds an exclusive lock on a lock file, shared by every process.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+LOCK_POLL_INTERVAL = 0.05
+
+
+class SingleFlightTimeout(TimeoutError):
+    """A follower gave up waiting for the leader computing its key."""
+
+
+class _Call:
+    """An in-flight computation and the result its followers wait for."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one computation.
+
+    Parameters
+    ----------
+    registry : metrics.MetricsRegistry
+        If given, the number of leader and follower calls, timeouts and errors are counted in it.
+    name : String
+        The prefix of the counter names.
+
+    """
+
+    def __init__(self, registry=None, name="singleflight"):
+        self._registry = registry
+        self._name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        # A forked child has none of the parent's leader threads; a follower there would wait on a call that never
+        # finishes.
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def _count(self, event):
+        if self._registry is not None:
+            self._registry.increment(f"{self._name}.{event}")
+
+    def do(self, key, fn, *args, timeout=None, **kwargs):
+        """Return fn(*args, **kwargs), sharing the computation with every concurrent call of the same key.
+
+        Parameters
+        ----------
+        key : hashable
+            The key of the computation, e.g. (event id, artifact).
+        fn : callable
+            The computation; only the leader calls it.
+        timeout : float
+            The maximum number of seconds a follower waits for the leader; None waits for as long as it takes.  The
+            leader's own computation is never interrupted.
+
+        Returns
+        -------
+        The result of the leader's fn() call.
+
+        Raises
+        ------
+        SingleFlightTimeout
+            If this call is a follower and the leader has not finished within the timeout.
+        Exception
+            Whatever the leader's fn() call raised.
+
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if leader:
+            self._count("leaders")
+            try:
+                call.result = fn(*args, **kwargs)
+            except BaseException as exc:
+                call.error = exc
+                self._count("errors")
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+            return call.result
+
+        self._count("followers")
+        if not call.done.wait(timeout):
+            self._count("timeouts")
+            raise SingleFlightTimeout(f"timed out after {timeout}s waiting for {key!r}")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def in_flight(self):
+        """Return the number of computations in progress."""
+        with self._lock:
+            return len(self._calls)
+
+
+@contextmanager
+def file_lock(filename, timeout=None):
+    """Hold an exclusive lock on a lock file, shared by every process on the machine.
+
+    The lock is a POSIX record lock (fcntl.lockf).  Unlike flock() locks, record locks are not inherited by a forked
+    background callback worker, so a fork can never keep a parent's lock alive.  They are held per process, not per
+    thread: threads of one process are coalesced with SingleFlight before they take the lock.  Without fcntl (Windows)
+    nothing is locked.
+
+    Parameters
+    ----------
+    filename : Path
+        The lock file; created if it does not exist.  Its parent directory must exist.
+    timeout : float
+        The maximum number of seconds to wait for the lock; None waits for as long as it takes.
+
+    Raises
+    ------
+    TimeoutError
+        If the lock could not be taken within the timeout.
+
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(filename, "a", encoding="utf-8") as lock_file:
+        if timeout is None:
+            fcntl.lockf(lock_file, fcntl.LOCK_EX)
+        else:
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    fcntl.lockf(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except OSError:
+                    if time.monotonic() >= deadline:
+                        raise TimeoutError(f"timed out after {timeout}s waiting for the lock {filename}") from None
+                    time.sleep(LOCK_POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            fcntl.lockf(lock_file, fcntl.LOCK_UN)
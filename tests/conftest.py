@@ -0,0 +1,46 @@
+"""Shared setup of the tests: run from the repository root, with the app and benchmark modules importable."""
+
+import os
+import shutil
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+# The modules read the bundled data/ tree and .mapbox_token relative to the working directory.
+os.chdir(REPO_DIR)
+sys.path[:0] = [str(REPO_DIR), str(REPO_DIR / "benchmarks")]
+
+
+@pytest.fixture
+def replay(tmp_path):
+    """Serve the bundled catalog with the replay server (benchmarks/usgs_replay.py); return its data directory and url.
+
+    The replay data directory only has the catalog; copy the DYFI products of the events a test needs into it.
+    """
+    from usgs_replay import ReplayConfig, make_server
+
+    replay_dir = tmp_path / "replay"
+    replay_dir.mkdir()
+    shutil.copy(REPO_DIR / "data" / "SC_Earthquake.geojson", replay_dir)
+    server = make_server(ReplayConfig(replay_dir), port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield replay_dir, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch, replay):
+    """Point usgs_api at the replay server, with an empty data directory; return the data directory."""
+    import usgs_api
+
+    out_dir = tmp_path / "data"
+    out_dir.mkdir()
+    monkeypatch.setattr(usgs_api, "DATA_DIR", f"{out_dir}/")
+    monkeypatch.setattr(usgs_api, "USGS_HOST", replay[1])
+    return out_dir
@@ -0,0 +1,88 @@
+"""The metrics and cached plots of Dash background callback jobs reach the server process (background.py)."""
+
+import time
+
+import pytest
+from dash import Dash, Input, Output, html
+
+import metrics
+from background import make_background_manager
+from metrics import instrumented, phase
+from prefetch import PlotPrefetcher
+
+POLL_TIMEOUT = 30
+
+
+@pytest.fixture
+def app(tmp_path):
+    manager = make_background_manager(tmp_path / "background")
+    if manager is None:
+        pytest.skip("diskcache, multiprocess or psutil is not installed")
+    prefetcher = PlotPrefetcher(lambda evnt_id, artifact, epicenter: None, max_workers=0)
+    manager.share(metrics, prefetcher)
+
+    app = Dash(__name__, background_callback_manager=manager)
+    app.layout = html.Div([html.Div(id="event"), html.Div(id="plot")])
+
+    @app.callback(Output("plot", "children"), Input("event", "children"), background=True)
+    @instrumented("render_plot")
+    def render_plot(evnt_id):
+        with phase("build"):
+            plot = {"data": [], "layout": {"title": evnt_id}}
+        prefetcher.put(evnt_id, "dyfi_plot_atten", plot)
+        return evnt_id
+
+    metrics.install(app.server)
+    metrics.REGISTRY.reset()
+    app.prefetcher = prefetcher
+    yield app
+    metrics.REGISTRY.reset()
+
+
+def render(client, evnt_id):
+    body = {
+        "output": "plot.children",
+        "outputs": {"id": "plot", "property": "children"},
+        "inputs": [{"id": "event", "property": "children", "value": evnt_id}],
+        "changedPropIds": ["event.children"],
+    }
+    job = client.post("/_dash-update-component", json=body).get_json()
+    assert "cacheKey" in job, "the callback did not run as a background job"
+    deadline = time.monotonic() + POLL_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(0.1)
+        response = client.post(
+            "/_dash-update-component", query_string={"cacheKey": job["cacheKey"], "job": job["job"]}, json=body
+        )
+        if "response" in response.get_json():
+            return response.get_json()
+    raise TimeoutError(f"background job {job['job']} did not finish")
+
+
+def test_background_render_shows_in_metrics(app):
+    client = app.server.test_client()
+    assert render(client, "se60164643")["response"]["plot"]["children"] == "se60164643"
+
+    snapshot = client.get("/metrics").get_json()
+    histograms = snapshot["histograms"]
+    assert histograms["render_plot.total_seconds"]["count"] == 1
+    assert histograms["render_plot.build_seconds"]["count"] == 1
+    assert histograms["request.render_plot.seconds"]["count"] == 1
+    assert histograms["request.render_plot.response_bytes"]["count"] == 1
+
+
+def test_background_metrics_are_added_once_per_job(app):
+    client = app.server.test_client()
+    render(client, "se60164643")
+    render(client, "se60154248")
+
+    histograms = client.get("/metrics").get_json()["histograms"]
+    assert histograms["render_plot.total_seconds"]["count"] == 2
+    assert histograms["request.render_plot.seconds"]["count"] == 2
+
+
+def test_background_render_fills_the_server_plot_cache(app):
+    client = app.server.test_client()
+    render(client, "se60164643")
+
+    assert app.prefetcher.get("se60164643", "dyfi_plot_atten") == {"data": [], "layout": {"title": "se60164643"}}
@@ -0,0 +1,77 @@
+"""The dyfi urls of the event detail documents and their cache by update time (usgs_api.get_dyfi_urls())."""
+
+import shutil
+
+import pandas as pd
+import pytest
+
+import usgs_api
+
+EVENT_IDS = ("se60164643", "se60154248")
+
+
+@pytest.fixture
+def replay_url(replay):
+    replay_dir, url = replay
+    for evnt_id in EVENT_IDS:
+        shutil.copytree(f"data/{evnt_id}", replay_dir / evnt_id)
+    return url
+
+
+@pytest.fixture
+def http():
+    http = usgs_api.create_session()
+    yield http
+    usgs_api.close_http_session(http)
+
+
+def events(url, updated):
+    return pd.DataFrame({
+        "id": list(EVENT_IDS),
+        "properties.detail": [f"{url}/fdsnws/event/1/query?eventid={evnt_id}&format=geojson" for evnt_id in EVENT_IDS],
+        "properties.updated": pd.array(updated, dtype="Int64"),
+    })
+
+
+def get_dyfi_urls(eq_id_url_df, http):
+    """Return the urls of get_dyfi_urls(), and the number of detail requests and cache hits it made."""
+    before = [usgs_api.RUN_METRICS.counter(name) for name in ("detail.requests", "detail.cache_hits")]
+    urls_df = usgs_api.get_dyfi_urls(eq_id_url_df, http)
+    requests, hits = (usgs_api.RUN_METRICS.counter(name) - count
+                      for name, count in zip(("detail.requests", "detail.cache_hits"), before))
+    return urls_df, requests, hits
+
+
+def cache(data_dir):
+    return usgs_api.read_url_cache(data_dir / usgs_api.URL_CACHE_FILENAME)
+
+
+def test_an_unchanged_update_time_uses_the_cached_urls(replay_url, data_dir, http):
+    first, requests, hits = get_dyfi_urls(events(replay_url, [1, 2]), http)
+    assert (len(first), requests, hits) == (2, 2, 0)
+
+    second, requests, hits = get_dyfi_urls(events(replay_url, [1, 2]), http)
+    assert (requests, hits) == (0, 2)
+    # The fetched events are in the order their requests completed.
+    pd.testing.assert_frame_equal(
+        second.sort_values("e_id", ignore_index=True), first.sort_values("e_id", ignore_index=True)
+    )
+
+
+def test_a_changed_update_time_requests_the_detail_again(replay_url, data_dir, http):
+    get_dyfi_urls(events(replay_url, [1, 2]), http)
+
+    urls_df, requests, hits = get_dyfi_urls(events(replay_url, [1, 3]), http)
+    assert (len(urls_df), requests, hits) == (2, 1, 1)
+    assert {evnt_id: cached["updated"] for evnt_id, cached in cache(data_dir).items()} == {
+        EVENT_IDS[0]: 1, EVENT_IDS[1]: 3
+    }
+
+
+def test_an_event_without_an_update_time_is_always_requested(replay_url, data_dir, http):
+    get_dyfi_urls(events(replay_url, [None, 2]), http)
+    assert set(cache(data_dir)) == {EVENT_IDS[1]}
+
+    urls_df, requests, hits = get_dyfi_urls(events(replay_url, [None, 2]), http)
+    assert (len(urls_df), requests, hits) == (2, 1, 1)
+
@@ -0,0 +1,70 @@
+"""Zoom-dependent aggregation of the map events into grid cells (event_grid.py)."""
+
+import numpy as np
+import pytest
+
+from event_grid import (
+    DETAIL_ZOOM,
+    GRID_LEVELS,
+    MIN_AGGREGATE_EVENTS,
+    aggregate_events,
+    build_grid_index,
+    grid_level_for_zoom,
+)
+from event_table import column, read_events
+
+
+@pytest.fixture(scope="module")
+def events_df():
+    return read_events("data/SC_Earthquake.geojson")
+
+
+def test_small_catalogs_and_close_zooms_show_the_events():
+    assert grid_level_for_zoom(3, MIN_AGGREGATE_EVENTS - 1) is None
+    assert grid_level_for_zoom(DETAIL_ZOOM, MIN_AGGREGATE_EVENTS) is None
+    assert grid_level_for_zoom(DETAIL_ZOOM - 0.01, MIN_AGGREGATE_EVENTS) is not None
+
+
+@pytest.mark.parametrize("zoom, cell_size", [(0, 5.0), (3, 5.0), (4, 5.0), (5, 2.0), (6, 1.0), (7, 0.5), (8, 0.25)])
+def test_a_cell_is_about_cell_pixels_wide(zoom, cell_size):
+    # CELL_PIXELS (40) pixels of 256 pixel tiles: 56.25 degrees at zoom 0, half as many at each zoom level more.
+    assert grid_level_for_zoom(zoom, MIN_AGGREGATE_EVENTS) == cell_size
+
+
+def test_the_cells_get_finer_as_the_map_zooms_in():
+    sizes = [grid_level_for_zoom(zoom, 10_000) for zoom in np.arange(0, DETAIL_ZOOM, 0.25)]
+    assert sizes == sorted(sizes, reverse=True)
+    assert set(sizes) <= set(GRID_LEVELS)
+    assert sizes[0] == GRID_LEVELS[-1]
+
+
+def test_grid_index_keys_identify_the_cells():
+    lons = [-81.01, -81.04, -80.99, -81.01, -81.5]
+    lats = [34.01, 34.04, 34.01, 33.99, 34.5]
+    grid_index = build_grid_index(lons, lats, levels=(0.05, 1.0))
+
+    # The first two points share a cell, the next two are across its east and south edges (-81 and 34 degrees are
+    # the edges of cells of both sizes), and the last one is only in the first one's 1 degree cell.
+    fine, coarse = grid_index[0.05].tolist(), grid_index[1.0].tolist()
+    assert fine[0] == fine[1] and len(set(fine)) == 4
+    assert coarse[0] == coarse[1] == coarse[4] and len(set(coarse)) == 3
+    assert grid_index[0.05].dtype == np.int64
+
+
+def test_aggregate_events_summarizes_each_cell(events_df):
+    keys = build_grid_index(column(events_df, "Lon"), column(events_df, "Lat"))[0.25]
+    lat, lon = column(events_df, "Lat"), column(events_df, "Lon")
+    mag, depth = column(events_df, "Mag"), column(events_df, "Depth")
+
+    cells_df = aggregate_events(events_df, keys)
+    assert len(cells_df) == len(np.unique(keys))
+    assert cells_df.Count.sum() == len(events_df)
+    # The cells are in the order their first event appears.
+    _, first = np.unique(keys, return_index=True)
+    for row, key in zip(cells_df.itertuples(), keys[np.sort(first)]):
+        members = keys == key
+        assert row.Count == members.sum()
+        assert row.Lat == pytest.approx(lat[members].mean())
+        assert row.Lon == pytest.approx(lon[members].mean())
+        assert row.Max_Mag == mag[members].max()
+        assert row.Mean_Depth == pytest.approx(round(depth[members].mean(), 2))
@@ -0,0 +1,113 @@
+"""Encoding and decoding of the compact event table (event_table.py)."""
+
+from datetime import date, time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from event_table import LOCAL_TZ, column, event_filter, events_from_features, read_events, to_geodataframe
+
+EVENT_FILE = "data/SC_Earthquake.geojson"
+
+# Origin times (UTC) around local midnight, the daylight saving time changes, and before the epoch.
+EDGE_TIMES = [
+    "2022-03-13T06:59:59Z",  # 01:59:59 EST, the second before the spring change
+    "2022-03-13T07:00:00Z",  # 03:00:00 EDT
+    "2022-11-06T05:30:00Z",  # 01:30:00 EDT, the first 01:30
+    "2022-11-06T06:30:00Z",  # 01:30:00 EST, the second one
+    "2023-01-01T04:59:59Z",  # 23:59:59 on December 31st
+    "2023-01-01T05:00:00Z",  # midnight
+    "1969-12-31T12:00:00Z",  # 07:00:00 on December 31st, 1969
+]
+
+
+def feature(evnt_id, utc_time, mag=2.3, lon=-80.123456, lat=33.987654, depth=5.25):
+    millis = int(pd.Timestamp(utc_time).value // 1_000_000)
+    return {
+        "type": "Feature",
+        "id": evnt_id,
+        "properties": {
+            "time": millis,
+            "mag": mag,
+            "cdi": None,
+            "felt": None,
+            "place": None,
+            "title": f"M {mag} - {evnt_id}",
+        },
+        "geometry": {"type": "Point", "coordinates": [lon, lat, depth]},
+    }
+
+
+@pytest.fixture(scope="module")
+def events_df():
+    catalog = read_events(EVENT_FILE)
+    edges = events_from_features([feature(f"edge{i}", t) for i, t in enumerate(EDGE_TIMES)])
+    return pd.concat([catalog, edges], ignore_index=True)
+
+
+def local_times(events_df):
+    # Event_Second keeps whole seconds.
+    return pd.to_datetime(events_df["time"], unit="ms", utc=True).dt.floor("s").dt.tz_convert(LOCAL_TZ)
+
+
+def test_dates_and_times_decode_to_the_local_origin_time(events_df):
+    local = local_times(events_df)
+    geo_df = to_geodataframe(events_df)
+
+    assert list(geo_df["Event_Date"]) == list(local.dt.date)
+    assert list(geo_df["Event_Time"]) == list(local.dt.time)
+    assert all(isinstance(d, date) for d in geo_df["Event_Date"])
+    assert all(isinstance(t, time) for t in geo_df["Event_Time"])
+
+
+def test_date_and_time_strings_match_the_geodataframe_columns(events_df):
+    geo_df = to_geodataframe(events_df)
+
+    assert list(column(events_df, "Event_Date")) == [d.isoformat() for d in geo_df["Event_Date"]]
+    assert list(column(events_df, "Event_Time")) == [t.isoformat() for t in geo_df["Event_Time"]]
+
+
+def test_daylight_saving_time_changes_and_midnight(events_df):
+    edges = events_df[events_df["id"].str.startswith("edge")]
+
+    assert list(column(edges, "Event_Date")) == [
+        "2022-03-13",
+        "2022-03-13",
+        "2022-11-06",
+        "2022-11-06",
+        "2022-12-31",
+        "2023-01-01",
+        "1969-12-31",
+    ]
+    assert list(column(edges, "Event_Time")) == [
+        "01:59:59",
+        "03:00:00",
+        "01:30:00",
+        "01:30:00",
+        "23:59:59",
+        "00:00:00",
+        "07:00:00",
+    ]
+
+
+def test_float_columns_decode_at_their_stored_precision():
+    events_df = events_from_features([feature("e1", "2023-06-01T00:00:00Z")])
+    geo_df = to_geodataframe(events_df)
+
+    assert geo_df["Mag"].iat[0] == 2.3
+    assert geo_df["Depth"].iat[0] == 5.25
+    # float32 keeps about a meter of the coordinates, decoded at five decimals.
+    for name, value in (("Lon", -80.123456), ("Lat", 33.987654)):
+        assert geo_df[name].iat[0] == pytest.approx(value, abs=1e-5)
+        assert geo_df[name].iat[0] == round(geo_df[name].iat[0], 5)
+    assert (geo_df.geometry.x.iat[0], geo_df.geometry.y.iat[0]) == (geo_df["Lon"].iat[0], geo_df["Lat"].iat[0])
+    assert geo_df["Place"].iat[0] == "No Location"
+    assert geo_df["Felt"].iat[0] == 0
+
+
+def test_event_filter_uses_local_dates(events_df):
+    mask = event_filter(events_df, date(2022, 12, 31), date(2022, 12, 31), 0, 10)
+
+    assert list(events_df["id"][mask]) == ["edge4"]
+    np.testing.assert_array_equal(mask, local_times(events_df).dt.date == date(2022, 12, 31))
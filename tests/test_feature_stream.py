@@ -0,0 +1,108 @@
+"""Incremental parsing of GeoJSON FeatureCollections (feature_stream.py)."""
+
+import io
+import json
+
+import pytest
+
+from feature_stream import iter_features
+
+COLLECTION = {
+    "type": "FeatureCollection",
+    "metadata": {"count": 3, "title": "Quote \" backslash \\ brace } bracket ] comma , colon :"},
+    "features": [
+        {
+            "type": "Feature",
+            "id": "se1",
+            "properties": {"place": "3 km E of \"Columbia\", SC \\ éè ☃ \U0001f30b", "mag": 2.3},
+            "geometry": {"type": "Point", "coordinates": [-81.03, 34.0, 5.25]},
+        },
+        {
+            "type": "Feature",
+            "id": "se2",
+            "properties": {"place": "{[\\\"]}", "mag": -0.5, "felt": None, "tsunami": 0, "sources": ",us,se,"},
+            "geometry": {"type": "Point", "coordinates": [-80.5, 33.0, 1e-3]},
+        },
+        {
+            "type": "Feature",
+            "id": "se3",
+            "properties": {"place": "\\u0041 is not unescaped here", "mag": 12345678901234567890},
+            "geometry": {"type": "Point", "coordinates": [-80.0, 32.5, 10]},
+        },
+    ],
+    "bbox": [-81.03, 32.5, 1e-3, -80.0, 34.0, 10],
+}
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def encoded(value, **kwargs):
+    return json.dumps(value, **kwargs).encode("utf-8")
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 64, 1 << 16])
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+def test_features_split_across_chunks(size, ensure_ascii):
+    data = encoded(COLLECTION, ensure_ascii=ensure_ascii)
+    members = {}
+
+    features = list(iter_features(chunked(data, size), members))
+    assert features == COLLECTION["features"]
+    assert members == {key: value for key, value in COLLECTION.items() if key != "features"}
+
+
+def test_every_split_point_of_an_escaped_string():
+    data = encoded(COLLECTION, indent=1)
+    for split in range(1, len(data)):
+        assert list(iter_features([data[:split], data[split:]])) == COLLECTION["features"], split
+
+
+def test_a_number_at_the_end_of_a_chunk_is_not_cut():
+    data = b'{"features": [{"id": 1, "mag": 1234.5678}], "count": 123456789}'
+    for split in range(1, len(data)):
+        members = {}
+        assert list(iter_features([data[:split], data[split:]], members)) == [{"id": 1, "mag": 1234.5678}]
+        assert members == {"count": 123456789}
+
+
+def test_empty_collections():
+    assert list(iter_features([b"{}"])) == []
+    members = {}
+    assert list(iter_features([b'{"type": "FeatureCollection", ', b'"features": [  ]}'], members)) == []
+    assert members == {"type": "FeatureCollection"}
+
+
+def test_tee_gets_every_chunk():
+    data = encoded(COLLECTION) + b"\n"
+    tee = io.BytesIO()
+
+    assert len(list(iter_features(chunked(data, 100), tee=tee))) == 3
+    assert tee.getvalue() == data
+
+
+def test_the_features_are_yielded_as_they_arrive():
+    data = encoded(COLLECTION)
+    end_of_first = data.index(b'"se2"')
+    chunks = iter([data[:end_of_first], data[end_of_first:]])
+
+    features = iter_features(chunks)
+    assert next(features)["id"] == "se1"
+    # The second chunk has not been read yet.
+    assert next(chunks, None) is not None
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b'{"features": [{"id": 1}',
+        b'{"features": [{"id": 1}, {"id": 2',
+        b'{"features": [{"id": 1}] "type": "FeatureCollection"}',
+        b'["not", "an", "object"]',
+        b"",
+    ],
+)
+def test_invalid_or_truncated_input(data):
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_features(chunked(data, 4)))
@@ -0,0 +1,58 @@
+"""Storing and loading the prebuilt plot artifacts of an event (figures.py)."""
+
+import os
+import shutil
+
+import pytest
+
+import figures
+
+EVENT_ID = "se60164643"
+ARTIFACT = "intensity_dist"
+EPICENTER = {"lat": 34.0, "lon": -81.0, "place": "Test"}
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    shutil.copytree(f"data/{EVENT_ID}", tmp_path / EVENT_ID, ignore=shutil.ignore_patterns(figures.ARTIFACT_DIR))
+    return tmp_path
+
+
+def saved_plot(data_dir):
+    plot = figures.build_plot(ARTIFACT, EVENT_ID, EPICENTER, data_dir)
+    figures.save_artifact(EVENT_ID, ARTIFACT, plot, data_dir)
+    return figures.load_artifact(EVENT_ID, ARTIFACT, data_dir)
+
+
+def test_a_saved_artifact_is_loaded(data_dir):
+    assert figures.load_artifact(EVENT_ID, ARTIFACT, data_dir) is None
+    plot = saved_plot(data_dir)
+
+    assert plot["layout"]["title"]
+    filename = figures.artifact_path(EVENT_ID, ARTIFACT, data_dir)
+    assert filename.name == f"{ARTIFACT}.v{figures.FIGURE_FORMAT_VERSION}.json"
+
+
+def test_an_artifact_older_than_its_dyfi_files_is_not_loaded(data_dir):
+    saved_plot(data_dir)
+    built = figures.artifact_path(EVENT_ID, ARTIFACT, data_dir).stat().st_mtime
+    source = data_dir / EVENT_ID / figures.source_files(ARTIFACT)[0]
+    os.utime(source, (built + 1, built + 1))
+
+    assert figures.load_artifact(EVENT_ID, ARTIFACT, data_dir) is None
+
+
+def test_an_artifact_of_another_format_version_is_rebuilt(data_dir, monkeypatch):
+    saved_plot(data_dir)
+    old_file = figures.artifact_path(EVENT_ID, ARTIFACT, data_dir)
+    # An artifact saved before the artifacts had a format version.
+    legacy_file = old_file.with_name(f"{ARTIFACT}.json")
+    shutil.copy(old_file, legacy_file)
+
+    monkeypatch.setattr(figures, "FIGURE_FORMAT_VERSION", figures.FIGURE_FORMAT_VERSION + 1)
+    assert figures.load_artifact(EVENT_ID, ARTIFACT, data_dir) is None
+    assert saved_plot(data_dir) is not None
+    # Saving the new version removes the artifact's files of the other versions.
+    assert sorted(p.name for p in old_file.parent.glob(f"{ARTIFACT}*.json")) == [
+        f"{ARTIFACT}.v{figures.FIGURE_FORMAT_VERSION}.json"
+    ]
@@ -0,0 +1,58 @@
+"""The plain dictionary figures are equivalent to the plotly.graph_objects figures they replaced."""
+
+from pathlib import Path
+
+import plotly.graph_objects as go
+import pytest
+
+import figure_equivalence
+import figures
+
+# The smallest, a median and the largest DYFI data sets of the bundled events.  Their reference figures, built with the
+# plotly.graph_objects code of figure_equivalence.REFERENCE_REV, are saved in tests/reference (see figure_equivalence).
+EVENTS = ("se60164643", "se60154248", "se60401376")
+# The plot types whose artifacts are plotly figures; "dyfi_responses" is the data of a table.
+FIGURE_ARTIFACTS = sorted(set(figures.PLOT_TYPES.values()) - {"dyfi_responses"})
+
+
+def _figures(plot):
+    """Return the plotly figures of a plot artifact: each level of a multi-resolution map, or the plot itself."""
+    if "levels" in plot:
+        return [figure_equivalence.expanded(figures.level_figure(plot, level)) for level in plot["levels"]]
+    return [figure_equivalence.expanded(plot)]
+
+
+@pytest.mark.parametrize("artifact", figure_equivalence.REFERENCE_ARTIFACTS)
+@pytest.mark.parametrize("evnt_id", EVENTS)
+def test_plot_matches_graph_objects_figure(evnt_id, artifact):
+    label = f"{evnt_id}/{artifact}"
+    expected = figure_equivalence.load_reference(label)
+    actual = figures.build_plot(artifact, evnt_id, figure_equivalence.epicenter_of(evnt_id))
+    assert figure_equivalence.check(label, expected, actual) == 0
+
+
+@pytest.mark.parametrize("artifact", FIGURE_ARTIFACTS)
+@pytest.mark.parametrize("evnt_id", EVENTS)
+def test_plot_is_accepted_unchanged_by_graph_objects(evnt_id, artifact):
+    plot = figures.build_plot(artifact, evnt_id, figure_equivalence.epicenter_of(evnt_id))
+    for fig in _figures(plot):
+        expected = figure_equivalence._normalized(go.Figure(fig).to_plotly_json())
+        assert figure_equivalence.differences(expected, figure_equivalence._normalized(fig)) == []
+
+
+@pytest.mark.skipif(not Path(".mapbox_token").exists(), reason="the app needs a .mapbox_token file")
+@pytest.mark.parametrize("label", ["event_map/events", "event_map/cells-0.05", "event_map/cells-0.25"])
+def test_event_map_matches_plotly_express_figure(label):
+    app_module = figure_equivalence._app()
+    event_table = figure_equivalence.event_table
+    expected = figure_equivalence.load_reference(label)
+    geo_df, grid_index, _ = app_module.event_reloader.data
+    zoom_level, map_ctr = app_module.determine_zoom_level(
+        event_table.column(geo_df, "Lon"), event_table.column(geo_df, "Lat")
+    )
+    cells_df = None
+    if label != "event_map/events":
+        cell_size = float(label.rsplit("-", 1)[1])
+        cells_df = figure_equivalence.event_grid.aggregate_events(geo_df, grid_index[cell_size])
+    actual = app_module.event_map_figure(geo_df, cells_df, zoom_level, map_ctr)
+    assert figure_equivalence.check(label, expected, actual) == 0
@@ -0,0 +1,157 @@
+"""Leases, retries and requeues of the ingest job queue (ingest_queue.py), and the usgs_api.py workers that run it."""
+
+import shutil
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+import ingest_queue
+import usgs_api
+from ingest_queue import JobQueue
+
+GOOD_ID, BAD_ID = "se60500548", "se60500588"
+
+
+class Clock:
+    """A stand-in for the time module of ingest_queue, whose time only moves when a test advances it."""
+
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ingest_queue, "time", clock)
+    return clock
+
+
+def job(evnt_id="se1", updated=1, detail="https://example.invalid/detail"):
+    return dict(event_id=evnt_id, detail=detail, place="Test", lon=-81.0, lat=34.0, updated=updated)
+
+
+def row(queue, evnt_id="se1"):
+    with closing(sqlite3.connect(queue.path)) as conn:
+        conn.row_factory = sqlite3.Row
+        return dict(conn.execute("SELECT * FROM jobs WHERE event_id = ?", (evnt_id,)).fetchone())
+
+
+def test_a_job_is_claimed_again_once_its_lease_expires(tmp_path, clock):
+    queue = JobQueue(tmp_path / "jobs.db", lease_seconds=60)
+    assert queue.enqueue([job()]) == 1
+
+    first = queue.claim("w1")
+    assert first["event_id"] == "se1" and first["attempts"] == 1
+    assert queue.claim("w2") is None
+    clock.advance(59)
+    assert queue.claim("w2") is None
+    clock.advance(1)
+    second = queue.claim("w2")
+    assert second["attempts"] == 2
+    assert row(queue)["lease_owner"] == "w2"
+
+
+def test_complete_and_fail_report_a_lost_lease(tmp_path, clock):
+    queue = JobQueue(tmp_path / "jobs.db", lease_seconds=60)
+    queue.enqueue([job()])
+    first = queue.claim("w1")
+    clock.advance(60)
+    second = queue.claim("w2")
+
+    assert queue.complete(first, "w1") is False
+    assert queue.fail(first, "w1", "too slow") is None
+    assert row(queue)["state"] == "leased"
+    assert queue.complete(second, "w2") is True
+    assert queue.counts() == {"pending": 0, "leased": 0, "done": 1, "failed": 0}
+
+
+def test_the_retry_delay_doubles_until_the_job_fails(tmp_path, clock):
+    queue = JobQueue(tmp_path / "jobs.db", max_attempts=3, retry_delay=10)
+    queue.enqueue([job()])
+
+    for attempt, delay in ((1, 10), (2, 20)):
+        claimed = queue.claim("w1")
+        assert claimed["attempts"] == attempt
+        assert queue.fail(claimed, "w1", f"error {attempt}") == "pending"
+        assert row(queue)["available_at"] == clock.now + delay
+        clock.advance(delay - 1)
+        assert queue.claim("w1") is None
+        clock.advance(1)
+
+    claimed = queue.claim("w1")
+    assert claimed["attempts"] == 3
+    assert queue.fail(claimed, "w1", "error 3") == "failed"
+    clock.advance(3600)
+    assert queue.claim("w1") is None
+    assert queue.counts()["failed"] == 1
+    assert queue.failures() == [{"event_id": "se1", "error": "error 3"}]
+
+
+def test_an_expired_lease_on_the_last_attempt_fails_the_job(tmp_path, clock):
+    queue = JobQueue(tmp_path / "jobs.db", lease_seconds=60, max_attempts=1)
+    queue.enqueue([job()])
+    queue.claim("w1")
+    clock.advance(60)
+
+    assert queue.claim("w2") is None
+    assert queue.failures() == [{"event_id": "se1", "error": "lease expired"}]
+
+
+def test_enqueue_only_resets_updated_or_failed_jobs(tmp_path, clock):
+    queue = JobQueue(tmp_path / "jobs.db", max_attempts=1)
+    queue.enqueue([job("se1", updated=5), job("se2", updated=5)])
+    queue.complete(queue.claim("w1"), "w1")
+    queue.fail(queue.claim("w1"), "w1", "no DYFI data")
+    assert queue.counts() == {"pending": 0, "leased": 0, "done": 1, "failed": 1}
+
+    # The same or an older update time leaves a done job alone; a failed job is retried.
+    assert queue.enqueue([job("se1", updated=5), job("se1", updated=4)]) == 0
+    assert row(queue, "se1")["state"] == "done"
+    assert queue.enqueue([job("se2", updated=5)]) == 1
+    assert row(queue, "se2")["state"] == "pending" and row(queue, "se2")["attempts"] == 0
+
+    assert queue.enqueue([job("se1", updated=6, detail="https://example.invalid/v2")]) == 1
+    reset = row(queue, "se1")
+    assert (reset["state"], reset["attempts"], reset["updated"], reset["detail"]) == (
+        "pending", 0, 6, "https://example.invalid/v2"
+    )
+    assert queue.enqueue([job("se3")]) == 1
+
+
+def test_an_update_while_a_job_runs_takes_its_lease(tmp_path, clock):
+    queue = JobQueue(tmp_path / "jobs.db")
+    queue.enqueue([job(updated=1)])
+    running = queue.claim("w1")
+
+    assert queue.enqueue([job(updated=2)]) == 1
+    assert queue.complete(running, "w1") is False
+    assert queue.claim("w2")["updated"] == 2
+
+
+def test_run_worker_retries_then_fails_a_bad_event(replay, data_dir):
+    replay_dir, url = replay
+    for evnt_id in (GOOD_ID, BAD_ID):
+        shutil.copytree(f"data/{evnt_id}", replay_dir / evnt_id)
+    # The detail document of BAD_ID lists a DYFI product without its dyfi_plot_numresp.json file.
+    (replay_dir / BAD_ID / "dyfi_plot_numresp.json").unlink()
+    queue = JobQueue(data_dir / "jobs.db", max_attempts=2, retry_delay=0)
+    queue.enqueue([job(evnt_id, detail=f"{url}/fdsnws/event/1/query?eventid={evnt_id}&format=geojson")
+                   for evnt_id in (GOOD_ID, BAD_ID)])
+    counters = ("queue.completed", "queue.retries", "queue.failures", "queue.lost_leases")
+    before = {name: usgs_api.RUN_METRICS.counter(name) for name in counters}
+    http = usgs_api.create_session()
+
+    assert usgs_api.run_worker(http, queue, 1) == 1
+    usgs_api.close_http_session(http)
+    assert queue.counts() == {"pending": 0, "leased": 0, "done": 1, "failed": 1}
+    assert queue.failures()[0]["event_id"] == BAD_ID
+    assert (data_dir / GOOD_ID / "dyfi_plot_numresp.json").exists()
+    after = {name: usgs_api.RUN_METRICS.counter(name) - before[name] for name in counters}
+    assert after == {"queue.completed": 1, "queue.retries": 1, "queue.failures": 1, "queue.lost_leases": 0}
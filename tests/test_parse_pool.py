@@ -0,0 +1,62 @@
+"""The parse stage of usgs_api.py gives the same files in its process pool and in the calling thread."""
+
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pytest
+
+import usgs_api
+from usgs_replay import cdi_zip_txt
+
+EVENT_ID = "se60401376"
+JSON_PRODUCTS = ("dyfi_geo_1km.geojson", "dyfi_geo_10km.geojson", "dyfi_plot_atten.json", "dyfi_plot_numresp.json")
+
+
+@pytest.fixture(scope="module")
+def parse_pool():
+    # Spawned as in usgs_api.main(); the pool processes import usgs_api themselves.
+    with ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("spawn")) as pool:
+        yield pool
+
+
+def downloads():
+    """The files of the bundled event as USGS serves them: (normalize function, content, stored file name)."""
+    event_dir = Path("data") / EVENT_ID
+    files = [(usgs_api.normalize_cdi_zip, cdi_zip_txt(event_dir / "cdi_zip.csv"), "cdi_zip.csv")]
+    files += [(usgs_api.normalize_product, (event_dir / name).read_bytes(), name) for name in JSON_PRODUCTS]
+    return files
+
+
+def store_products(out_dir):
+    out_dir.mkdir()
+    parsed = [usgs_api.submit_parse(usgs_api.store_product, normalize, content, out_dir / name)
+              for normalize, content, name in downloads()]
+    for future in parsed:
+        future.result(timeout=60)
+    return {path.name: path.read_bytes() for path in out_dir.iterdir()}
+
+
+def test_the_pool_and_the_calling_thread_store_the_same_files(tmp_path, monkeypatch, parse_pool):
+    monkeypatch.setattr(usgs_api, "PARSE_POOL", None)
+    inline = store_products(tmp_path / "inline")
+    monkeypatch.setattr(usgs_api, "PARSE_POOL", parse_pool)
+    pooled = store_products(tmp_path / "pool")
+
+    assert sorted(inline) == sorted(["cdi_zip.csv", *JSON_PRODUCTS])
+    assert pooled == inline
+    # The bundled files were stored the same way.
+    assert inline["cdi_zip.csv"] == (Path("data") / EVENT_ID / "cdi_zip.csv").read_bytes()
+    for name in JSON_PRODUCTS:
+        assert json.loads(inline[name]) == json.loads((Path("data") / EVENT_ID / name).read_bytes())
+
+
+@pytest.mark.parametrize("pooled", [False, True])
+def test_a_parse_error_is_raised_by_the_future(tmp_path, monkeypatch, parse_pool, pooled):
+    monkeypatch.setattr(usgs_api, "PARSE_POOL", parse_pool if pooled else None)
+    future = usgs_api.submit_parse(usgs_api.store_product, usgs_api.normalize_product, b"<html>", tmp_path / "x.json")
+
+    with pytest.raises(json.JSONDecodeError):
+        future.result(timeout=60)
+    assert not (tmp_path / "x.json").exists()
@@ -0,0 +1,47 @@
+"""Polling a summary feed with usgs_api.poll_feed(), against the replay server."""
+
+import json
+import shutil
+
+import usgs_api
+from event_table import journal_file
+
+# The all_month feed of the bundled catalog, newest first; se60500593 has no DYFI product files.
+FEED = "all_month"
+NO_DYFI_ID, BAD_ID, GOOD_ID = "se60500593", "se60500588", "se60500548"
+
+
+def journaled_ids(event_file):
+    with open(journal_file(event_file), encoding="utf-8") as fin:
+        return [json.loads(line)["id"] for line in fin]
+
+
+def test_an_event_that_fails_is_left_for_the_next_poll(replay, data_dir):
+    replay_dir, _ = replay
+    for evnt_id in (BAD_ID, GOOD_ID):
+        shutil.copytree(f"data/{evnt_id}", replay_dir / evnt_id)
+    # The detail document of BAD_ID lists a DYFI product without its dyfi_plot_numresp.json file.
+    held_back = data_dir.parent / "dyfi_plot_numresp.json"
+    shutil.move(replay_dir / BAD_ID / "dyfi_plot_numresp.json", held_back)
+    event_file = data_dir / "SC_Earthquake.geojson"
+    http = usgs_api.create_session()
+    validators, stored = {}, {}
+    errors = usgs_api.RUN_METRICS.counter("detail.errors")
+
+    assert usgs_api.poll_feed(http, FEED, validators, stored, event_file) == 2
+    assert journaled_ids(event_file) == [NO_DYFI_ID, GOOD_ID]
+    assert set(stored) == {NO_DYFI_ID, GOOD_ID}
+    assert (data_dir / GOOD_ID / "cdi_zip.csv").exists()
+    assert usgs_api.RUN_METRICS.counter("detail.errors") == errors + 1
+    assert usgs_api.RUN_ERRORS[-1]["event_id"] == BAD_ID
+    # The feed is requested again in full, not answered with 304 Not Modified.
+    assert not validators
+
+    shutil.move(held_back, replay_dir / BAD_ID / "dyfi_plot_numresp.json")
+    assert usgs_api.poll_feed(http, FEED, validators, stored, event_file) == 1
+    assert journaled_ids(event_file) == [NO_DYFI_ID, GOOD_ID, BAD_ID]
+    assert (data_dir / BAD_ID / "dyfi_plot_numresp.json").exists()
+    assert validators["ETag"]
+
+    assert usgs_api.poll_feed(http, FEED, validators, stored, event_file) == 0
+    usgs_api.close_http_session(http)
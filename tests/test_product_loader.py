@@ -0,0 +1,139 @@
+"""Downloads of the DYFI product files of selected events with ProductLoader (product_loader.py)."""
+
+import threading
+import time
+
+import pytest
+
+import product_loader
+import usgs_api
+from metrics import MetricsRegistry
+from product_loader import DETAIL_QUERY, ProductLoader
+
+HOST = "http://usgs.invalid"
+WAIT = 10
+
+
+class Clock:
+    """A stand-in for the time module of product_loader, whose time only moves when a test advances it."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class Products:
+    """A stand-in for usgs_api.fetch_event_products() that records its calls and waits for the test to release it."""
+
+    def __init__(self, missing=()):
+        self.calls = []
+        self.missing = list(missing)
+        self.release = threading.Event()
+        self.release.set()
+        self._lock = threading.Lock()
+
+    def __call__(self, http, eid, detail_url):
+        with self._lock:
+            self.calls.append((eid, detail_url))
+        assert self.release.wait(WAIT)
+        return self.missing
+
+    def count(self, eid):
+        with self._lock:
+            return sum(call[0] == eid for call in self.calls)
+
+
+@pytest.fixture
+def products(monkeypatch):
+    products = Products()
+    monkeypatch.setattr(usgs_api, "fetch_event_products", products)
+    return products
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(product_loader, "time", clock)
+    return clock
+
+
+def wait_until(condition, message):
+    deadline = time.monotonic() + WAIT
+    while not condition():
+        assert time.monotonic() < deadline, message
+        time.sleep(0.01)
+
+
+def test_concurrent_loads_of_an_event_share_one_download(products):
+    registry = MetricsRegistry()
+    loader = ProductLoader(host=HOST, registry=registry)
+    products.release.clear()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(loader.load("se1"))) for _ in range(3)]
+    threads[0].start()
+    wait_until(lambda: products.calls, "the download never started")
+    for thread in threads[1:]:
+        thread.start()
+    wait_until(lambda: registry.counter("products.followers") == 2, "the other loads never waited for the download")
+    products.release.set()
+    for thread in threads:
+        thread.join(WAIT)
+
+    assert results == [None, None, None]
+    assert products.calls == [("se1", HOST + DETAIL_QUERY.format("se1"))]
+    assert registry.counter("products.downloads") == 1
+
+
+def test_a_failed_download_is_reported_until_it_is_retried(products, clock):
+    loader = ProductLoader(host=HOST, retry_after=60)
+    products.missing = ["cdi_zip.csv"]
+
+    assert loader.load("se1") == "could not download cdi_zip.csv"
+    clock.advance(59)
+    assert loader.load("se1") == "could not download cdi_zip.csv"
+    assert loader.request("se1") == "could not download cdi_zip.csv"
+    assert products.count("se1") == 1
+
+    clock.advance(1)
+    products.missing = []
+    assert loader.load("se1") is None
+    assert products.count("se1") == 2
+
+
+def test_expired_failures_are_dropped(products, clock):
+    loader = ProductLoader(host=HOST, retry_after=60)
+    products.missing = ["dyfi_geo_1km.geojson"]
+    for evnt_id in ("se1", "se2"):
+        assert loader.load(evnt_id) is not None
+    assert set(loader._failed) == {"se1", "se2"}
+
+    clock.advance(60)
+    products.missing = []
+    assert loader.load("se3") is None
+    assert not loader._failed
+
+
+def test_request_downloads_a_pending_event_once(products):
+    registry = MetricsRegistry()
+    loader = ProductLoader(host=HOST, registry=registry, max_workers=2)
+    products.release.clear()
+
+    assert loader.request("se1") is None
+    assert loader.request("se2") is None
+    assert loader.request("se1") is None
+    wait_until(lambda: len(products.calls) == 2, "the downloads never started")
+    assert loader.request("se1") is None
+    products.release.set()
+    wait_until(lambda: registry.counter("products.downloads") == 2, "the downloads never finished")
+
+    assert products.count("se1") == products.count("se2") == 1
+    # Once the download is done, the event is no longer pending.
+    wait_until(lambda: not loader._pending, "the downloads were never done")
+    assert loader.request("se1") is None
+    wait_until(lambda: registry.counter("products.downloads") == 3, "the event was not downloaded again")
+    assert products.count("se1") == 2
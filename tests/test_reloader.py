@@ -0,0 +1,95 @@
+"""Hot reload of the event table (reloader.py) and the cached plots it invalidates in the app."""
+
+import json
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+import figures
+from prefetch import PlotPrefetcher
+from reloader import EventReloader, load_event_data
+
+CATALOG = Path("data/SC_Earthquake.geojson")
+EVENT_IDS = ("se60164643", "se60154248")
+
+
+def write_catalog(event_file, features, mtime_ns):
+    """Rewrite a catalog file with some of the bundled events, and give it a modification time."""
+    catalog = json.loads(CATALOG.read_text(encoding="utf-8"))
+    catalog["features"] = features
+    event_file.write_text(json.dumps(catalog), encoding="utf-8")
+    os.utime(event_file, ns=(mtime_ns, mtime_ns))
+
+
+@pytest.fixture
+def features():
+    return json.loads(CATALOG.read_text(encoding="utf-8"))["features"]
+
+
+def test_a_rewritten_catalog_is_swapped_in(tmp_path, features):
+    event_file = tmp_path / "SC_Earthquake.geojson"
+    write_catalog(event_file, features, 1_700_000_000_000_000_000)
+    reloads = []
+    reloader = EventReloader(event_file, on_reload=lambda *args: reloads.append(args))
+    old = reloader.data
+    assert len(old.events_df) == len(features)
+    assert reloader.check() is False
+
+    write_catalog(event_file, features[1:], 1_700_000_001_000_000_000)
+    loaded_at = reloader.loaded_at
+    assert reloader.check() is True
+
+    new = reloader.data
+    assert new is not old and new.version != old.version
+    assert list(new.events_df["id"]) == [f["id"] for f in features[1:]]
+    assert all(len(keys) == len(features) - 1 for keys in new.grid_index.values())
+    assert reloads == [(old, new, loaded_at)]
+    # The old data was replaced, not modified.
+    assert len(old.events_df) == len(features)
+    assert reloader.check() is False
+
+
+def test_an_unreadable_catalog_keeps_the_old_data(tmp_path, features):
+    event_file = tmp_path / "SC_Earthquake.geojson"
+    write_catalog(event_file, features, 1_700_000_000_000_000_000)
+    reloader = EventReloader(event_file)
+    old = reloader.data
+
+    event_file.write_text('{"type": "FeatureCollection", "features": [', encoding="utf-8")
+    with pytest.raises(ValueError):
+        reloader.check()
+    assert reloader.data is old
+
+    write_catalog(event_file, features[:3], 1_700_000_002_000_000_000)
+    assert reloader.check() is True
+    assert len(reloader.data.events_df) == 3
+
+
+@pytest.mark.skipif(not Path(".mapbox_token").exists(), reason="the app needs a .mapbox_token file")
+def test_events_reloaded_drops_only_the_stale_cached_plots(tmp_path, monkeypatch):
+    import Earthquakes_v2  # pylint: disable='import-outside-toplevel'
+
+    data_dir = tmp_path / "data"
+    for evnt_id in EVENT_IDS:
+        shutil.copytree(f"data/{evnt_id}", data_dir / evnt_id, ignore=shutil.ignore_patterns(figures.ARTIFACT_DIR))
+        for source in (data_dir / evnt_id).iterdir():
+            os.utime(source, (1_700_000_000, 1_700_000_000))
+    monkeypatch.setattr(figures, "DATA_DIR", data_dir)
+    prefetcher = PlotPrefetcher(lambda evnt_id, artifact, epicenter: None, max_workers=0)
+    monkeypatch.setattr(Earthquakes_v2, "plot_prefetcher", prefetcher)
+    monkeypatch.setitem(Earthquakes_v2.prefetched_event, "id", EVENT_IDS[0])
+    changed, unchanged = EVENT_IDS
+    for evnt_id, artifact in [(changed, "intensity_1km"), (changed, "intensity_dist"), (unchanged, "intensity_1km"),
+                              ("se00000000", "intensity_1km")]:
+        prefetcher.put(evnt_id, artifact, {"data": [], "layout": {}})
+
+    # The 1km cells of one event were downloaded again after the previous reload.
+    since = 1_700_000_100
+    os.utime(data_dir / changed / "dyfi_geo_1km.geojson", (since + 1, since + 1))
+    data = load_event_data(CATALOG)
+    Earthquakes_v2.events_reloaded(data, data, since)
+
+    assert prefetcher.cached() == [(changed, "intensity_dist"), (unchanged, "intensity_1km")]
+    assert Earthquakes_v2.prefetched_event["id"] is None
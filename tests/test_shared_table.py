@@ -0,0 +1,91 @@
+"""Versions of the memory-mapped shared event table (shared_table.py)."""
+
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from event_table import column, read_events
+from shared_table import CURRENT_FILE, KEEP_VERSIONS, load_shared_table, open_table, write_table
+
+EVENT_FILE = "data/SC_Earthquake.geojson"
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    return read_events(EVENT_FILE)
+
+
+def grid_for(events_df):
+    return {0.5: np.arange(len(events_df), dtype="int64")}
+
+
+def versions(table_dir):
+    return sorted(d.name for d in table_dir.iterdir() if d.is_dir() and d.name.startswith("v"))
+
+
+def test_open_table_maps_the_written_table(tmp_path, catalog):
+    version = write_table(tmp_path, catalog, grid_for(catalog))
+    events_df, grid_index, opened = open_table(tmp_path)
+
+    assert opened == version
+    assert (tmp_path / CURRENT_FILE).read_text(encoding="utf-8") == version
+    pd.testing.assert_frame_equal(events_df, catalog)
+    assert list(column(events_df, "Event_Date")) == list(column(catalog, "Event_Date"))
+    np.testing.assert_array_equal(grid_index[0.5], np.arange(len(catalog)))
+    assert not events_df["Lat"].to_numpy().flags.writeable
+
+
+def test_new_version_replaces_current_and_old_mapping_stays_valid(tmp_path, catalog):
+    first = write_table(tmp_path, catalog, grid_for(catalog))
+    old_df, _, _ = open_table(tmp_path)
+
+    smaller = catalog.iloc[:10].reset_index(drop=True)
+    second = write_table(tmp_path, smaller, grid_for(smaller))
+    new_df, _, opened = open_table(tmp_path)
+
+    assert opened == second != first
+    assert len(new_df) == 10
+    # A process keeps using the version it mapped.
+    pd.testing.assert_frame_equal(old_df, catalog)
+
+
+def test_old_versions_are_pruned(tmp_path, catalog):
+    written = [write_table(tmp_path, catalog, grid_for(catalog)) for _ in range(KEEP_VERSIONS + 2)]
+
+    assert versions(tmp_path) == sorted(written[-KEEP_VERSIONS:])
+    assert open_table(tmp_path)[2] == written[-1]
+
+
+def test_open_table_rereads_current_when_its_version_is_removed(tmp_path, catalog, monkeypatch):
+    first = write_table(tmp_path, catalog, grid_for(catalog))
+    second = write_table(tmp_path, catalog, grid_for(catalog))
+    reads = iter([first, second])
+    monkeypatch.setattr("shared_table._current_version", lambda table_dir: next(reads))
+    shutil.rmtree(tmp_path / first)
+
+    assert open_table(tmp_path)[2] == second
+
+
+def test_open_table_without_a_version(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        open_table(tmp_path)
+
+
+def test_load_shared_table_rebuilds_when_the_catalog_changes(tmp_path):
+    event_file = tmp_path / "SC_Earthquake.geojson"
+    shutil.copy(EVENT_FILE, event_file)
+    table_dir = tmp_path / "table"
+
+    _, _, first = load_shared_table(event_file, table_dir)
+    assert load_shared_table(event_file, table_dir)[2] == first
+
+    stat = event_file.stat()
+    os.utime(event_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    events_df, grid_index, second = load_shared_table(event_file, table_dir)
+
+    assert second != first
+    assert (table_dir / CURRENT_FILE).read_text(encoding="utf-8") == second
+    assert all(len(cell_keys) == len(events_df) for cell_keys in grid_index.values())
@@ -0,0 +1,128 @@
+"""Coalescing of concurrent calls with SingleFlight (singleflight.py)."""
+
+import threading
+import time
+
+import pytest
+
+from metrics import MetricsRegistry
+from singleflight import SingleFlight, SingleFlightTimeout
+
+WAIT = 10
+
+
+def start_leader(flight, key, fn):
+    """Start a leader call of fn in a thread; return the thread and the list its result or error is put in."""
+    outcome = []
+
+    def lead():
+        try:
+            outcome.append(flight.do(key, fn))
+        except Exception as exc:  # pylint: disable='broad-exception-caught'
+            outcome.append(exc)
+
+    thread = threading.Thread(target=lead)
+    thread.start()
+    return thread, outcome
+
+
+def blocking(started, release, result=None, error=None):
+    """Return a computation that signals it started, then waits for release before returning or raising."""
+
+    def compute():
+        started.set()
+        assert release.wait(WAIT)
+        if error is not None:
+            raise error
+        return result
+
+    return compute
+
+
+def wait_for_follower(registry, name="render"):
+    """Wait until a follower call is waiting for the leader."""
+    deadline = time.monotonic() + WAIT
+    while registry.counter(f"{name}.followers") == 0:
+        assert time.monotonic() < deadline, "the follower never waited for the leader"
+        time.sleep(0.01)
+
+
+def test_followers_share_the_leader_result():
+    registry = MetricsRegistry()
+    flight = SingleFlight(registry, "render")
+    started, release = threading.Event(), threading.Event()
+    thread, outcome = start_leader(flight, "plot", blocking(started, release, result={"data": []}))
+    assert started.wait(WAIT)
+
+    follower = threading.Thread(target=lambda: outcome.append(flight.do("plot", pytest.fail)))
+    follower.start()
+    wait_for_follower(registry)
+    release.set()
+    thread.join(WAIT)
+    follower.join(WAIT)
+
+    assert outcome == [{"data": []}, {"data": []}]
+    assert outcome[0] is outcome[1]
+    assert registry.counter("render.leaders") == 1
+    assert registry.counter("render.followers") == 1
+    assert flight.in_flight() == 0
+
+
+def test_leader_error_is_raised_by_every_caller():
+    registry = MetricsRegistry()
+    flight = SingleFlight(registry, "render")
+    started, release = threading.Event(), threading.Event()
+    error = ValueError("no DYFI data")
+    thread, outcome = start_leader(flight, "plot", blocking(started, release, error=error))
+    assert started.wait(WAIT)
+
+    follower_outcome = []
+
+    def follow():
+        try:
+            flight.do("plot", pytest.fail)
+        except ValueError as exc:
+            follower_outcome.append(exc)
+
+    follower = threading.Thread(target=follow)
+    follower.start()
+    wait_for_follower(registry)
+    release.set()
+    thread.join(WAIT)
+    follower.join(WAIT)
+
+    assert outcome == [error]
+    assert follower_outcome == [error]
+    assert registry.counter("render.errors") == 1
+    # The failed computation is not kept; the next call of the key computes again.
+    assert flight.do("plot", lambda: "rebuilt") == "rebuilt"
+
+
+def test_follower_timeout_leaves_the_leader_running():
+    registry = MetricsRegistry()
+    flight = SingleFlight(registry, "render")
+    started, release = threading.Event(), threading.Event()
+    thread, outcome = start_leader(flight, "plot", blocking(started, release, result="plot"))
+    assert started.wait(WAIT)
+
+    with pytest.raises(SingleFlightTimeout):
+        flight.do("plot", pytest.fail, timeout=0.05)
+    assert registry.counter("render.timeouts") == 1
+    assert flight.in_flight() == 1
+
+    release.set()
+    thread.join(WAIT)
+    assert outcome == ["plot"]
+    assert flight.in_flight() == 0
+
+
+def test_different_keys_are_not_coalesced():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    thread, outcome = start_leader(flight, "plot", blocking(started, release, result="plot"))
+    assert started.wait(WAIT)
+
+    assert flight.do("table", lambda: "table") == "table"
+    release.set()
+    thread.join(WAIT)
+    assert outcome == ["plot"]
@@ -0,0 +1,108 @@
+"""Encoding and assignment of the DYFI UTM intensity cells (utm_cells.py)."""
+
+import json
+
+import numpy as np
+import pytest
+import shapely
+
+from utm_cells import BANDS, CellTable, aggregate_cells, cell_ids, encode_cells, utm_coordinates
+
+EVENT_ID = "se60401376"
+
+
+def read_geojson(spacing):
+    with open(f"data/{EVENT_ID}/dyfi_geo_{spacing}.geojson", encoding="utf-8") as fin:
+        return json.load(fin)
+
+
+@pytest.mark.parametrize("spacing", ["1km", "10km"])
+def test_encoded_cells_rebuild_the_usgs_cells(spacing):
+    geojson = read_geojson(spacing)
+    features = geojson["features"]
+    table = encode_cells(geojson)
+    assert table is not None
+    assert json.loads(json.dumps(table)) == table
+
+    values = CellTable(table).values()
+    assert values["locations"] == [f["properties"]["name"] for f in features]
+    assert values["z"] == [f["properties"]["cdi"] for f in features]
+    for cell, feature in zip(values["features"], features):
+        ring = np.asarray(cell["geometry"]["coordinates"][0])[: len(feature["geometry"]["coordinates"][0])]
+        np.testing.assert_allclose(ring, feature["geometry"]["coordinates"][0], atol=2e-5)
+
+
+def test_cells_that_are_not_utm_squares_of_one_spacing_are_not_encoded():
+    geojson = read_geojson("1km")
+    other = read_geojson("10km")
+    assert encode_cells({"features": geojson["features"][:3] + other["features"][:3]}) is None
+
+    renamed = json.loads(json.dumps(geojson))
+    renamed["features"][0]["properties"]["name"] = "Columbia"
+    assert encode_cells(renamed) is None
+    assert encode_cells({"features": []}) is None
+
+
+def test_cell_ids_pack_the_zone_band_and_corner():
+    ids = cell_ids([17, 17, 16], [BANDS.index("S")] * 3, [497000, 498000, 497000], [3773000, 3773000, 3773000], 1000)
+
+    assert len(set(ids.tolist())) == 3
+    table = CellTable({"spacing": 1000, "digits": [4, 4], "ids": ids.tolist(), "cdi": [2.0] * 3, "dist": [10] * 3,
+                       "nresp": [1] * 3, "place": [0] * 3, "places": [""]})
+    assert table.zone.tolist() == [17, 17, 16]
+    assert table.easting.tolist() == [497000, 498000, 497000]
+    assert table.northing.tolist() == [3773000] * 3
+    assert table.names([0])[0] == "UTM:(17S 0497 3773 1000)<br>UTM:(17S 0497 3773 1000)"
+
+
+def test_utm_coordinates_zone_and_band():
+    # Columbia SC, the Georgia coast, and a point south of the equator.
+    zone, band, easting, northing = utm_coordinates([-81.03, -81.5, -81.03], [34.0, 31.0, -10.0])
+
+    assert zone.tolist() == [17, 17, 17]
+    assert [BANDS[b] for b in band] == ["S", "R", "L"]
+    assert easting[0] == pytest.approx(497230, abs=1)
+    assert northing[0] == pytest.approx(3762156, abs=1)
+    assert northing[2] > 8_000_000  # the southern hemisphere's false northing
+
+
+def test_aggregate_cells_assigns_each_point_to_the_square_that_contains_it():
+    rng = np.random.default_rng(0)
+    lon = rng.uniform(-81.2, -80.8, 200)
+    lat = rng.uniform(33.8, 34.2, 200)
+    cdi = rng.uniform(1, 6, 200).round(1)
+    dist = rng.uniform(0, 50, 200).round()
+    weight = rng.integers(0, 5, 200)
+    zone, band, easting, northing = utm_coordinates(lon, lat)
+
+    table = aggregate_cells(zone, band, easting, northing, cdi, dist, weight, 10000)
+    cells = CellTable(table)
+    assert sum(table["nresp"]) == weight.sum()
+    assert table["ids"] == sorted(table["ids"])
+
+    cell_lon, cell_lat = cells.corners()
+    squares = shapely.polygons(np.stack([cell_lon, cell_lat], axis=-1))
+    point_ids = cell_ids(zone, band, easting // 10000 * 10000, northing // 10000 * 10000, 10000)
+    for i in range(len(lon)):
+        cell = table["ids"].index(int(point_ids[i]))
+        # The corners are truncated to 5 decimals, about a meter.
+        assert shapely.buffer(squares[cell], 1e-4).contains(shapely.Point(lon[i], lat[i]))
+
+    members = point_ids == table["ids"][0]
+    mean_weight = np.maximum(weight[members], 1)
+    assert table["nresp"][0] == weight[members].sum()
+    assert table["cdi"][0] == pytest.approx(np.round((cdi[members] * mean_weight).sum() / mean_weight.sum(), 1))
+
+
+def test_aggregating_cells_into_larger_squares_keeps_the_responses():
+    table = encode_cells(read_geojson("1km"))
+    cells = CellTable(table)
+
+    larger = aggregate_cells(
+        cells.zone, cells.band, cells.easting, cells.northing, cells.cdi, cells.dist, cells.nresp, 10000
+    )
+    assert sum(larger["nresp"]) == sum(table["nresp"])
+    assert len(larger["ids"]) < len(table["ids"])
+    # Every 1km cell lies in the 10km square of its south-west corner.
+    ids = cell_ids(cells.zone, cells.band, cells.easting // 10000 * 10000, cells.northing // 10000 * 10000, 10000)
+    assert set(ids.tolist()) == set(larger["ids"])
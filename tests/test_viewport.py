@@ -0,0 +1,158 @@
+"""Viewport culling of the intensity choropleth maps (viewport.py)."""
+
+import copy
+import json
+
+import numpy as np
+import pytest
+
+from figures import intensity_plot_figure
+from viewport import VIEWPORT_PIXELS, CellIndex, CellIndexCache, cull_figure, viewport_bounds
+
+EVENT_ID = "se60401376"  # the bundled event with the most 1km cells
+EPICENTER = {"lat": 35.9, "lon": -84.1, "place": "Test"}
+
+
+@pytest.fixture(scope="module")
+def geojson():
+    with open(f"data/{EVENT_ID}/dyfi_geo_1km.geojson", encoding="utf-8") as fin:
+        return json.load(fin)
+
+
+@pytest.fixture(scope="module")
+def geojson_trace(geojson):
+    features = geojson["features"]
+    return {
+        "type": "choroplethmapbox",
+        "geojson": geojson,
+        "locations": [f["properties"]["name"] for f in features],
+        "z": [f["properties"]["cdi"] for f in features],
+        "customdata": [[f["properties"]["dist"], f["properties"]["nresp"]] for f in features],
+    }
+
+
+@pytest.fixture(scope="module")
+def cell_table_figure():
+    fig = intensity_plot_figure(EVENT_ID, EPICENTER, "1km")
+    assert "utm_cells" in fig["data"][0]
+    return fig
+
+
+def feature_bounds(features):
+    bounds = []
+    for feature in features:
+        ring = np.asarray(feature["geometry"]["coordinates"][0], dtype="float64")
+        bounds.append((*ring.min(axis=0), *ring.max(axis=0)))
+    return np.array(bounds)
+
+
+def intersecting(bounds, box):
+    """The indices of the (n, 4) bounds that intersect box, found one by one."""
+    minx, miny, maxx, maxy = box
+    return np.flatnonzero(
+        (bounds[:, 0] <= maxx) & (bounds[:, 2] >= minx) & (bounds[:, 1] <= maxy) & (bounds[:, 3] >= miny)
+    )
+
+
+def central_box(bounds, fraction=0.2):
+    """A box around the middle of the cells, a fraction of their extent wide and high."""
+    lo, hi = bounds[:, :2].min(axis=0), bounds[:, 2:].max(axis=0)
+    mid, half = (lo + hi) / 2, (hi - lo) * fraction / 2
+    return (*(mid - half), *(mid + half))
+
+
+def test_viewport_bounds_of_a_center_and_zoom():
+    center = {"lat": 35.0, "lon": -80.0}
+    minx, miny, maxx, maxy = viewport_bounds(center=center, zoom=6, margin=0)
+
+    assert (minx + maxx) / 2 == pytest.approx(center["lon"])
+    assert (miny + maxy) / 2 == pytest.approx(center["lat"])
+    assert maxx - minx == pytest.approx(VIEWPORT_PIXELS[0] * 360 / (512 * 2**6))
+    # A zoom level more shows half the area; the margin adds a fraction of the size on each side.
+    narrower = viewport_bounds(center=center, zoom=7, margin=0)
+    assert narrower[2] - narrower[0] == pytest.approx((maxx - minx) / 2)
+    wider = viewport_bounds(center=center, zoom=6, margin=0.5)
+    assert wider[2] - wider[0] == pytest.approx(2 * (maxx - minx))
+
+
+def test_viewport_bounds_of_relayout_data():
+    corners = [[-81.0, 36.0], [-79.0, 36.0], [-79.0, 34.0], [-81.0, 34.0]]
+    relayout = {"mapbox.center": {"lat": 0, "lon": 0}, "mapbox.zoom": 1, "mapbox._derived": {"coordinates": corners}}
+
+    assert viewport_bounds(relayout, margin=0) == (-81.0, 34.0, -79.0, 36.0)
+    assert viewport_bounds(relayout, margin=0.25) == (-81.5, 33.5, -78.5, 36.5)
+    zoomed = viewport_bounds({"mapbox.center": {"lat": 35.0, "lon": -80.0}, "mapbox.zoom": 6}, margin=0)
+    assert zoomed == viewport_bounds(center={"lat": 35.0, "lon": -80.0}, zoom=6, margin=0)
+    assert viewport_bounds({"autosize": True}) is None
+
+
+def test_query_returns_the_cells_in_the_bounds(geojson, geojson_trace):
+    bounds = feature_bounds(geojson["features"])
+    index = CellIndex(geojson_trace)
+    box = central_box(bounds)
+
+    cells = index.query(box)
+    assert index.n_cells == len(geojson["features"])
+    assert 0 < len(cells) < index.n_cells
+    np.testing.assert_array_equal(cells, intersecting(bounds, box))
+    assert len(index.query((0.0, 0.0, 1.0, 1.0))) == 0
+
+
+def test_query_of_a_cell_table_matches_its_polygons(cell_table_figure):
+    index = CellIndex(cell_table_figure["data"][0])
+    features = index.values(np.arange(index.n_cells))["features"]
+    bounds = feature_bounds(features)
+    box = central_box(bounds)
+
+    cells = index.query(box)
+    assert 0 < len(cells) < index.n_cells
+    np.testing.assert_array_equal(cells, intersecting(bounds, box))
+
+
+def test_query_new_leaves_out_the_cells_already_sent(geojson, geojson_trace):
+    bounds = feature_bounds(geojson["features"])
+    index = CellIndex(geojson_trace)
+    first = central_box(bounds, 0.2)
+    second = central_box(bounds, 0.4)
+
+    new = index.query_new(second, [first])
+    np.testing.assert_array_equal(new, np.setdiff1d(index.query(second), index.query(first)))
+    assert len(np.intersect1d(new, index.query(first))) == 0
+    np.testing.assert_array_equal(index.query_new(second, []), index.query(second))
+
+
+def test_cull_figure_keeps_only_the_cells_and_leaves_the_figure_alone(geojson, geojson_trace):
+    fig = {"data": [geojson_trace, {"type": "scattermapbox"}], "layout": {"mapbox": {"zoom": 7}}}
+    original = copy.deepcopy(fig)
+    index = CellIndex(geojson_trace)
+    cells = index.query(central_box(feature_bounds(geojson["features"])))
+
+    culled = cull_figure(fig, index, cells, uirevision="se-1km")
+    trace = culled["data"][0]
+    assert trace["geojson"]["features"] == [geojson["features"][i] for i in cells]
+    assert trace["locations"] == [geojson_trace["locations"][i] for i in cells]
+    assert trace["z"] == [geojson_trace["z"][i] for i in cells]
+    assert trace["customdata"] == [geojson_trace["customdata"][i] for i in cells]
+    assert culled["data"][1] == fig["data"][1]
+    assert culled["layout"]["uirevision"] == "se-1km"
+    assert fig == original
+
+
+def test_cull_figure_makes_the_features_of_a_cell_table(cell_table_figure):
+    index = CellIndex(cell_table_figure["data"][0])
+    cells = np.array([0, 5, 9])
+
+    trace = cull_figure(cell_table_figure, index, cells)["data"][0]
+    assert "utm_cells" not in trace
+    assert len(trace["geojson"]["features"]) == len(trace["locations"]) == len(trace["z"]) == 3
+    assert "utm_cells" in cell_table_figure["data"][0]
+
+
+def test_cell_index_cache_rebuilds_for_a_new_trace(geojson_trace):
+    cache = CellIndexCache(size=1)
+    index = cache.get("plot", geojson_trace)
+
+    assert cache.get("plot", geojson_trace) is index
+    assert cache.get("plot", dict(geojson_trace)) is not index
+    cache.get("other", geojson_trace)
+    assert cache.get("plot", geojson_trace) is not index
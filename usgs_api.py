@@ -5,37 +5,140 @@
 Python script that uses the USGS.gov API to retrieve the SC earthquake swarm data.
 
 Part one of this script, get_eq_events(), retrieves earthquake events and their data.
-Part two, get_dyfi_urls(), uses the event detail urls to retrieve each event's DYFI, (cdi_zip.txt file) url.
+Part two, get_dyfi_urls(), uses the event detail urls to retrieve each event's DYFI, (cdi_zip.txt file) url.  The
+            urls are cached in data/dyfi_urls.json with each event's update time, so the detail document of an event
+            that has not changed since the last run is not requested again.
 Part three, get_dyfi_zip_data(), retrieves the cdi_zip.txt file data for each event and saves it as a .csv file,
             cdi_zip.event_id.
+Part four, build_figure_artifacts(), renders each downloaded event's graph-plots and stores them as ready-to-serve JSON
+            in the event's figures directory.
 if the -f cli argument is given, then the earthquake events retrieved in step one are saved to a geojson file for use in
 the data app.
 
+Each HTTP request's latency, queue wait, bytes downloaded, retries and status code, and each part's duration and
+throughput, are logged as one line of JSON per record to stderr.  When the run finishes, a machine-readable run summary
+is written to data/runs/ (or the file given with --summary) so ingest runs can be compared with each other.
+
+Concurrent requests for the same file of the same event, e.g. an event listed twice in a response, are coalesced into
+one HTTP request by fetch_event_file(); the waiting requests are counted as fetch.followers in the run summary.
+
+With --watch SECONDS the script runs as a daemon instead: every SECONDS it polls a USGS real-time summary feed
+(--feed, all_hour by default) with a conditional request, so an unchanged feed costs a 304 Not Modified.  The feed
+events in the region and magnitude range of get_eq_events() that have DYFI data and are new, or were updated since
+they were stored, go through parts two to four, and are then appended to the catalog's journal
+(data/SC_Earthquake.journal, see event_table.py) rather than rewriting SC_Earthquake.geojson.  The journal is merged
+into SC_Earthquake.geojson when it holds JOURNAL_COMPACT_EVENTS events.  The daemon keeps only the id and update time
+of each stored event between polls.  A full -f run replaces both files.
+
+With --lazy only the events are retrieved (part one, or the feed polls of --watch); the data app downloads the DYFI
+product files of an event when it is first selected, with fetch_event_products() (see product_loader.py).  Product
+files are written to a temporary file and renamed, so the app never reads a partially written file.
+
+A backfill can be spread over several processes or hosts: with --enqueue, only the events are retrieved (part one)
+and a job per event is added to a durable job queue, data/ingest_queue.sqlite (see ingest_queue.py).  Every
+usgs_api.py --worker process sharing the data directory then claims jobs, with a lease, and runs parts two to four for
+their events, until no job is left; a failed job is retried.  Enqueuing again only requeues the events that were
+updated.
+
+The downloaded product files are parsed, converted to the files the data app reads and saved in a separate stage, a
+pool of --parse-workers processes (one per CPU by default): the downloading threads only hand the bytes of each file
+to the pool, so the CPU-bound parsing does not compete with the network I/O for the GIL, and each scales on its own.
+
 usgs_api.py script contains the following functions:
 
+    fetch_event_file() - GETs an event's file, sharing the request with concurrent requests for the same file.
+    counted_chunks() - yields the chunks of a streamed response body, counting their bytes.
     get_eq_events() - returns a pandas dataframe containing event ids and event detail urls.
+    write_events_file() - Saves the catalog GeoJSON file atomically.
+    write_file_atomic() - Saves a text file atomically.
+    open_file_atomic() - Opens a temporary file that replaces a file when it is closed.
     get_dyfi_urls() - returns a pandas dataframe containing the event ids and the dyfi urls.
+    read_url_cache() - returns the cached dyfi urls of the events, with their update times.
+    dyfi_urls() - returns the dyfi urls of an event detail document.
+    fetch_event_products() - Retrieves the DYFI product files of one event that are not saved yet.
     get_dyfi_zip_data() - Retrieves the cdi_zip.txt file data for each event and saves to file.
+    normalize_cdi_zip() - returns the cdi_zip.csv text of a downloaded cdi_zip.txt file.
+    normalize_product() - returns the stored JSON text of a downloaded DYFI product file.
+    store_product() - Converts a downloaded product file and saves it; the work of the parse stage.
+    submit_parse() - Runs a function in the parse stage's process pool.
+    build_figure_artifacts() - Builds and saves the graph-plot figure artifacts of each downloaded event.
+    enqueue_events() - Adds a job for each event to the ingest job queue.
+    run_event_job() - Downloads the DYFI product files of one queued event and builds its figure artifacts.
+    run_worker() - Claims and runs ingest jobs until the queue is finished.
+    in_region() - returns True if a feed event is a DYFI event in the region of get_eq_events().
+    poll_feed() - polls a summary feed once and stores its new and updated events.
+    compact_journal() - merges the catalog journal into the catalog file.
+    watch() - polls a summary feed until interrupted.
+    write_run_summary() - Saves the run's metrics to a JSON file.
 """
 
 __version__ = "1.0.0"
 
+from array import array
+from contextlib import ExitStack, contextmanager
 from io import BytesIO
 import json
+import logging
 import argparse
+import atexit
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import tempfile
 from pathlib import Path
-from datetime import datetime, date, timedelta
+from datetime import datetime, date
 import time
 import requests
+import numpy as np
 import pandas as pd
 from requests.adapters import HTTPAdapter
 from urllib3 import Retry
 from concurrent import futures
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from event_table import journal_file, read_features
+from feature_stream import iter_features
+from figures import build_event_artifacts
+from ingest_queue import JobQueue
+from metrics import JsonFormatter, MetricsRegistry
+from singleflight import SingleFlight
+
+log = logging.getLogger("usgs_api")
 
 DATA_DIR = r"./data/"
+USGS_HOST = "https://earthquake.usgs.gov"
 VERBOSE_MODE = False
 EVENTS_FILE = False
+LAZY_PRODUCTS = False
+RUN_METRICS = MetricsRegistry()
+RUN_STAGES = {}
+RUN_ERRORS = []
+MAX_RUN_ERRORS = 100
+FETCH_TIMEOUT = 120
+FETCH_FLIGHT = SingleFlight(RUN_METRICS, "fetch")
+EVENTS_FILENAME = "SC_Earthquake.geojson"
+EVENTS_CHUNK_SIZE = 1 << 16  # bytes of the event query response read at a time
+URL_CACHE_FILENAME = "dyfi_urls.json"
+QUEUE_FILENAME = "ingest_queue.sqlite"
+QUEUE_POLL_INTERVAL = 5
+PARSE_POOL = None  # the ProcessPoolExecutor of the parse stage; see submit_parse()
+# The catalog region and magnitude range, of the FDSN query and of the events taken from the summary feeds.
+REGION = {"maxlatitude": "35.261",
+          "minlatitude": "31.977",
+          "maxlongitude": "-77.86",
+          "minlongitude": "-83.485",
+          "minmagnitude": "1",
+          "maxmagnitude": "10"}
+FEED_URL = "/earthquakes/feed/v1.0/summary/{}.geojson"
+FEEDS = ['all_hour', 'all_day', 'all_week', 'all_month']
+JOURNAL_COMPACT_EVENTS = 200
+# Saved DYFI product file -> its url in the dyfi_urls() dictionary
+PRODUCT_FILES = {'cdi_zip.csv': 'e_url',
+                 'dyfi_geo_1km.geojson': 'e_dyfi_geo_1k_url',
+                 'dyfi_geo_10km.geojson': 'e_dyfi_geo_10k_url',
+                 'dyfi_plot_atten.json': 'e_dyfi_plot_atten_url',
+                 'dyfi_plot_numresp.json': 'e_dyfi_plot_numresp_url'}
 
 
 def create_session():  # pylint: disable='missing-function-docstring'
@@ -46,6 +149,7 @@ def create_session():  # pylint: disable='missing-function-docstring'
     adapter = HTTPAdapter(max_retries=retry_strategy)
     http = requests.session()
     http.mount("https://", adapter)
+    http.mount("http://", adapter)
     return http
 
 
@@ -53,8 +157,121 @@ def close_http_session(http):  # pylint: disable='missing-function-docstring'
     http.close()
 
 
-def get_url(xhttp, url):
-    return xhttp.get(url, timeout=(3.05, 27))
+def get_url(xhttp, url, stage="request", submitted=None, params=None, headers=None, stream=False):
+    """ get_url() GET a url and record the request metrics.
+
+    Parameters
+    ----------
+    xhttp : session
+        A request session object for context management.
+    url : String
+        The url to get.
+    stage : String
+        The ingest stage the request belongs to; prefixes the names of the recorded metrics.
+    submitted : float
+        The time.monotonic() time the request was submitted to a thread pool; used for the queue wait time.
+    params : Python dictionary
+        The query string parameters.
+    headers : Python dictionary
+        Additional request headers, e.g. the validators of a conditional request.
+    stream : bool
+        If True, the response body is not read; the caller reads it and counts its bytes with the stage's bytes
+        counter, and the request time only covers the response headers.
+
+    Returns
+    -------
+    response : requests.Response
+        The response to the request.
+    """
+    start_time = time.monotonic()
+    if submitted is not None:
+        RUN_METRICS.observe(f"{stage}.queue_wait_seconds", start_time - submitted)
+    try:
+        response = xhttp.get(url, params=params, headers=headers, timeout=(3.05, 27), stream=stream)
+    except requests.RequestException as exc:
+        RUN_METRICS.increment(f"{stage}.request_errors")
+        log.warning("request failed", extra={"fields": dict(stage=stage, url=url, error=repr(exc))})
+        raise
+    elapsed = time.monotonic() - start_time
+    size = None if stream else len(response.content)
+    retries = getattr(response.raw, "retries", None)
+    n_retries = len(retries.history) if retries is not None else 0
+    RUN_METRICS.observe(f"{stage}.request_seconds", elapsed)
+    RUN_METRICS.increment(f"{stage}.requests")
+    if size is not None:
+        RUN_METRICS.increment(f"{stage}.bytes", size)
+    RUN_METRICS.increment(f"{stage}.retries", n_retries)
+    RUN_METRICS.increment(f"http_status.{response.status_code}")
+    log.debug("request", extra={"fields": dict(stage=stage, url=response.url, status=response.status_code,
+                                                seconds=round(elapsed, 4), bytes=size, retries=n_retries)})
+    return response
+
+
+def fetch_event_file(xhttp, eid, name, url, stage="request", submitted=None):
+    """ fetch_event_file() GET a file of an event, at most once at a time.
+
+    Threads that ask for the same file of the same event while it is being downloaded wait for that download and
+    get the same response, or the same exception, instead of downloading the file again.
+
+    Parameters
+    ----------
+    xhttp : session
+        A request session object for context management.
+    eid : String
+        The event id.
+    name : String
+        The name of the file, e.g. 'detail' or the product file name; (eid, name) is the coalescing key.
+    url : String
+        The url to get.
+    stage : String
+        The ingest stage the request belongs to; prefixes the names of the recorded metrics.
+    submitted : float
+        The time.monotonic() time the request was submitted to a thread pool; used for the queue wait time.
+
+    Returns
+    -------
+    response : requests.Response
+        The response to the request.
+    """
+    return FETCH_FLIGHT.do((eid, name), get_url, xhttp, url, stage, submitted, timeout=FETCH_TIMEOUT)
+
+
+def counted_chunks(chunks, stage):
+    """ counted_chunks() Yield the chunks of a streamed response body, counting their bytes in the stage's bytes. """
+    for chunk in chunks:
+        RUN_METRICS.increment(f"{stage}.bytes", len(chunk))
+        yield chunk
+
+
+def record_error(stage, url, eid, exc):
+    """ record_error() Count and log a failed event download, keeping its details for the run summary. """
+    RUN_METRICS.increment(f"{stage}.errors")
+    error = dict(stage=stage, event_id=eid, url=url, error=repr(exc))
+    if len(RUN_ERRORS) < MAX_RUN_ERRORS:
+        RUN_ERRORS.append(error)
+    log.error("event download failed", extra={"fields": error})
+
+
+def log_stage(name, start_time, items, request_stage=None):
+    """ log_stage() Record and log the duration and throughput of an ingest part.
+
+    Parameters
+    ----------
+    name : String
+        The name of the part, the function name.
+    start_time : float
+        The time.monotonic() time the part started.
+    items : int
+        The number of items (events or files) the part processed.
+    request_stage : String
+        The stage name of the part's HTTP requests, used to report the bytes downloaded.
+    """
+    seconds = time.monotonic() - start_time
+    n_bytes = RUN_METRICS.counter(f"{request_stage}.bytes") if request_stage else 0
+    RUN_STAGES[name] = dict(seconds=round(seconds, 4), items=items, bytes=n_bytes,
+                            items_per_second=round(items / seconds, 3) if seconds else None,
+                            bytes_per_second=round(n_bytes / seconds) if seconds else None)
+    log.info("stage finished", extra={"fields": dict(stage=name, **RUN_STAGES[name])})
 
 
 def get_eq_events(http):
@@ -65,6 +282,10 @@ def get_eq_events(http):
     event ids and detail urls. If the -f command-line argument is given, then
     the event data is saved to a file.
 
+    The response is parsed one feature at a time as it arrives (see feature_stream.py), and only the fields of the
+    returned dataframe are kept, so the peak memory does not grow with the size of the response.  The events file is
+    written from the response chunks as they are read.
+
     Parameters
     ----------
     http : session
@@ -73,60 +294,127 @@ def get_eq_events(http):
     Returns
     -------
     eq_events_df : pandas dataframe
-        A pandas dataframe containing two columns:  event ids and event detail urls.
+        A pandas dataframe containing the event ids, event detail urls, event places, event coordinates and event
+        update times (<NA> for an event without one).
     """
     start_time = time.monotonic()
     if VERBOSE_MODE:
         print("Running API query...")
         print("Function:  get_eq_events()")
-    url = "https://earthquake.usgs.gov/fdsnws/event/1/query.geojson"
+    url = USGS_HOST + "/fdsnws/event/1/query.geojson"
     querystring = {"starttime": "2021-12-01 00:00:00",
                    "endtime": date.today().isoformat() + " 23:59:59",
-                   "maxlatitude": "35.261",
-                   "minlatitude": "31.977",
-                   "maxlongitude": "-77.86",
-                   "minlongitude": "-83.485",
-                   "minmagnitude": "1",
-                   "maxmagnitude": "10",
+                   **REGION,
                    "orderby": "time",
                    "producttype": "dyfi",
                    "format": "geojson"}
 #     response = requests.request("GET", url, params=querystring, timeout=(3.05, 27))
-    response = http.get(url, params=querystring, timeout=(3.05, 27))
-    data = response.json()
-    # Write earthquake events data to a file
+    response = get_url(http, url, "events", params=querystring, stream=True)
+    ids, details, places, updated = [], [], [], []
+    coordinates = array('d')
+    with response, ExitStack() as stack:
+        response.raise_for_status()
+        tee = None
+        # Write earthquake events data to a file
+        if EVENTS_FILE:
+            # file_pfx = datetime.now().strftime("%Y%m%d")
+            filename = Path(DATA_DIR + EVENTS_FILENAME)
+#            filename = r"./data/" + file_pfx + r"_SC_Earthquake.geojson"
+            if VERBOSE_MODE:
+                print(f"Saving SC earthquake events data to {filename}")
+            tee = stack.enter_context(open_file_atomic(filename))
+        chunks = response.iter_content(EVENTS_CHUNK_SIZE)
+        for feature in iter_features(counted_chunks(chunks, "events"), tee=tee):
+            props = feature['properties']
+            ids.append(feature['id'])
+            details.append(props.get('detail'))
+            places.append(props.get('place'))
+            updated.append(props.get('updated'))
+            lon, lat, *depth = feature['geometry']['coordinates']
+            coordinates.extend((lon, lat, depth[0] if depth else float('nan')))
     if EVENTS_FILE:
-        # file_pfx = datetime.now().strftime("%Y%m%d")
-        filename = Path(DATA_DIR + r"SC_Earthquake.geojson")
-#        filename = r"./data/" + file_pfx + r"_SC_Earthquake.geojson"
-        if VERBOSE_MODE:
-            print(f"Saving SC earthquake events data to {filename}")
-        with open(filename, 'w', encoding="utf-8") as f:  # pylint: disable='invalid-name'  # noqa
-            json.dump(data, f)
+        # The full catalog supersedes the events a --watch daemon journaled.
+        journal_file(filename).unlink(missing_ok=True)
     if VERBOSE_MODE:
         print("Saving earthquake event ids. ")
-    # Save json response to a pandas dataframe and filter the needed columns to the same dataframe.
-    temp_df = pd.json_normalize(data['features'])
-    eq_events_df = temp_df[['id', 'properties.detail']]
-    end_time = time.monotonic()
-    func_time = (timedelta(seconds=end_time - start_time))
-    print(f"Function: get_eq_events() took {func_time} seconds to run.")
+    eq_events_df = pd.DataFrame({'id': ids,
+                                 'properties.detail': details,
+                                 'properties.place': places,
+                                 'geometry.coordinates': np.frombuffer(coordinates).reshape(-1, 3).tolist(),
+                                 'properties.updated': pd.array(updated, dtype='Int64')})
+    log_stage("get_eq_events", start_time, len(eq_events_df), "events")
     return eq_events_df
 
 
-def get_dyfi_urls(eq_id_url_df, http):
+def write_events_file(filename, data):
+    """ write_events_file() Save the catalog GeoJSON file atomically.
+
+    The catalog is written to a temporary file and renamed, so a running app's reloader never reads a partial file.
+
+    Parameters
+    ----------
+    filename : Path
+        The catalog file.
+    data : Python dictionary
+        The GeoJSON FeatureCollection.
+
+    Returns
+    -------
+    Nothing. Saves the catalog file.
+    """
+    write_file_atomic(filename, json.dumps(data))
+
+
+def write_file_atomic(filename, text):
+    """ write_file_atomic() Write a text file to a temporary file and rename it.
+
+    Readers of the file, e.g. the data app, never see it partially written.
+    """
+    with open_file_atomic(filename, 'w') as f:  # pylint: disable='invalid-name'  # noqa
+        f.write(text)
+
+
+@contextmanager
+def open_file_atomic(filename, mode='wb'):
+    """ open_file_atomic() Open a temporary file that is renamed to filename when the context exits without an error.
+
+    Readers of the file, e.g. the data app, never see it partially written; if the context raises, the file is left
+    as it was and the temporary file is removed.
+    """
+    fd, tmp_name = tempfile.mkstemp(dir=filename.parent, suffix=".tmp")
+    try:
+        encoding = None if 'b' in mode else "utf-8"
+        with os.fdopen(fd, mode, encoding=encoding) as f:  # pylint: disable='invalid-name'  # noqa
+            yield f
+        os.chmod(tmp_name, 0o644)
+        os.replace(tmp_name, filename)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def get_dyfi_urls(eq_id_url_df, http, failed=None):
     """ get_dyfi_urls() Retrieve dyfi, cdi_zip.txt file urls.
 
     get_dyfi_urls():  By using the detail url for each event in the eq_id_url_df dataframe, retrieve the following links
     from the events dyfi detail content:  cdi_zip.txt, dyfi_geo_1km.geojson, dyfi_geo_10km.geojson,
     dyfi_plot_atten.json, and dyfi_plot_numresp.json.
 
+    The urls of each event are saved in the url cache file (URL_CACHE_FILENAME), with the event's update time.  An
+    event whose update time is the same as in the cache is not requested again; its cached urls are used.
+
+    An event whose detail document cannot be downloaded, or lists an incomplete DYFI product, is recorded with
+    record_error() and left out, and its urls are not cached, so that it is requested again by the next run.
+
     Parameters
     ----------
     eq_id_url_df : pandas dataframe
-        A pandas dataframe containing earthquake event ids and their event detail urls.
+        A pandas dataframe containing earthquake event ids, their event detail urls and, optionally, their update times
+        (properties.updated); events without an update time are always requested.
     http : session
         A request session object for context management.
+    failed : list
+        If given, the ids of the events that failed are appended to it.
 
     Returns
     -------
@@ -138,31 +426,133 @@ def get_dyfi_urls(eq_id_url_df, http):
     if VERBOSE_MODE:
         print("Function:  get_dyfi_urls()")
         print("Retrieving cdi_zip.txt urls.")
+    cache_file = Path(DATA_DIR + URL_CACHE_FILENAME)
+    cache = read_url_cache(cache_file)
     dyfi_zip_urls = []
     querystring_list = list(eq_id_url_df['properties.detail'])
+    if 'properties.updated' in eq_id_url_df:
+        updated_list = [None if pd.isna(updated) else int(updated) for updated in eq_id_url_df['properties.updated']]
+    else:
+        updated_list = [None] * len(querystring_list)
+    requested = []
+    for eid, qry, updated in zip(eq_id_url_df['id'], querystring_list, updated_list):
+        cached = cache.get(eid)
+        if updated is not None and cached is not None and cached['updated'] == updated:
+            RUN_METRICS.increment("detail.cache_hits")
+            if cached['urls'] is not None:
+                dyfi_zip_urls.append(cached['urls'])
+        else:
+            requested.append((eid, qry, updated))
     with ThreadPoolExecutor(max_workers=16) as pool:
-        task_list = [pool.submit(get_url, http, qry) for qry in querystring_list]
+        task_list = {pool.submit(fetch_event_file, http, eid, 'detail', qry, "detail", time.monotonic()):
+                     (eid, qry, updated) for eid, qry, updated in requested}
         for f in futures.as_completed(task_list):
-            res_data = f.result().json()
-            event_id = res_data['id']
-            res_data_df = pd.DataFrame(res_data['properties']['products']['dyfi'])
-            temp_df = res_data_df.loc[res_data_df['preferredWeight'] ==
-                                      res_data_df['preferredWeight'].max()]
-            temp_df = pd.json_normalize(temp_df['contents'])
-            if 'cdi_zip.txt.url' not in temp_df:
+            eid, qry, updated = task_list[f]
+            try:
+                response = f.result()
+                response.raise_for_status()
+                urls = dyfi_urls(response.json())
+            except Exception as exc:  # pylint: disable='broad-exception-caught'
+                # e.g. a failed request, or a DYFI product without one of its files; the other events go on.
+                record_error("detail", qry, eid, exc)
+                if failed is not None:
+                    failed.append(eid)
                 continue
-            dyfi_zip_urls.append(dict(e_id=event_id, e_url=temp_df['cdi_zip.txt.url'][0],
-                                      e_dyfi_geo_1k_url=temp_df['dyfi_geo_1km.geojson.url'][0],
-                                      e_dyfi_geo_10k_url=temp_df['dyfi_geo_10km.geojson.url'][0],
-                                      e_dyfi_plot_atten_url=temp_df['dyfi_plot_atten.json.url'][0],
-                                      e_dyfi_plot_numresp_url=temp_df['dyfi_plot_numresp.json.url'][0]))
+            if updated is not None:
+                cache[eid] = dict(updated=updated, urls=urls)
+            if urls is not None:
+                dyfi_zip_urls.append(urls)
+    if requested:
+        write_file_atomic(cache_file, json.dumps(cache))
     eq_ids_df = pd.DataFrame(dyfi_zip_urls)
-    end_time = time.monotonic()
-    func_time = (timedelta(seconds=end_time - start_time))
-    print(f"Function: get_dyfi_urls took {func_time} seconds to run.")
+    log_stage("get_dyfi_urls", start_time, len(querystring_list), "detail")
     return eq_ids_df
 
 
+def read_url_cache(filename):
+    """ read_url_cache() Return the dyfi urls cache: event id -> dict(updated=<update time>, urls=<dyfi_urls()>).
+
+    A missing or unreadable cache file is an empty cache.
+    """
+    try:
+        with open(filename, encoding="utf-8") as f:  # pylint: disable='invalid-name'  # noqa
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def dyfi_urls(res_data):
+    """ dyfi_urls() Return the dyfi urls of an event detail document.
+
+    The preferred DYFI product is the first one of the highest preferredWeight; its urls are read from its contents
+    directly, without building dataframes of the products.
+
+    Parameters
+    ----------
+    res_data : Python dictionary
+        The event detail GeoJSON document.
+
+    Returns
+    -------
+    urls : Python dictionary or None
+        The event id (e_id) and the urls of the preferred DYFI product's cdi_zip.txt (e_url), dyfi_geo_1km.geojson,
+        dyfi_geo_10km.geojson, dyfi_plot_atten.json and dyfi_plot_numresp.json files; None if it has no cdi_zip.txt.
+    """
+    products = res_data['properties']['products']['dyfi']
+    contents = max(products, key=lambda product: product['preferredWeight'])['contents']
+    if 'cdi_zip.txt' not in contents:
+        return None
+    return dict(e_id=res_data['id'], e_url=contents['cdi_zip.txt']['url'],
+                e_dyfi_geo_1k_url=contents['dyfi_geo_1km.geojson']['url'],
+                e_dyfi_geo_10k_url=contents['dyfi_geo_10km.geojson']['url'],
+                e_dyfi_plot_atten_url=contents['dyfi_plot_atten.json']['url'],
+                e_dyfi_plot_numresp_url=contents['dyfi_plot_numresp.json']['url'])
+
+
+def fetch_event_products(http, eid, detail_url):
+    """ fetch_event_products() Retrieve the DYFI product files of one event that are not saved yet.
+
+    The files are retrieved the same way as in a full run: the event's detail document for the dyfi urls, then
+    get_dyfi_zip_data() for cdi_zip.txt and process_fast_dyfi_urls_hlpr() for the other product files.
+
+    Parameters
+    ----------
+    http : session
+        A request session object for context management.
+    eid : String
+        The event id.
+    detail_url : String
+        The event's detail url.
+
+    Returns
+    -------
+    missing : list
+        The product files that are still not saved, e.g. because their download failed.
+
+    Raises
+    ------
+    LookupError
+        If the event's detail document lists no cdi_zip.txt DYFI product.
+    """
+    event_dir = Path(DATA_DIR + eid)
+    missing = [name for name in PRODUCT_FILES if not (event_dir / name).exists()]
+    if not missing:
+        return []
+    response = fetch_event_file(http, eid, 'detail', detail_url, "detail")
+    response.raise_for_status()
+    urls = dyfi_urls(response.json())
+    if urls is None:
+        raise LookupError(f"event {eid} has no DYFI cdi_zip.txt product")
+    event_dir.mkdir(exist_ok=True)
+    if 'cdi_zip.csv' in missing:
+        get_dyfi_zip_data(pd.DataFrame([urls]), http)
+    url_list = [urls[PRODUCT_FILES[name]] for name in missing if name != 'cdi_zip.csv']
+    if url_list:
+        with ThreadPoolExecutor(max_workers=len(url_list)) as executor:
+            process_fast_dyfi_urls_hlpr(http, executor, [eid] * len(url_list), url_list)
+    return [name for name in missing if not (event_dir / name).exists()]
+
+
 def process_fast_dyfi_urls_hlpr(http, executor, eid_list, url_list):
     """ process_fast_dyfi_urls_hlpr() -- A helper function to process_fast_dyfi_urls()
 
@@ -179,28 +569,38 @@ def process_fast_dyfi_urls_hlpr(http, executor, eid_list, url_list):
 
     Returns
     -------
-    No data is returned
+    failed -- list of the urls that could not be fetched or saved
 
     """
+    failed = []
     iterx = zip(eid_list, url_list)
-    future_to_url = {executor.submit(get_url, http, url): (url, eid) for eid, url in iterx}
+    future_to_url = {executor.submit(fetch_event_file, http, eid, url.split(sep='/')[-1], url, "product",
+                                     time.monotonic()): (url, eid)
+                     for eid, url in iterx}
+    # The downloaded bytes are decoded and saved by the parse stage, while the other downloads go on.
+    parse_to_url = {}
     for future in (futures.as_completed(future_to_url)):
         url = future_to_url[future][0]
         eid = future_to_url[future][1]
-        print(eid, url)
         try:
-            data = future.result().json()
+            content = future.result().content
         except Exception as exc:
-            print('%r generated an exception: %s' % (url, exc))
+            record_error("product", url, eid, exc)
+            failed.append(url)
         else:
             url_split = url.split(sep='/')
             filenme = url_split[-1]
             filename = Path(DATA_DIR + eid + "/" + filenme)
             if VERBOSE_MODE:
                 print(f"Saving file {filename}")
-            with open(filename, 'w', encoding="utf-8") as f1:  # pylint: disable='invalid-name'  # noqa
-                json.dump(data, f1)
-    return
+            parse_to_url[submit_parse(store_product, normalize_product, content, filename)] = (url, eid)
+    for future in (futures.as_completed(parse_to_url)):
+        try:
+            future.result()
+        except Exception as exc:
+            record_error("product", *parse_to_url[future], exc)
+            failed.append(parse_to_url[future][0])
+    return failed
 
 
 def process_fast_dyfi_urls(http, dyfi_urls_df):
@@ -234,9 +634,7 @@ def process_fast_dyfi_urls(http, dyfi_urls_df):
         url_list = dyfi_urls_df['e_dyfi_plot_numresp_url'].tolist()
         process_fast_dyfi_urls_hlpr(http, executor, eid_list, url_list)
 
-    end_time = time.monotonic()
-    func_time = (timedelta(seconds=end_time - start_time))
-    print(f"Function: process_fast_dyfi_urls took {func_time} seconds to run.")
+    log_stage("process_fast_dyfi_urls", start_time, 4 * len(eid_list), "product")
     return
 
 
@@ -319,33 +717,412 @@ def get_dyfi_zip_data(zip_df, http):
     start_time = time.monotonic()
     if VERBOSE_MODE:
         print("Function:  get_dyfi_zip_data()")
+    parse_list = []
     for idx in range(0, len(zip_df)):
         url = zip_df['e_url'][idx]
         eid = zip_df['e_id'][idx]
         if VERBOSE_MODE:
             print(f"Processing url {url}")
 #        response = requests.request("GET", url, timeout=(3.05, 27))
-        response = http.get(url, timeout=(3.05, 27))
-        res_data = BytesIO(response.content)
-        res_data_dff = pd.read_csv(res_data)
-        res_data_dff.rename({'# Columns: ZIP/Location': 'ZIP/Location',
-                             'No. of responses': 'Response_Count',
-                             'Hypocentral distance': 'Hypocentral_Distance',
-                             'Standard deviation': 'Std_Dev',
-                             'State[': 'State'},
-                            axis=1, inplace=True)
-        res_data_dff.State.fillna('No State', inplace=True)
-        res_data_dff.drop(['Suspect?', 'Std_Dev', 'cityid]'], axis=1, inplace=True)
+        response = fetch_event_file(http, eid, 'cdi_zip.txt', url, "cdi_zip")
 #        filename = data_dir + "cdi_zip" + "." + eid
         new_dir = Path(DATA_DIR + eid)
         new_dir.mkdir(exist_ok=True)
         filename = Path(DATA_DIR + eid + "/" + "cdi_zip.csv")
         if VERBOSE_MODE:
             print(f"Saving file {filename}")
-        res_data_dff.to_csv(filename, index=False)
-    end_time = time.monotonic()
-    func_time = (timedelta(seconds=end_time - start_time))
-    print(f"Function: get_dyfi_zip_data took {func_time} seconds to run.")
+        # The file is parsed and saved by the parse stage while the next one is downloaded.
+        parse_list.append(submit_parse(store_product, normalize_cdi_zip, response.content, filename))
+    for future in parse_list:
+        future.result()
+    log_stage("get_dyfi_zip_data", start_time, len(zip_df), "cdi_zip")
+    return
+
+
+def normalize_cdi_zip(content):
+    """ normalize_cdi_zip() Return the cdi_zip.csv text of a downloaded cdi_zip.txt file.
+
+    The columns are renamed to the names the data app uses, a missing State is 'No State', and the Suspect?, Std_Dev
+    and cityid] columns are dropped.
+    """
+    res_data_dff = pd.read_csv(BytesIO(content))
+    res_data_dff.rename({'# Columns: ZIP/Location': 'ZIP/Location',
+                         'No. of responses': 'Response_Count',
+                         'Hypocentral distance': 'Hypocentral_Distance',
+                         'Standard deviation': 'Std_Dev',
+                         'State[': 'State'},
+                        axis=1, inplace=True)
+    res_data_dff.State.fillna('No State', inplace=True)
+    res_data_dff.drop(['Suspect?', 'Std_Dev', 'cityid]'], axis=1, inplace=True)
+    return res_data_dff.to_csv(index=False)
+
+
+def normalize_product(content):
+    """ normalize_product() Return the stored JSON text of a downloaded DYFI product file; raises if it is not JSON. """
+    return json.dumps(json.loads(content))
+
+
+def store_product(normalize, content, filename):
+    """ store_product() Convert a downloaded product file with normalize() and save it atomically.
+
+    This is the work of the parse stage, run in a PARSE_POOL process.
+    """
+    write_file_atomic(filename, normalize(content))
+
+
+def submit_parse(fn, *args):
+    """ submit_parse() Run fn(*args) in the parse stage; returns its future.
+
+    The parse stage is the PARSE_POOL process pool, so parsing a file does not hold the GIL of the downloading
+    threads.  Without a PARSE_POOL, e.g. in the data app's product loader, fn runs in the calling thread.
+    """
+    if PARSE_POOL is not None:
+        return PARSE_POOL.submit(fn, *args)
+    future = futures.Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as exc:
+        future.set_exception(exc)
+    return future
+
+
+def build_figure_artifacts(eq_events_df, dyfi_urls_df):
+    """ build_figure_artifacts() Build the graph-plot figure artifacts of each downloaded event.
+
+    build_figure_artifacts() renders every graph-plot type of each event that had its DYFI data downloaded, and saves
+    them as JSON files in the event's figures directory, so the data app can serve them without rebuilding them.
+
+    Parameters
+    ----------
+    eq_events_df : pandas dataframe
+        The dataframe returned by get_eq_events(), containing the event places and coordinates.
+    dyfi_urls_df : pandas dataframe
+        The dataframe returned by get_dyfi_urls(), containing the ids of the downloaded events.
+
+    Returns
+    -------
+    Nothing. Saves the figure artifacts for each earthquake event.
+    """
+    start_time = time.monotonic()
+    if VERBOSE_MODE:
+        print("Function:  build_figure_artifacts()")
+    events_df = eq_events_df[eq_events_df['id'].isin(dyfi_urls_df['e_id'])]
+    for eid, place, coords in zip(events_df['id'], events_df['properties.place'],
+                                  events_df['geometry.coordinates']):
+        if VERBOSE_MODE:
+            print(f"Building figure artifacts for event {eid}")
+        epicenter = dict(lat=coords[1], lon=coords[0], place=place if place else "No Location")
+        failed = build_event_artifacts(eid, epicenter, Path(DATA_DIR))
+        for artifact, error in failed.items():
+            RUN_METRICS.increment("build.errors")
+            log.warning("figure artifact not built", extra={"fields": dict(event_id=eid, artifact=artifact,
+                                                                            error=error)})
+    log_stage("build_figure_artifacts", start_time, len(events_df))
+    return
+
+
+def enqueue_events(queue, eq_events_df):
+    """ enqueue_events() Add a job for each event to the ingest job queue.
+
+    Parameters
+    ----------
+    queue : ingest_queue.JobQueue
+        The job queue.
+    eq_events_df : pandas dataframe
+        The dataframe returned by get_eq_events().
+
+    Returns
+    -------
+    int
+        The number of new jobs, and of jobs reset because their event was updated since it was enqueued.
+    """
+    jobs = (dict(event_id=eid, detail=detail, place=place, lon=coords[0], lat=coords[1],
+                 updated=0 if pd.isna(updated) else int(updated))
+            for eid, detail, place, coords, updated in zip(eq_events_df['id'], eq_events_df['properties.detail'],
+                                                           eq_events_df['properties.place'],
+                                                           eq_events_df['geometry.coordinates'],
+                                                           eq_events_df['properties.updated']))
+    added = queue.enqueue(jobs)
+    RUN_METRICS.increment("queue.enqueued", added)
+    log.info("events enqueued", extra={"fields": dict(events=len(eq_events_df), enqueued=added)})
+    return added
+
+
+def run_event_job(http, job):
+    """ run_event_job() Download the DYFI product files of one queued event and build its figure artifacts.
+
+    The same files as a full run are written, atomically, so a job can safely run again, e.g. after its worker's lease
+    expired.
+
+    Parameters
+    ----------
+    http : session
+        A request session object for context management.
+    job : Python dictionary
+        The job, as returned by ingest_queue.JobQueue.claim().
+
+    Returns
+    -------
+    bool
+        True if the event's files were downloaded; False if its detail document lists no cdi_zip.txt DYFI product.
+
+    Raises
+    ------
+    Exception
+        If the detail document or a product file could not be downloaded; the job is retried.
+    """
+    eid = job['event_id']
+    response = fetch_event_file(http, eid, 'detail', job['detail'], "detail")
+    response.raise_for_status()
+    urls = dyfi_urls(response.json())
+    if urls is None:
+        return False
+    Path(DATA_DIR + eid).mkdir(exist_ok=True)
+    get_dyfi_zip_data(pd.DataFrame([urls]), http)
+    url_list = [urls[key] for name, key in PRODUCT_FILES.items() if name != 'cdi_zip.csv']
+    with ThreadPoolExecutor(max_workers=len(url_list)) as executor:
+        failed = process_fast_dyfi_urls_hlpr(http, executor, [eid] * len(url_list), url_list)
+    if failed:
+        raise OSError(f"could not download {', '.join(url.split(sep='/')[-1] for url in failed)}")
+    epicenter = dict(lat=job['lat'], lon=job['lon'], place=job['place'] if job['place'] else "No Location")
+    for artifact, error in build_event_artifacts(eid, epicenter, Path(DATA_DIR)).items():
+        RUN_METRICS.increment("build.errors")
+        log.warning("figure artifact not built", extra={"fields": dict(event_id=eid, artifact=artifact, error=error)})
+    return True
+
+
+def run_worker(http, queue, threads):
+    """ run_worker() Claim and run ingest jobs until the queue has no pending or leased job left.
+
+    Each of threads threads claims one job at a time.  A thread that finds no available job while other jobs are
+    still leased, or waiting for a retry, polls the queue every QUEUE_POLL_INTERVAL seconds, since those jobs may
+    fail and become available again.
+
+    Parameters
+    ----------
+    http : session
+        A request session object for context management.
+    queue : ingest_queue.JobQueue
+        The job queue.
+    threads : int
+        The number of jobs run at a time.
+
+    Returns
+    -------
+    int
+        The number of jobs this worker completed.
+    """
+    start_time = time.monotonic()
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+    def lost_lease(job, worker):
+        # The job outlived its lease and another worker claimed it, or its event was updated and enqueued again.
+        RUN_METRICS.increment("queue.lost_leases")
+        log.warning("job lease lost", extra={"fields": dict(event_id=job['event_id'], worker=worker)})
+
+    def work(thread):
+        worker = f"{worker_id}:{thread}"
+        completed = 0
+        while True:
+            job = queue.claim(worker)
+            if job is None:
+                counts = queue.counts()
+                if not counts['pending'] and not counts['leased']:
+                    return completed
+                time.sleep(QUEUE_POLL_INTERVAL)
+                continue
+            if VERBOSE_MODE:
+                print(f"Running job {job['event_id']} (attempt {job['attempts']})")
+            try:
+                run_event_job(http, job)
+            except Exception as exc:
+                record_error("queue", job['detail'], job['event_id'], exc)
+                state = queue.fail(job, worker, repr(exc))
+                if state is None:
+                    lost_lease(job, worker)
+                else:
+                    RUN_METRICS.increment("queue.retries" if state == 'pending' else "queue.failures")
+            else:
+                if queue.complete(job, worker):
+                    RUN_METRICS.increment("queue.completed")
+                    completed += 1
+                else:
+                    lost_lease(job, worker)
+
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="ingest-worker") as pool:
+        completed = sum(pool.map(work, range(threads)))
+    log_stage("run_worker", start_time, completed, "product")
+    return completed
+
+
+def in_region(feature):
+    """ in_region() Return True if a feed event has DYFI data and is in the region and magnitude range of REGION. """
+    lon, lat = feature['geometry']['coordinates'][:2]
+    props = feature['properties']
+    return (props.get('mag') is not None
+            and float(REGION['minmagnitude']) <= props['mag'] <= float(REGION['maxmagnitude'])
+            and float(REGION['minlatitude']) <= lat <= float(REGION['maxlatitude'])
+            and float(REGION['minlongitude']) <= lon <= float(REGION['maxlongitude'])
+            and ',dyfi,' in (props.get('types') or ''))
+
+
+def poll_feed(http, feed, validators, stored, event_file):
+    """ poll_feed() Poll a summary feed once and store its new and updated events.
+
+    The feed is requested with the validators (ETag and Last-Modified) of the last poll that was stored.  Its new and
+    updated events have their DYFI data downloaded and their figure artifacts built, and are then appended to the
+    catalog journal.  validators and stored are only updated once that succeeded, so a failed poll is retried in full
+    by the next one.  An event whose detail document could not be downloaded is left out of the journal and of stored,
+    and the validators are not updated, so that the next poll requests it again; the other events are journaled.
+
+    Parameters
+    ----------
+    http : session
+        A request session object for context management.
+    feed : String
+        The feed name, e.g. 'all_hour'.
+    validators : Python dictionary
+        The ETag and Last-Modified response headers of the last stored poll; updated.
+    stored : Python dictionary
+        The update time of each stored event, by event id; updated.
+    event_file : Path
+        The catalog file.
+
+    Returns
+    -------
+    int
+        The number of events appended to the journal.
+    """
+    start_time = time.monotonic()
+    headers = {}
+    if validators.get('ETag'):
+        headers['If-None-Match'] = validators['ETag']
+    if validators.get('Last-Modified'):
+        headers['If-Modified-Since'] = validators['Last-Modified']
+    response = get_url(http, USGS_HOST + FEED_URL.format(feed), "feed", headers=headers)
+    RUN_METRICS.increment("watch.polls")
+    if response.status_code == 304:
+        RUN_METRICS.increment("watch.not_modified")
+        return 0
+    response.raise_for_status()
+    features = response.json()['features']
+    changed = [feature for feature in features
+               if in_region(feature) and feature['properties']['updated'] > stored.get(feature['id'], -1)]
+    failed = []
+    if changed:
+        eq_events_df = pd.json_normalize(changed)[['id', 'properties.detail', 'properties.place',
+                                                   'geometry.coordinates', 'properties.updated']]
+        zip_urls_df = get_dyfi_urls(eq_events_df, http, failed) if not LAZY_PRODUCTS else pd.DataFrame()
+        if len(zip_urls_df):
+            get_dyfi_zip_data(zip_urls_df, http)
+            process_fast_dyfi_urls(http, zip_urls_df)
+            build_figure_artifacts(eq_events_df, zip_urls_df)
+        if failed:
+            RUN_METRICS.increment("watch.event_errors", len(failed))
+            failed_ids = set(failed)
+            changed = [feature for feature in changed if feature['id'] not in failed_ids]
+        # One write, so a reader sees whole lines, or an unfinished last line that it ignores.
+        with open(journal_file(event_file), 'a', encoding="utf-8") as f:  # pylint: disable='invalid-name'  # noqa
+            f.write(''.join(json.dumps(feature) + '\n' for feature in changed))
+        stored.update((feature['id'], feature['properties']['updated']) for feature in changed)
+        RUN_METRICS.increment("watch.events", len(changed))
+    if not failed:
+        validators.update((name, response.headers.get(name)) for name in ('ETag', 'Last-Modified'))
+    log.info("feed polled", extra={"fields": dict(feed=feed, events=len(features),
+                                                  changed=len(changed), failed=len(failed),
+                                                  seconds=round(time.monotonic() - start_time, 4))})
+    return len(changed)
+
+
+def compact_journal(event_file):
+    """ compact_journal() Merge the catalog journal into the catalog file, newest event first, and remove it.
+
+    Parameters
+    ----------
+    event_file : Path
+        The catalog file.
+
+    Returns
+    -------
+    Nothing. Rewrites the catalog file.
+    """
+    with open(event_file, encoding="utf-8") as f:  # pylint: disable='invalid-name'  # noqa
+        data = json.load(f)
+    features = sorted(read_features(event_file), key=lambda feature: feature['properties']['time'], reverse=True)
+    data['features'] = features
+    data.setdefault('metadata', {})['count'] = len(features)
+    write_events_file(event_file, data)
+    journal_file(event_file).unlink(missing_ok=True)
+    RUN_METRICS.increment("watch.compactions")
+    log.info("journal compacted", extra={"fields": dict(events=len(features))})
+
+
+def watch(http, feed, interval):
+    """ watch() Poll a summary feed every interval seconds, until interrupted.
+
+    Parameters
+    ----------
+    http : session
+        A request session object for context management.
+    feed : String
+        The feed name, e.g. 'all_hour'.
+    interval : float
+        The number of seconds between the starts of two polls.
+
+    Returns
+    -------
+    Nothing; runs until KeyboardInterrupt or SystemExit.
+    """
+    event_file = Path(DATA_DIR + EVENTS_FILENAME)
+    if not event_file.exists():
+        write_events_file(event_file, {"type": "FeatureCollection", "metadata": {}, "features": []})
+    stored = {feature['id']: feature['properties']['updated'] for feature in read_features(event_file)}
+    try:
+        with open(journal_file(event_file), encoding="utf-8") as f:  # pylint: disable='invalid-name'  # noqa
+            journaled = sum(1 for _ in f)
+    except FileNotFoundError:
+        journaled = 0
+    validators = {}
+    log.info("watching feed", extra={"fields": dict(feed=feed, interval=interval, stored=len(stored))})
+    while True:
+        started = time.monotonic()
+        try:
+            journaled += poll_feed(http, feed, validators, stored, event_file)
+            if journaled >= JOURNAL_COMPACT_EVENTS:
+                compact_journal(event_file)
+                journaled = 0
+        except Exception as exc:  # pylint: disable='broad-exception-caught'
+            # e.g. a network outage; the next poll asks for the feed again.
+            RUN_METRICS.increment("watch.errors")
+            log.warning("feed poll failed", extra={"fields": dict(feed=feed, error=repr(exc))})
+        time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+def write_run_summary(filename, started):
+    """ write_run_summary() Save the run's metrics to a JSON file.
+
+    The summary holds the run's start time and duration, every part's duration and throughput, the request counters
+    (requests, bytes, retries, errors and HTTP status counts), the request latency and queue wait histograms, and the
+    first MAX_RUN_ERRORS failed downloads.
+
+    Parameters
+    ----------
+    filename : Path
+        The summary file to write.
+    started : datetime
+        The time the run started.
+
+    Returns
+    -------
+    Nothing. Saves the run summary file.
+    """
+    summary = dict(started=started.isoformat(timespec="seconds"),
+                   duration_seconds=round((datetime.now() - started).total_seconds(), 3),
+                   stages=RUN_STAGES, errors=RUN_ERRORS, **RUN_METRICS.snapshot())
+    filename.parent.mkdir(parents=True, exist_ok=True)
+    with open(filename, 'w', encoding="utf-8") as f:  # pylint: disable='invalid-name'  # noqa
+        json.dump(summary, f, indent=2)
+    log.info("run summary written", extra={"fields": dict(summary_file=str(filename))})
     return
 
 
@@ -361,17 +1138,106 @@ if __name__ == '__main__':
                            action='store_true',
                            dest='v',
                            help='Display verbose output')
+    my_parser.add_argument('--host',
+                           default=USGS_HOST,
+                           help='USGS web service host, e.g. a local benchmarks/usgs_replay.py server')
+    my_parser.add_argument('--summary',
+                           type=Path,
+                           help='Run summary file (default: ./data/runs/ingest-<start time>.json)')
+    my_parser.add_argument('--lazy',
+                           action='store_true',
+                           help="Only retrieve the events; the data app downloads an event's DYFI files when selected")
+    my_parser.add_argument('--watch',
+                           type=float,
+                           metavar='SECONDS',
+                           help='Poll a real-time summary feed every SECONDS seconds instead of running the full query')
+    my_parser.add_argument('--feed',
+                           default='all_hour',
+                           choices=FEEDS,
+                           help='Summary feed polled by --watch')
+    my_parser.add_argument('--enqueue',
+                           action='store_true',
+                           help='Only retrieve the events, and add a job per event to the ingest job queue')
+    my_parser.add_argument('--worker',
+                           action='store_true',
+                           help='Run the jobs of the ingest job queue until none is left, instead of the full query')
+    my_parser.add_argument('--worker-threads',
+                           type=int,
+                           default=4,
+                           help='Number of jobs a --worker runs at a time')
+    my_parser.add_argument('--queue',
+                           type=Path,
+                           help='Ingest job queue file (default: ./data/ingest_queue.sqlite)')
+    my_parser.add_argument('--parse-workers',
+                           type=int,
+                           default=os.cpu_count() or 1,
+                           help='Number of processes that parse and save the downloaded files; 0 parses them in the '
+                                'downloading threads')
+    my_parser.add_argument('--log-level',
+                           default='INFO',
+                           choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                           help='Structured log level; DEBUG logs every HTTP request')
     args = my_parser.parse_args()
     if args.v:
         VERBOSE_MODE = True
     if args.f:
         EVENTS_FILE = True
+    if args.lazy:
+        LAZY_PRODUCTS = True
+    USGS_HOST = args.host.rstrip("/")
+    if args.parse_workers > 0 and not args.lazy:
+        # Spawned rather than forked, since the parent process has downloading threads.
+        PARSE_POOL = ProcessPoolExecutor(max_workers=args.parse_workers,
+                                         mp_context=multiprocessing.get_context("spawn"))
+        atexit.register(PARSE_POOL.shutdown)
+
+    log_handler = logging.StreamHandler()
+    log_handler.setFormatter(JsonFormatter())
+    log.addHandler(log_handler)
+    log.setLevel(args.log_level)
+    run_started = datetime.now()
+    summary_file = args.summary or Path(DATA_DIR + "runs/ingest-" + run_started.strftime("%Y%m%d-%H%M%S") + ".json")
 
     sess = create_session()
+    if args.watch:
+        # A SIGTERM from a service manager exits like a Ctrl-C, writing the run summary.
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        print(f"Watching the USGS {args.feed} feed every {args.watch:g} seconds")
+        try:
+            watch(sess, args.feed, args.watch)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            close_http_session(sess)
+            write_run_summary(summary_file, run_started)
+        sys.exit(0)
+
+    job_queue = JobQueue(args.queue or Path(DATA_DIR + QUEUE_FILENAME)) if args.enqueue or args.worker else None
+    if args.worker:
+        print(f"Running the jobs of {job_queue.path}")
+        try:
+            run_worker(sess, job_queue, args.worker_threads)
+        finally:
+            close_http_session(sess)
+            write_run_summary(summary_file, run_started)
+        print(f"Processing USGS API request - finished (jobs: {job_queue.counts()})")
+        sys.exit(0)
+
     print("Processing USGS API request - part 1")
     if VERBOSE_MODE:
         print("Retrieving earthquake events from USGS.gov. ")
     eq_event_ids = get_eq_events(sess)
+    if args.enqueue:
+        enqueue_events(job_queue, eq_event_ids)
+        close_http_session(sess)
+        write_run_summary(summary_file, run_started)
+        print(f"Processing USGS API request - finished (jobs: {job_queue.counts()}; run usgs_api.py --worker)")
+        sys.exit(0)
+    if LAZY_PRODUCTS:
+        close_http_session(sess)
+        write_run_summary(summary_file, run_started)
+        print("Processing USGS API request - finished (--lazy: DYFI files are downloaded by the data app)")
+        sys.exit(0)
 
     print("Processing USGS API request - part 2")
     if VERBOSE_MODE:
@@ -386,5 +1252,11 @@ if __name__ == '__main__':
     # process_dyfi_urls(sess, zip_urls_df)
     process_fast_dyfi_urls(sess, zip_urls_df)
 
+    print("Processing USGS API request - part 4")
+    if VERBOSE_MODE:
+        print("Building the graph-plot figure artifacts of each event. ")
+    build_figure_artifacts(eq_event_ids, zip_urls_df)
+
     close_http_session(sess)
+    write_run_summary(summary_file, run_started)
     print("Processing USGS API request - finished")
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+Compact encoding of the DYFI geocoded intensity cells.
+
+The cells of dyfi_geo_1km.geojson and dyfi_geo_10km.geojson are regular UTM squares, and a cell's name already
+encodes its zone and latitude band, the easting and northing of its south-west corner in units of its spacing, and
+its spacing in meters, e.g. "UTM:(17S 0497 3773 1000)<br>Columbia".  Yet each cell was stored in the intensity plot
+artifacts as a full GeoJSON polygon feature, and again as its name, CDI, distance and response count in the trace.
+
+encode_cells() turns a DYFI geocoded FeatureCollection into a cell table: one integer id per cell (its zone, band,
+easting and northing), the cdi, dist and nresp of each cell, and the place names that follow the UTM name.  The cell
+names are rebuilt exactly from the table; a file whose names cannot be is not encoded.  A CellTable holds the columns
+of a cell table as numpy arrays (the values as float32) and regenerates the polygons of just the cells being rendered,
+with one pyproj transform per UTM zone.  The corners are truncated to 5 decimals, as in the USGS files.
+
+utm_cells.py module contains the following:
+
+    cell_ids() - returns the integer ids of UTM cells.
+    encode_cells() - returns the cell table of a DYFI geocoded FeatureCollection.
+    utm_coordinates() - returns the UTM zone, band and coordinates of points.
+    aggregate_cells() - returns the cell table of the UTM squares of a spacing that contain weighted points.
+    CellTable - the columns of a cell table, and the polygons, names and trace values of its cells.
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+from pyproj import Transformer
+
+CELL_NAME = r"UTM:\((?P<zone>\d+)(?P<band>[C-X]) (?P<easting>\d+) (?P<northing>\d+) (?P<spacing>\d+)\)"
+BANDS = "CDEFGHJKLMNPQRSTUVWX"  # UTM latitude bands, south to north; N and above are in the northern hemisphere
+INDEX_LIMIT = 10**5  # cell ids pack the easting and northing indices in 5 decimal digits each
+CORNERS = np.array([[0, 0], [1, 0], [1, 1], [0, 1]])  # the ring order of the USGS cells, not closed
+COORDINATE_SCALE = 1e5  # the USGS cell corners are truncated to 5 decimals
+
+
+def cell_ids(zone, band, easting, northing, spacing):
+    """Return the integer ids of UTM cells.
+
+    Parameters
+    ----------
+    zone, band : numpy arrays
+        The UTM zones, and the indices of the latitude bands in BANDS.
+    easting, northing : numpy arrays
+        The south-west corners in meters.
+    spacing : int
+        The cell spacing in meters.
+
+    Returns
+    -------
+    numpy array
+        ((zone * 20 + band) * 10**5 + easting / spacing) * 10**5 + northing / spacing, as int64.
+
+    """
+    zone_band = np.asarray(zone, dtype="int64") * len(BANDS) + np.asarray(band, dtype="int64")
+    east = np.asarray(easting, dtype="int64") // spacing
+    north = np.asarray(northing, dtype="int64") // spacing
+    return (zone_band * INDEX_LIMIT + east) * INDEX_LIMIT + north
+
+
+def encode_cells(geojson):
+    """Return the cell table of a DYFI geocoded FeatureCollection.
+
+    Parameters
+    ----------
+    geojson : Python dictionary
+        The dyfi_geo_1km.geojson or dyfi_geo_10km.geojson FeatureCollection.
+
+    Returns
+    -------
+    Python dictionary or None
+        The JSON-ready cell table: spacing (meters), digits (the widths of the easting and northing in the names),
+        ids, cdi, dist, nresp, place (an index in places, 0 for a name that repeats the UTM name) and places; None if
+        the cells are not UTM squares of one spacing, or their names or values cannot be rebuilt from the table.
+
+    """
+    features = geojson["features"]
+    names = [f["properties"]["name"] for f in features]
+    parts = pd.Series(names, dtype=object).str.extract(rf"^(?P<utm>{CELL_NAME})<br>(?P<place>.*)$")
+    if not features or parts.isna().any(axis=None) or parts["spacing"].nunique() != 1:
+        return None
+    spacing = int(parts["spacing"].iloc[0])
+    digits = [int(parts["easting"].str.len().max()), int(parts["northing"].str.len().max())]
+    places = parts["place"].where(parts["place"] != parts["utm"], "").tolist()
+    place_names = [""] + sorted(set(places) - {""})
+    place_codes = {place: code for code, place in enumerate(place_names)}
+    table = {
+        "spacing": spacing,
+        "digits": digits,
+        "ids": cell_ids(
+            pd.to_numeric(parts["zone"]),
+            parts["band"].map(BANDS.index),
+            pd.to_numeric(parts["easting"]) * spacing,
+            pd.to_numeric(parts["northing"]) * spacing,
+            spacing,
+        ).tolist(),
+        "cdi": [f["properties"]["cdi"] for f in features],
+        "dist": [f["properties"]["dist"] for f in features],
+        "nresp": [f["properties"]["nresp"] for f in features],
+        "place": [place_codes[place] for place in places],
+        "places": place_names,
+    }
+    decoded = CellTable(table)
+    if decoded.names() != names or decoded.cdi_values() != table["cdi"] or decoded.dist_values() != table["dist"]:
+        return None
+    if decoded.nresp.astype("int64").tolist() != table["nresp"]:
+        return None
+    return table
+
+
+_transformers = threading.local()
+
+
+def _transformer(source, target):
+    """Return this thread's transformer between two coordinate systems; they are costly to make."""
+    cache = _transformers.__dict__.setdefault("cache", {})
+    if (source, target) not in cache:
+        cache[source, target] = Transformer.from_crs(source, target, always_xy=True)
+    return cache[source, target]
+
+
+def _utm_epsg(zone, north):
+    return f"EPSG:{(32600 if north else 32700) + zone}"
+
+
+def utm_coordinates(lon, lat):
+    """Return the UTM zone, band and coordinates of points.
+
+    Parameters
+    ----------
+    lon, lat : numpy arrays
+        The longitudes and latitudes of the points.
+
+    Returns
+    -------
+    numpy arrays
+        zone, band (the index in BANDS), easting and northing (meters) of each point, in the standard UTM zone of its
+        longitude.
+
+    """
+    lon = np.asarray(lon, dtype="float64")
+    lat = np.asarray(lat, dtype="float64")
+    zone = (np.floor((lon + 180) / 6).astype("int64") % 60) + 1
+    band = np.clip(np.floor((lat + 80) / 8).astype("int64"), 0, len(BANDS) - 1)
+    easting = np.empty(len(lon))
+    northing = np.empty(len(lon))
+    zones = zone * 2 + (band >= BANDS.index("N"))
+    for zone_hemisphere in np.unique(zones):
+        rows = np.flatnonzero(zones == zone_hemisphere)
+        transformer = _transformer("EPSG:4326", _utm_epsg(*divmod(int(zone_hemisphere), 2)))
+        easting[rows], northing[rows] = transformer.transform(lon[rows], lat[rows])
+    return zone, band, easting, northing
+
+
+def aggregate_cells(zone, band, easting, northing, cdi, dist, weight, spacing):
+    """Return the cell table of the UTM squares of a spacing that contain weighted points (or smaller cells).
+
+    Parameters
+    ----------
+    zone, band : numpy arrays
+        The UTM zones, and the indices of the latitude bands in BANDS.
+    easting, northing : numpy arrays
+        The UTM coordinates in meters.
+    cdi, dist : numpy arrays
+        The intensity and distance of each point.
+    weight : numpy array
+        The response count of each point.
+    spacing : int
+        The cell spacing in meters.
+
+    Returns
+    -------
+    Python dictionary
+        The JSON-ready cell table (see encode_cells()); a cell's nresp is the sum of its points' response counts, and
+        its cdi and dist are their response-weighted means (a point of no responses weighs as one).
+
+    """
+    ids = cell_ids(zone, band, np.floor(easting / spacing) * spacing, np.floor(northing / spacing) * spacing, spacing)
+    weight = np.asarray(weight, dtype="float64")
+    level_ids, members = np.unique(ids, return_inverse=True)
+    mean_weight = np.maximum(weight, 1)
+    total_weight = np.bincount(members, mean_weight, minlength=len(level_ids))
+    cdi = np.bincount(members, np.asarray(cdi, dtype="float64") * mean_weight, minlength=len(level_ids))
+    dist = np.bincount(members, np.asarray(dist, dtype="float64") * mean_weight, minlength=len(level_ids))
+    indices = np.concatenate([level_ids % INDEX_LIMIT, level_ids // INDEX_LIMIT % INDEX_LIMIT, [0]])
+    return {
+        "spacing": int(spacing),
+        "digits": [max(4, len(str(int(indices.max()))))] * 2,
+        "ids": level_ids.tolist(),
+        "cdi": np.round(cdi / np.maximum(total_weight, 1), 1).tolist(),
+        "dist": np.round(dist / np.maximum(total_weight, 1)).astype("int64").tolist(),
+        "nresp": np.bincount(members, weight, minlength=len(level_ids)).astype("int64").tolist(),
+        "place": [0] * len(level_ids),
+        "places": [""],
+    }
+
+
+def _truncated(coordinates):
+    return np.trunc(coordinates * COORDINATE_SCALE) / COORDINATE_SCALE
+
+
+class CellTable:
+    """The columns of a cell table, and the polygons, names and trace values of its cells.
+
+    Parameters
+    ----------
+    table : Python dictionary
+        A cell table, see encode_cells().
+
+    """
+
+    def __init__(self, table):
+        self.spacing = int(table["spacing"])
+        self.digits = table["digits"]
+        self.ids = np.asarray(table["ids"], dtype="int64")
+        self.cdi = np.asarray(table["cdi"], dtype="float32")
+        self.dist = np.asarray(table["dist"], dtype="float32")
+        self.nresp = np.asarray(table["nresp"], dtype="float32")
+        self.place = np.asarray(table["place"], dtype="int32")
+        self.places = list(table["places"])
+        zone_band, cell = np.divmod(self.ids, INDEX_LIMIT * INDEX_LIMIT)
+        self.zone, self.band = np.divmod(zone_band, len(BANDS))
+        east, north = np.divmod(cell, INDEX_LIMIT)
+        self.easting, self.northing = east * self.spacing, north * self.spacing
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _select(self, cells):
+        return np.arange(len(self)) if cells is None else np.asarray(cells, dtype="int64")
+
+    def cdi_values(self, cells=None):
+        """Return the CDI of some cells (all if None), as a list of one-decimal floats."""
+        return np.round(self.cdi[self._select(cells)].astype("float64"), 1).tolist()
+
+    def dist_values(self, cells=None):
+        """Return the distance of some cells (all if None), as a list of ints."""
+        return np.round(self.dist[self._select(cells)]).astype("int64").tolist()
+
+    def corners(self, cells=None):
+        """Return the longitudes and latitudes of the corners of some cells (all if None), as two (n, 4) arrays."""
+        cells = self._select(cells)
+        lon = np.empty((len(cells), len(CORNERS)))
+        lat = np.empty((len(cells), len(CORNERS)))
+        zones = self.zone[cells] * 2 + (self.band[cells] >= BANDS.index("N"))
+        for zone_hemisphere in np.unique(zones):
+            rows = np.flatnonzero(zones == zone_hemisphere)
+            zone, north = divmod(int(zone_hemisphere), 2)
+            transformer = _transformer(_utm_epsg(zone, north), "EPSG:4326")
+            x = self.easting[cells[rows], None] + CORNERS[:, 0] * self.spacing
+            y = self.northing[cells[rows], None] + CORNERS[:, 1] * self.spacing
+            lon[rows], lat[rows] = transformer.transform(x.astype("float64"), y.astype("float64"))
+        return _truncated(lon), _truncated(lat)
+
+    def bounds(self):
+        """Return the (minx, miny, maxx, maxy) of every cell, as an (n, 4) array."""
+        lon, lat = self.corners()
+        return np.stack([lon.min(axis=1), lat.min(axis=1), lon.max(axis=1), lat.max(axis=1)], axis=1)
+
+    def names(self, cells=None):
+        """Return the DYFI names of some cells (all if None)."""
+        cells = self._select(cells)
+        east_digits, north_digits = self.digits
+        names = []
+        for zone, band, east, north, place in zip(
+            self.zone[cells].tolist(),
+            self.band[cells].tolist(),
+            (self.easting[cells] // self.spacing).tolist(),
+            (self.northing[cells] // self.spacing).tolist(),
+            self.place[cells].tolist(),
+        ):
+            utm = f"UTM:({zone}{BANDS[band]} {east:0{east_digits}d} {north:0{north_digits}d} {self.spacing})"
+            names.append(f"{utm}<br>{self.places[place] or utm}")
+        return names
+
+    def values(self, cells=None):
+        """Return the geojson features and the choropleth trace values of some cells (all if None).
+
+        Parameters
+        ----------
+        cells : numpy array
+            The cell indices.
+
+        Returns
+        -------
+        Python dictionary
+            features, locations, z and customdata lists of the cells, as in the intensity plots of figures.py.
+
+        """
+        cells = self._select(cells)
+        names = self.names(cells)
+        cdi = self.cdi_values(cells)
+        dist = self.dist_values(cells)
+        nresp = self.nresp[cells].astype("int64").tolist()
+        lon, lat = self.corners(cells)
+        rings = np.stack([lon, lat], axis=-1).tolist()
+        features = [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Polygon", "coordinates": [ring]},
+                "properties": {"name": name, "cdi": c, "dist": d, "nresp": n},
+            }
+            for ring, name, c, d, n in zip(rings, names, cdi, dist, nresp)
+        ]
+        return {
+            "features": features,
+            "locations": names,
+            "z": cdi,
+            "customdata": [[[name], [c], [d], [n]] for name, c, d, n in zip(names, cdi, dist, nresp)],
+        }
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+Viewport culling of the DYFI intensity choropleth maps of the earthquake data app.
+
+An intensity map used to embed every cell of the event's dyfi_geo_1km.geojson (about half a megabyte for a local
+event, far more for a widely felt one) in the figure sent to the browser, whatever part of the map was visible.  The
+CellIndex of an intensity plot holds the bounding box of every cell in a shapely STRtree, built once per plot.  The
+figure is sent with only the cells that intersect the visible map area plus a margin; as the user pans and zooms, the
+map's relayoutData reports the new viewport and only the cells not sent yet are added to the figure, with a Dash
+Patch.  The polygons of an intensity plot stored as a cell table (see utm_cells.py) are made for just the cells sent.
+
+The viewport is read from the map's derived corner coordinates when plotly reports them, or estimated from the map
+center and zoom for a VIEWPORT_PIXELS map otherwise.
+
+viewport.py module contains the following:
+
+    CellIndex - an STRtree of the cell bounding boxes of an intensity choropleth trace, and the values of its cells.
+    CellIndexCache - a small LRU cache of the CellIndex of each displayed plot.
+    viewport_bounds() - returns the map area, with a margin, of a map center and zoom or of map relayout data.
+    cull_figure() - returns a copy of an intensity figure with only some of its cells.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import shapely
+
+from utm_cells import CellTable
+
+VIEWPORT_PIXELS = (1280, 720)  # assumed map size when only the center and zoom are known
+VIEWPORT_MARGIN = 0.5  # fraction of the viewport width and height added on each side
+TILE_PIXELS = 512  # mapbox-gl world width in pixels at zoom 0
+CELL_KEYS = ("locations", "z", "customdata")  # per-cell trace values, aligned with the geojson features
+
+
+def _geometry_bounds(geometry):
+    """Return the (minx, miny, maxx, maxy) of a Polygon or MultiPolygon geometry dictionary."""
+    polygons = [geometry["coordinates"]] if geometry["type"] == "Polygon" else geometry["coordinates"]
+    points = np.concatenate([np.asarray(polygon[0], dtype="float64")[:, :2] for polygon in polygons])
+    return (*points.min(axis=0), *points.max(axis=0))
+
+
+class CellIndex:
+    """An STRtree of the cell bounding boxes of an intensity choropleth trace, and the trace values of its cells.
+
+    Parameters
+    ----------
+    trace : Python dictionary
+        The choroplethmapbox trace, with its cells as a cell table (see utm_cells.py) or as the features of its
+        geojson.
+
+    """
+
+    def __init__(self, trace):
+        if "utm_cells" in trace:
+            self._table = CellTable(trace["utm_cells"])
+            bounds = self._table.bounds().reshape(-1, 4)
+        else:
+            self._table = None
+            features = trace["geojson"]["features"]
+            bounds = np.array([_geometry_bounds(f["geometry"]) for f in features], dtype="float64").reshape(-1, 4)
+        self._trace = trace
+        self.n_cells = len(bounds)
+        self._tree = shapely.STRtree(shapely.box(bounds[:, 0], bounds[:, 1], bounds[:, 2], bounds[:, 3]))
+
+    def query(self, bounds):
+        """Return the sorted indices of the cells whose bounding box intersects (minx, miny, maxx, maxy)."""
+        return np.sort(self._tree.query(shapely.box(*bounds)))
+
+    def query_new(self, bounds, sent):
+        """Return the sorted indices of the cells in bounds that are not in any of the sent bounds."""
+        cells = self.query(bounds)
+        if sent:
+            cells = np.setdiff1d(cells, np.concatenate([self.query(b) for b in sent]))
+        return cells
+
+    def values(self, cells):
+        """Return the geojson features and the per-cell trace values of some cells, as JSON-ready lists.
+
+        Parameters
+        ----------
+        cells : numpy array
+            The cell indices.
+
+        Returns
+        -------
+        Python dictionary
+            features, locations, z and customdata lists of the cells; the features of a cell table trace are made
+            for just these cells.
+
+        """
+        if self._table is not None:
+            return self._table.values(cells)
+        features = self._trace["geojson"]["features"]
+        values = {"features": [features[i] for i in cells]}
+        for key in CELL_KEYS:
+            values[key] = np.asarray(self._trace[key], dtype=object)[cells].tolist()
+        return values
+
+
+class CellIndexCache:
+    """A small LRU cache of the CellIndex of each displayed plot.
+
+    An entry is only used for the same trace dictionary it was built from, so a plot rebuilt from changed DYFI files
+    gets a new index.
+
+    Parameters
+    ----------
+    size : int
+        The maximum number of cached indexes.
+
+    """
+
+    def __init__(self, size=16):
+        self._size = size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key, trace):
+        """Return the CellIndex of a plot's choropleth trace, building it if it is not cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is trace:
+                self._entries.move_to_end(key)
+                return entry[1]
+        index = CellIndex(trace)
+        with self._lock:
+            self._entries[key] = (trace, index)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._size:
+                self._entries.popitem(last=False)
+        return index
+
+
+def viewport_bounds(relayout_data=None, center=None, zoom=None, margin=VIEWPORT_MARGIN):
+    """Return the map area, with a margin, of map relayout data or of a map center and zoom.
+
+    Parameters
+    ----------
+    relayout_data : Python dictionary
+        A map's relayoutData; its mapbox._derived corner coordinates, or its mapbox.center and mapbox.zoom, are used.
+    center : Python dictionary
+        The map center with the keys lat and lon, used if relayout_data has no viewport.
+    zoom : float
+        The map zoom level, used if relayout_data has no viewport.
+    margin : float
+        The fraction of the viewport width and height added on each side.
+
+    Returns
+    -------
+    tuple or None
+        (minx, miny, maxx, maxy) in degrees; None if the viewport is not known, e.g. an autosize relayout.
+
+    """
+    relayout_data = relayout_data or {}
+    derived = relayout_data.get("mapbox._derived")
+    if derived and derived.get("coordinates"):
+        corners = np.asarray(derived["coordinates"], dtype="float64")
+        minx, miny = corners.min(axis=0)
+        maxx, maxy = corners.max(axis=0)
+    else:
+        center = relayout_data.get("mapbox.center", center)
+        zoom = relayout_data.get("mapbox.zoom", zoom)
+        if center is None or zoom is None:
+            return None
+        degrees_per_pixel = 360.0 / (TILE_PIXELS * 2.0**zoom)
+        half_width = VIEWPORT_PIXELS[0] / 2 * degrees_per_pixel
+        half_height = VIEWPORT_PIXELS[1] / 2 * degrees_per_pixel * np.cos(np.radians(center["lat"]))
+        minx, maxx = center["lon"] - half_width, center["lon"] + half_width
+        miny, maxy = center["lat"] - half_height, center["lat"] + half_height
+    dx, dy = (maxx - minx) * margin, (maxy - miny) * margin
+    return (float(minx - dx), float(miny - dy), float(maxx + dx), float(maxy + dy))
+
+
+def cull_figure(fig, index, cells, uirevision=None):
+    """Return a copy of an intensity figure whose choropleth trace (the first) has only some of its cells.
+
+    Parameters
+    ----------
+    fig : Python dictionary
+        The full figure; it is not modified.
+    index : CellIndex
+        The CellIndex of the figure's choropleth trace.
+    cells : numpy array
+        The indices of the cells to keep.
+    uirevision : String
+        If given, the layout uirevision, so the browser keeps the user's pan and zoom when cells are added.
+
+    Returns
+    -------
+    Python dictionary
+        The culled figure, with the cells as plotly geojson features.
+
+    """
+    trace = {key: value for key, value in fig["data"][0].items() if key != "utm_cells"}
+    values = index.values(cells)
+    culled = dict(trace, geojson=dict(trace["geojson"], features=values.pop("features")), **values)
+    layout = fig["layout"] if uirevision is None else dict(fig["layout"], uirevision=uirevision)
+    return dict(fig, data=[culled, *fig["data"][1:]], layout=layout)